@@ -1,6 +1,21 @@
 #!/usr/bin/env bash
 
 : ${FLASK_DEBUG:=0}
+: ${EXA_SERVER:=development}
+: ${WEB_WORKERS:=2}
+#: every open logs or transactions tab holds one thread of its worker for live updates, at most
+#: EXA_STREAM_LIMIT (default 4) per worker, keep threads above the limit to serve other requests
+: ${WEB_THREADS:=8}
+
+#: standalone action executor, run web with EXA_EXECUTOR=external
+if [ "$1" = "worker" ]; then
+    exec python worker.py
+fi
+
+if [ "${EXA_SERVER}" = "production" ]; then
+    exec gunicorn --bind 0.0.0.0:5000 --workers ${WEB_WORKERS} --threads ${WEB_THREADS} \
+        --worker-class gthread wsgi:app
+fi
 
 FLASK_DEBUG=${FLASK_DEBUG}
 FLASK_APP=__init__ flask run --host=0.0.0.0
@@ -1,5 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import os
+
 from fabric.api import local, hide, lcd
 from fabric.colors import green
 
@@ -10,7 +12,9 @@ def initapp():
     :return:
     """
 
+    #: lazily imported modules are not discovered by PyInstaller analysis
     local('docker run -v "$(pwd):/src/" cdrx/pyinstaller-linux "pyinstaller -w -F '
+          '--hidden-import ccxt --hidden-import requests --hidden-import websocket '
           '--add-data \"templates:templates\" --add-data \"static:static\" __init__.py"')
 
 
@@ -27,6 +31,48 @@ def buildapp(version):
                 client=client, version=version))
 
 
+def benchimport(binary=None, runs=5):
+    """
+    Benchmark application import time, results are appended to src/benchmarks/import_time.jsonl
+
+    """
+    command = 'python benchmarks/import_time.py --runs {}'.format(runs)
+    if binary:
+        command += ' --binary {}'.format(os.path.abspath(binary))
+    with lcd('src'):
+        local(command)
+
+
+def benchaggregation(runs=5):
+    """
+    Benchmark balance aggregation, results are appended to src/benchmarks/aggregation.jsonl
+
+    """
+    with lcd('src'):
+        local('python benchmarks/aggregation.py --runs {}'.format(runs))
+
+
+def benchpaper(actions=2000, threads=1):
+    """
+    Benchmark paper trading throughput, results are appended to src/benchmarks/paper_trading.jsonl
+
+    """
+    with lcd('src'):
+        local('python benchmarks/paper_trading.py --actions {} --threads {}'.format(actions, threads))
+
+
+def loadtest(db='/tmp/exa-large.db', requests=20, concurrency=4):
+    """
+    Load test views against seeded database, results are appended to src/benchmarks/load_views.jsonl
+
+    """
+    with lcd('src'):
+        if not os.path.exists(db):
+            local('python benchmarks/seed.py {}'.format(db))
+        local('python benchmarks/load_views.py {} --requests {} --concurrency {}'.format(
+            db, requests, concurrency))
+
+
 def checksum(version):
     """
     Generate checksum for apps
@@ -1,34 +1,34 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
-import logging
-from datetime import datetime
+import time
+import threading
 from functools import wraps
 
-from flask import Flask, render_template, flash, request, redirect, url_for, g
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+from flask import Flask, Response, render_template, flash, request, redirect, url_for, g, jsonify, \
+    session, abort, stream_with_context
 from sqlalchemy import desc
 
-from models import Settings, Exchange, Transaction, SystemLog, Symbol
+from exceptions import ExAWorkerException
+from models import Settings, Exchange, Transaction, SystemLog, SpendingLimit
+from utils import events, export, market_data, memory, policy, rate_limit, symbols, tenant, \
+    trace
+from utils.api import json_response, since_id_response, serialize
 from utils.balances import get_balances
+from utils.circuit_breaker import CircuitBreaker
 from utils.server import ExAServerHelper
-from utils.exchange import ExchangeHelper
-from database import init_db, db_session
-from forms import SettingsForm, ConnectForm, ExchangeForm
-
-VERSION = '2.0.0'
+from utils.worker import WorkerClient
+from database import init_db, init_account, db_session, scoped_job
+from executor import EXECUTOR, Executor, run_actions, validate_exchange
+from forms import SettingsForm, ConnectForm, ExchangeForm, AccountForm, SpendingLimitForm, \
+    LIMIT_WINDOW_CHOICES
+from version import VERSION
 
 
 def create_app(test_config=None):
 
-    scheduler = BackgroundScheduler()
-    log = logging.getLogger('apscheduler.executors.default')
-    log.setLevel(logging.WARNING)
-    fmt = logging.Formatter('%(levelname)s:%(name)s:%(message)s')
-    h = logging.StreamHandler()
-    h.setFormatter(fmt)
-    log.addHandler(h)
+    executor = Executor(version=VERSION) if EXECUTOR == 'internal' else None
+    worker = WorkerClient()
 
     if getattr(sys, 'frozen', False):
         template_folder = os.path.join(sys._MEIPASS, 'templates')
@@ -51,10 +51,23 @@ def create_app(test_config=None):
 
     init_db()
 
+    @app.before_request
+    def activate_account():
+        tenant.activate(session.get('account_id'))
+        g.account = tenant.current_settings()
+        if g.account is None:
+            session.pop('account_id', None)
+            tenant.activate(None)
+            g.account = tenant.current_settings()
+
+    @app.context_processor
+    def inject_accounts():
+        return {'account': g.get('account'), 'accounts': tenant.accounts()}
+
     def connect_required(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            settings = Settings.query.get(1)
+            settings = tenant.current_settings()
             if not settings.connected:
                 return redirect(url_for('connect'))
             return f(*args, **kwargs)
@@ -62,7 +75,7 @@ def create_app(test_config=None):
 
     @app.route("/", methods=['GET', 'POST'])
     def connect():
-        setting = Settings.query.get(1)
+        setting = tenant.current_settings()
         if setting.connected:
             return redirect(url_for('dashboard'))
         if request.method == 'POST':
@@ -81,13 +94,34 @@ def create_app(test_config=None):
         form = ConnectForm()
         return render_template('connect.html', form=form)
 
+    @app.route("/accounts", methods=['GET', 'POST'])
+    def accounts():
+        form = AccountForm(request.form) if request.method == 'POST' else AccountForm()
+        if request.method == 'POST' and form.validate():
+            account = Settings(name=form.name.data)
+            db_session.add(account)
+            db_session.commit()
+            init_account(account)
+            session['account_id'] = account.id
+            flash('Account has been created. Connect it with ExA server.', 'success')
+            return redirect(url_for('connect'))
+        return render_template('accounts.html', form=form)
+
+    @app.route("/accounts/<int:account_id>/select")
+    def account_select(account_id):
+        account = Settings.query.get(account_id)
+        if account is None:
+            abort(404)
+        session['account_id'] = account.id
+        return redirect(url_for('connect'))
+
     @app.route("/dashboard")
     @connect_required
     def dashboard():
-        exchanges = Exchange.query.all()
-        setting = Settings.query.get(1)
-        transactions = Transaction.query.all()
-        logs = SystemLog.query.all()
+        exchanges = tenant.query(Exchange).all()
+        setting = tenant.current_settings()
+        transaction_count = tenant.query(Transaction).count()
+        log_count = tenant.query(SystemLog).count()
 
         balances = get_balances()
         for key in list(balances.keys()):
@@ -99,26 +133,27 @@ def create_app(test_config=None):
                   'You can inspect executed actions in logs', 'warning')
         return render_template(
             'dashboard.html', exchanges=exchanges, setting=setting, balances=balances,
-            transactions=transactions, logs=logs, version=VERSION)
+            breakers={e.id: CircuitBreaker(e).state for e in exchanges},
+            transaction_count=transaction_count, log_count=log_count, version=VERSION,
+            executor=get_executor_status())
 
     @app.route("/exchange/<int:exchange_id>/edit", methods=['GET', 'POST'])
     @connect_required
     def exchange_edit(exchange_id):
-        exchange = Exchange.query.get(exchange_id)
+        exchange = tenant.query(Exchange).filter_by(id=exchange_id).first()
+        if exchange is None:
+            abort(404)
         form = ExchangeForm(obj=exchange)
         if request.method == 'POST':
             form = ExchangeForm(request.form)
             exchange.enabled = form.enabled.data
             exchange.api_key = form.api_key.data
             exchange.api_secret = form.api_secret.data
-            exchange.valid = ExchangeHelper(exchange=exchange.name, version=VERSION).check_status()
+            exchange.valid = False
+            exchange.validation_state = Exchange.PENDING
             db_session.commit()
-
-            if exchange.valid:
-                flash('Account has been updated.', 'success')
-            else:
-                flash("Account has been updated but is invalid. Please checks the logs for more "
-                      "details", 'warning')
+            schedule_validation(exchange)
+            flash('Account has been updated, API keys are being validated.', 'success')
 
             return redirect(url_for('dashboard'))
         return render_template('exchange.html', form=form, exchange=exchange)
@@ -126,45 +161,99 @@ def create_app(test_config=None):
     @app.route("/security/", methods=['GET', 'POST'])
     @connect_required
     def security():
-        setting = Settings.query.get(1)
-        pair_choices = [(i.name, i.name) for i in Symbol.query.all()]
-
+        setting = tenant.current_settings()
         form = SettingsForm(obj=setting)
-        form.allowed_pairs.choices = pair_choices
         if request.method == 'POST':
             form = SettingsForm(request.form)
-            form.allowed_pairs.choices = pair_choices
             if form.validate():
                 setting.allowed_pairs = form.allowed_pairs.data
                 setting.allowed_actions = form.allowed_actions.data
                 setting.allowed_balance = form.allowed_balance.data
                 setting.test_mode = form.test_mode.data
                 db_session.commit()
+                market_data.update_pairs(tenant.allowed_pairs())
                 flash('Settings have been updated.', 'success')
                 return redirect(url_for('dashboard'))
 
-        return render_template('security.html', form=form)
+        return render_security(form=form)
+
+    @app.route("/security/limits", methods=['POST'])
+    @connect_required
+    def spending_limit_add():
+        limit_form = SpendingLimitForm(request.form)
+        if not limit_form.validate():
+            return render_security(limit_form=limit_form)
+        db_session.add(SpendingLimit(
+            pair=limit_form.pair.data or None, window=limit_form.window.data,
+            amount=limit_form.amount.data))
+        db_session.commit()
+        flash('Spending limit has been added.', 'success')
+        return redirect(url_for('security'))
+
+    @app.route("/security/limits/<int:limit_id>/delete")
+    @connect_required
+    def spending_limit_delete(limit_id):
+        tenant.query(SpendingLimit).filter_by(id=limit_id).delete()
+        db_session.commit()
+        flash('Spending limit has been deleted.', 'success')
+        return redirect(url_for('security'))
+
+    def render_security(form=None, limit_form=None):
+        limits = tenant.query(SpendingLimit).order_by(SpendingLimit.window, SpendingLimit.pair)
+        return render_template(
+            'security.html', form=form or SettingsForm(obj=tenant.current_settings()),
+            limit_form=limit_form or SpendingLimitForm(), limits=limits.all(),
+            window_labels=dict(LIMIT_WINDOW_CHOICES))
 
     @app.route("/symbols/sync/")
     @connect_required
     def sync_symbols():
-        ExAServerHelper(version=VERSION).sync_symbols()
+        try:
+            if executor is not None:
+                raise ExAWorkerException('Actions are executed in web process')
+            worker.send('sync_symbols', timeout=10)
+        except ExAWorkerException:
+            ExAServerHelper(version=VERSION).sync_symbols()
+        symbols.index.invalidate()
         flash('Trading pairs have been refreshed.', 'success')
         return redirect(url_for('security'))
 
+    @app.route("/symbols/search")
+    @connect_required
+    def symbols_search():
+        """
+        Trading pairs starting with ``q``, in select2 ajax format
+        """
+        page = max(request.args.get('page', 1, type=int), 1)
+        names, more = symbols.index.search(
+            request.args.get('q', ''), offset=(page - 1) * symbols.SEARCH_LIMIT)
+        return jsonify({
+            'results': [{'id': name, 'text': name} for name in names],
+            'pagination': {'more': more}})
+
     @app.route("/logs")
     def logs():
-        log_entries = SystemLog.query.order_by(desc(SystemLog.created)).all()
-        settings = Settings.query.get(1)
+        log_entries = trace.entries(
+            tenant.query(SystemLog).order_by(desc(SystemLog.created)),
+            settings_id=tenant.current_id(), remote=remote_trace())
+        settings = tenant.current_settings()
         return render_template('logs.html', logs=log_entries, is_connected=settings.connected)
 
     @app.route("/logs/send")
     @connect_required
     def logs_send():
-        log_entries = SystemLog.query.order_by(desc(SystemLog.created)).all()
+        include_trace = bool(request.args.get('trace'))
+        log_entries = tenant.query(SystemLog).all()
+        remote = remote_trace() if include_trace else []
+        if include_trace:
+            log_entries = trace.entries(
+                log_entries, settings_id=tenant.current_id(), remote=remote)
         if log_entries:
-            status = ExAServerHelper(version=VERSION).send_logs()
+            status = ExAServerHelper(version=VERSION).send_logs(
+                include_trace=include_trace, remote_trace=remote)
             if status:
+                if remote:
+                    clear_remote_trace()
                 flash('Logs have been sent successfully.', 'success')
             else:
                 flash('Logs have not been sent. If problem persists please contact administrator.',
@@ -175,16 +264,18 @@ def create_app(test_config=None):
 
     @app.route("/logs/delete")
     def logs_delete():
-        SystemLog.query.delete()
+        tenant.query(SystemLog).delete()
         db_session.commit()
+        trace.buffer.clear(settings_id=tenant.current_id())
+        clear_remote_trace()
         flash('Logs have been deleted.', 'success')
         return redirect(url_for('logs'))
 
     @app.route("/transactions")
     @connect_required
     def transactions():
-        setting = Settings.query.get(1)
-        transaction_entries = Transaction.query.order_by(desc(Transaction.created)).all()
+        setting = tenant.current_settings()
+        transaction_entries = tenant.query(Transaction).order_by(desc(Transaction.created)).all()
         balances = get_balances()
         return render_template(
             'transactions.html', transactions=transaction_entries, balances=balances,
@@ -193,76 +284,224 @@ def create_app(test_config=None):
     @app.route("/transactions/delete")
     @connect_required
     def transactions_delete():
-        Transaction.query.delete()
+        tenant.query(Transaction).delete()
+        #: deleted transactions no longer count towards spending limits of any process
+        settings = tenant.current_settings()
+        settings.transactions_generation = (settings.transactions_generation or 0) + 1
         db_session.commit()
         flash('Transactions have been deleted.', 'success')
         return redirect(url_for('transactions'))
 
-    def run_actions():
-        valid_exchanges = Exchange.query.filter_by(valid=True, enabled=True).all()
-        if valid_exchanges:
-            for valie_exchange in valid_exchanges:
-                valie_exchange.refreshed = datetime.utcnow()
-            db_session.commit()
+    @app.route("/api/exchanges")
+    @connect_required
+    def api_exchanges():
+        return json_response(lambda: [
+            dict(serialize(e, ['id', 'name', 'valid', 'validation_state', 'validated', 'enabled',
+                               'refreshed', 'breaker_failures', 'breaker_open_until']),
+                 breaker_state=CircuitBreaker(e).state)
+            for e in tenant.query(Exchange).order_by(Exchange.id)])
+
+    @app.route("/api/exchanges/<int:exchange_id>/validation")
+    @connect_required
+    def api_exchange_validation(exchange_id):
+        exchange = tenant.query(Exchange).filter_by(id=exchange_id).first()
+        if exchange is None:
+            abort(404)
+        return json_response(serialize(exchange, ['id', 'validation_state', 'valid', 'validated']))
 
-            try:
-                actions = ExAServerHelper(version=VERSION).get_actions(
-                    exchanges=[e.name for e in valid_exchanges])
-            except Exception as e:
-                _log_exception(e)
-                return False
-
-            if not actions:
-                return False
-
-            for trade_actions in actions:
-                try:
-                    ExchangeHelper(
-                        exchange=trade_actions['exchange'], version=VERSION).run_actions(
-                        actions=trade_actions['actions'])
-                except Exception as e:
-                    _log_exception(e, exchange=trade_actions['exchange'])
-
-    def _log_exception(e, exchange=None):
-        if exchange:
-            exchange_name = exchange
-            exchange_obj = Exchange.query.filter_by(name=exchange_name)[0]
-            exchange_obj.enabled = False
-        else:
-            exchange_name = None
-
-        exc_type, exc_obj, exc_tb = sys.exc_info()
-        stack = []
-        while True:
-            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-            lineno = exc_tb.tb_lineno
-            stack.append('{}: {}'.format(fname, lineno))
-            exc_tb = exc_tb.tb_next
-            if not exc_tb:
-                break
-
-        log_entry = SystemLog(
-            message='{message} | type: {type} | stack: {stack} | exchange: {exchange}'
-            .format(message=e, type=exc_type, stack=stack, exchange=exchange_name))
-        db_session.add(log_entry)
-        db_session.commit()
+    @app.route("/api/balances")
+    @connect_required
+    def api_balances():
+        return json_response(get_balances())
+
+    @app.route("/api/transactions")
+    @connect_required
+    def api_transactions():
+        return since_id_response(
+            Transaction, [
+                'id', 'pair', 'action_name', 'amount', 'balance_usdt', 'created', 'cost', 'fee',
+                'fee_currency', 'reconciled', 'updated'],
+            query=tenant.query(Transaction), updated=Transaction.updated)
+
+    @app.route("/api/logs")
+    def api_logs():
+        return since_id_response(
+            SystemLog, ['id', 'level', 'message', 'created', 'count', 'last_seen'],
+            query=tenant.query(SystemLog), updated=SystemLog.last_seen)
+
+    @app.route("/export/transactions.<export_format>")
+    @connect_required
+    def export_transactions(export_format):
+        query = filter_export(tenant.query(Transaction), Transaction)
+        if request.args.get('pair'):
+            query = query.filter(Transaction.pair == request.args['pair'])
+        return export_response(query.order_by(Transaction.id), [
+            Transaction.id, Transaction.created, Transaction.pair, Transaction.action_name,
+            Transaction.amount, Transaction.balance_usdt, Transaction.cost, Transaction.fee,
+            Transaction.fee_currency, Transaction.reconciled], 'transactions', export_format)
+
+    @app.route("/export/logs.<export_format>")
+    @connect_required
+    def export_logs(export_format):
+        query = filter_export(tenant.query(SystemLog), SystemLog)
+        return export_response(query.order_by(SystemLog.id), [
+            SystemLog.id, SystemLog.created, SystemLog.last_seen, SystemLog.count,
+            SystemLog.level, SystemLog.message], 'logs', export_format)
+
+    def filter_export(query, model):
+        """
+        Rows created within ``since`` and ``until`` query arguments
+        """
+        try:
+            since = export.parse_date(request.args.get('since'))
+            until = export.parse_date(request.args.get('until'))
+        except ValueError as e:
+            abort(400, str(e))
+        if since is not None:
+            query = query.filter(model.created >= since)
+        if until is not None:
+            query = query.filter(model.created < until)
+        return query
+
+    def export_response(query, columns, name, export_format):
+        """
+        Stream rows as file attachment, gzipped if ``gzip`` query argument is set
+        """
+        if export_format not in export.FORMATS:
+            abort(404)
+        compress = bool(request.args.get('gzip'))
+        filename = '{}.{}'.format(name, export_format)
+        mimetype = export.FORMATS[export_format]
+        if compress:
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        return Response(
+            stream_with_context(export.export(query, columns, export_format, compress=compress)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': 'attachment; filename={}'.format(filename)})
+
+    @app.route("/stream")
+    def stream():
+        subscription = events.bus.subscribe(limit=events.STREAM_LIMIT)
+        if subscription is None:
+            #: pages work without live updates, threads are kept for other requests
+            return Response(
+                'Too many open streams', status=503, headers={'Retry-After': events.HEARTBEAT})
+        return Response(
+            events.stream(subscription, account_id=tenant.current_id()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.route("/executor/status")
+    def executor_status():
+        return jsonify(get_executor_status())
+
+    @app.route("/debug/memory")
+    @connect_required
+    def debug_memory():
+        """
+        Traced memory of the process executing actions, per cycle and by top allocators
+        """
+        limit = request.args.get('limit', memory.TOP_LIMIT, type=int)
+        if executor is not None:
+            return jsonify(memory.tracker.report(limit=limit))
+        try:
+            return jsonify(worker.send('memory', timeout=5, limit=limit))
+        except ExAWorkerException:
+            return jsonify(None)
+
+    @app.route("/metrics/rate_limits")
+    @connect_required
+    def rate_limits():
+        exchange_ids = [exchange.id for exchange in tenant.query(Exchange)]
+        return jsonify(rate_limit.metrics(exchange_ids=exchange_ids))
+
+    def schedule_validation(exchange):
+        """
+        Check exchange account in background, by worker process if running, in web process
+        otherwise
+        """
+        if executor is not None:
+            executor.validate(exchange.id)
+            return
+        try:
+            worker.send('validate_exchange', timeout=1, exchange_id=exchange.id)
+        except ExAWorkerException:
+            thread = threading.Thread(
+                target=run_validation, args=(exchange.id,), name='validate-exchange')
+            thread.daemon = True
+            thread.start()
+
+    @scoped_job
+    def run_validation(exchange_id):
+        validate_exchange(exchange_id, version=VERSION)
+
+    def remote_trace():
+        """
+        Verbose entries of ExA account kept by worker process or other gunicorn worker executing
+        actions
+        """
+        if executor is not None and executor.leader.locked:
+            return []
+        try:
+            return worker.send('trace', timeout=1, settings_id=tenant.current_id())
+        except ExAWorkerException:
+            return []
+
+    def clear_remote_trace():
+        if executor is not None and executor.leader.locked:
+            return
+        try:
+            worker.send('trace_clear', timeout=1, settings_id=tenant.current_id())
+        except ExAWorkerException:
+            pass
+
+    def share_trace():
+        """
+        Serve verbose entries on worker port once this process executes actions, so requests
+        served by other gunicorn workers include them
+        """
+        while not executor.leader.locked:
+            time.sleep(executor.interval.BASE)
+        try:
+            server = trace.command_server()
+        except OSError as e:
+            app.logger.warning('Verbose entries are not shared with other processes: %s', e)
+            return
+        server.serve_forever()
+
+    def get_executor_status():
+        if executor is not None:
+            return executor.status()
+        try:
+            return worker.send('status', timeout=1)
+        except ExAWorkerException:
+            return None
 
     if app.config['TESTING']:
         @app.route("/test/run_actions")
         def test_run_actions():
-            run_actions()
+            run_actions(version=VERSION)
             return ''
     else:
         @app.teardown_appcontext
         def shutdown_session(exception=None):
             db_session.remove()
 
-        trigger = IntervalTrigger(seconds=10)
-        scheduler.add_job(run_actions, trigger=trigger, id='run_actions')
-        scheduler.start()
+        if executor is not None:
+            executor.start()
+            thread = threading.Thread(target=share_trace, name='share-trace')
+            thread.daemon = True
+            thread.start()
+        #: rows written by the executing process are published to streams of all other processes
+        events.TableFollower(
+            events.bus, paused=lambda: executor is not None and executor.leader.locked).start()
 
     return app
 
 
 if __name__ == '__main__':
+    #: used by import time benchmark to measure frozen application startup
+    if os.environ.get('EXA_IMPORT_ONLY'):
+        sys.exit(0)
     create_app().run()
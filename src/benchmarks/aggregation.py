@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Balance aggregation benchmark
+
+Compares summing used balance by loading transaction rows and adding them in Python (previous
+implementation) with summing fixed-point amounts in the database and with reading in-memory
+spending counters, for growing histories.
+Results are appended to a JSON lines file so they can be tracked over time.
+
+    python benchmarks/aggregation.py --rows 1000 10000 100000
+
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+from decimal import Decimal as D
+
+from import_time import git_revision
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_OUTPUT = os.path.join(SRC_PATH, 'benchmarks', 'aggregation.jsonl')
+PAIRS = ['EXA/BTC', 'ETH/BTC', 'LTC/BTC', 'EXA/ETH']
+
+
+def python_sum(Transaction, pair):
+    used = D(0)
+    for transaction in Transaction.query.filter_by(action_name='order_market_buy', pair=pair):
+        used += transaction.balance_usdt
+    return used
+
+
+def database_sum(db_session, func, Transaction, pair):
+    return db_session.query(func.coalesce(func.sum(Transaction.balance_usdt), 0)).filter_by(
+        action_name='order_market_buy', pair=pair).scalar()
+
+
+def measure(callable, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = callable()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return result, {'min': round(samples[0], 5), 'median': round(samples[len(samples) // 2], 5)}
+
+
+def benchmark(rows, runs):
+    from sqlalchemy import func
+    from database import init_db, db_session, engine
+    from models import Transaction
+    from utils.policy import SpendingPolicy
+
+    init_db()
+    results = {}
+    inserted = 0
+    for size in sorted(rows):
+        engine.execute(Transaction.__table__.insert(), [
+            {'pair': random.choice(PAIRS), 'action_name': 'order_market_buy', 'amount': 1,
+             'balance_usdt': round(random.uniform(1, 100), 8)} for _ in range(size - inserted)])
+        inserted = size
+
+        python_result, python_time = measure(lambda: python_sum(Transaction, 'EXA/BTC'), runs)
+        db_session.remove()
+        database_result, database_time = measure(
+            lambda: database_sum(db_session, func, Transaction, 'EXA/BTC'), runs)
+        db_session.remove()
+        spending = SpendingPolicy()
+        spending.rebuild()
+        counter_result, counter_time = measure(
+            lambda: spending.spent(1, 'order_market_buy', 'EXA/BTC'), runs)
+        db_session.remove()
+        assert python_result == database_result == counter_result
+        results[size] = {
+            'python': python_time,
+            'database': database_time,
+            'counters': counter_time,
+            'speedup': round(python_time['median'] / database_time['median'], 1),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines results file')
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    os.environ['DB'] = 'sqlite:///{}'.format(database.name)
+    sys.path.insert(0, SRC_PATH)
+    try:
+        results = benchmark(rows=args.rows, runs=args.runs)
+    finally:
+        os.remove(database.name)
+
+    record = {
+        'created': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'results': results,
+    }
+    with open(args.output, 'a') as output:
+        output.write(json.dumps(record) + '\n')
+    print(json.dumps(record, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Application import time benchmark
+
+Measures time to import the application from source and, optionally, startup time of frozen
+(PyInstaller) binary. Cold runs import a fresh copy of the source tree without bytecode, warm
+runs reuse bytecode of the source tree. Bytecode of installed packages is reused by both.
+Results are appended to a JSON lines file so they can be tracked over time.
+
+    python benchmarks/import_time.py --runs 5 --binary dist/exa
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_OUTPUT = os.path.join(SRC_PATH, 'benchmarks', 'import_time.jsonl')
+
+IMPORT_SCRIPT = (
+    'import sys, time; started = time.perf_counter(); import __init__; '
+    'print(time.perf_counter() - started, "ccxt" in sys.modules)')
+
+
+def run_source(env, path=SRC_PATH):
+    started = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT], cwd=path, env=env)
+    elapsed = time.perf_counter() - started
+    import_time, ccxt_loaded = output.decode().split()
+    return {'process': elapsed, 'import': float(import_time), 'ccxt_loaded': ccxt_loaded == 'True'}
+
+
+def run_frozen(binary, env):
+    started = time.perf_counter()
+    subprocess.check_call([binary], env=env)
+    return {'process': time.perf_counter() - started}
+
+
+def summary(samples):
+    output = {}
+    for key in samples[0]:
+        if key == 'ccxt_loaded':
+            output[key] = any(s[key] for s in samples)
+        else:
+            values = sorted(s[key] for s in samples)
+            output[key] = {'min': round(values[0], 4), 'median': round(values[len(values) // 2], 4)}
+    return output
+
+
+def benchmark(runs, binary=None):
+    env = dict(os.environ, EXA_IMPORT_ONLY='1', DB='sqlite://')
+    results = {}
+
+    cold = []
+    for _ in range(runs):
+        #: copy without bytecode, PYTHONPYCACHEPREFIX is not supported before Python 3.8
+        copy = tempfile.mkdtemp()
+        path = os.path.join(copy, 'src')
+        try:
+            shutil.copytree(SRC_PATH, path, ignore=shutil.ignore_patterns(
+                '__pycache__', '*.pyc', '*.db', '.pytest_cache'))
+            cold.append(run_source(env, path=path))
+        finally:
+            shutil.rmtree(copy, ignore_errors=True)
+    results['source_cold'] = summary(cold)
+
+    run_source(env)
+    results['source_warm'] = summary([run_source(env) for _ in range(runs)])
+
+    if binary:
+        results['frozen_cold'] = summary([run_frozen(binary, env)])
+        results['frozen_warm'] = summary([run_frozen(binary, env) for _ in range(runs)])
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_PATH).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--binary', help='frozen application binary')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines results file')
+    args = parser.parse_args()
+
+    record = {
+        'created': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'results': benchmark(runs=args.runs, binary=args.binary),
+    }
+    with open(args.output, 'a') as output:
+        output.write(json.dumps(record) + '\n')
+    print(json.dumps(record, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Load test of the web views against seeded database
+
+Requests each route concurrently through Flask test client or local WSGI server and reports
+p50 / p99 latency, and peak memory allocated while serving single request of the route.
+Exits with status 1 if any route exceeds its budget. Results are appended to a JSON lines
+file so they can be tracked over time.
+
+    python benchmarks/seed.py /tmp/exa-large.db
+    python benchmarks/load_views.py /tmp/exa-large.db --requests 50 --concurrency 4 \\
+        --budget /dashboard=200 --budget /logs=500:64
+
+"""
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from urllib.request import urlopen
+from datetime import datetime
+
+from import_time import git_revision
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_OUTPUT = os.path.join(SRC_PATH, 'benchmarks', 'load_views.jsonl')
+
+ROUTES = ['/dashboard', '/transactions', '/logs', '/security/', '/symbols/search?q=A1']
+
+#: default budgets as (p99 milliseconds, peak memory MiB)
+BUDGETS = {
+    '/dashboard': (250, 32),
+    '/transactions': (500, 64),
+    '/logs': (500, 64),
+    '/security/': (250, 32),
+    '/symbols/search?q=A1': (50, 8),
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def parse_budget(value):
+    """
+    Parse ``route=p99[:memory]`` budget
+    """
+    route, limits = value.split('=', 1)
+    p99, _, memory = limits.partition(':')
+    default_p99, default_memory = BUDGETS.get(route, (None, None))
+    return route, (float(p99) if p99 else default_p99, float(memory) if memory else default_memory)
+
+
+def create_app():
+    from __init__ import create_app
+    from database import db_session
+
+    app = create_app({'TESTING': True})
+
+    @app.teardown_appcontext
+    def shutdown_session(exception=None):
+        db_session.remove()
+
+    return app
+
+
+class TestClientTransport(object):
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def get(self, route):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.get(route)
+        return response.status_code
+
+
+class ServerTransport(object):
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def get(self, route):
+        with urlopen(self.url + route) as response:
+            response.read()
+            return response.status
+
+    def close(self):
+        self.server.shutdown()
+
+
+def load_route(transport, route, requests, concurrency):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def work():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            started = time.perf_counter()
+            try:
+                status = transport.get(route)
+            except Exception as e:
+                status = str(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors.append(status)
+
+    tracemalloc.start()
+    transport.get(route)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=work) for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'peak_memory_mib': round(peak / 1024.0 / 1024.0, 2),
+    }
+
+
+def check_budget(result, budget):
+    p99, memory = budget
+    exceeded = []
+    if p99 is not None and result['p99_ms'] > p99:
+        exceeded.append('p99 {}ms > {}ms'.format(result['p99_ms'], p99))
+    if memory is not None and result['peak_memory_mib'] > memory:
+        exceeded.append('memory {}MiB > {}MiB'.format(result['peak_memory_mib'], memory))
+    if result['errors']:
+        exceeded.append('{} failed requests'.format(result['errors']))
+    return exceeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('db', help='seeded SQLite database, copied before the test')
+    parser.add_argument('--routes', nargs='+', default=ROUTES)
+    parser.add_argument('--requests', type=int, default=20, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--server', action='store_true', help='serve with local WSGI server')
+    parser.add_argument('--budget', action='append', default=[], type=parse_budget,
+                        help='route=p99_ms[:memory_mib]')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines results file')
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    shutil.copyfile(args.db, database.name)
+    os.environ.update({'DB': 'sqlite:///{}'.format(database.name), 'EXA_EXECUTOR': 'external'})
+    sys.path.insert(0, SRC_PATH)
+
+    budgets = dict(BUDGETS, **dict(args.budget))
+    results = {}
+    failures = {}
+    try:
+        app = create_app()
+        transport = ServerTransport(app) if args.server else TestClientTransport(app)
+        for route in args.routes:
+            results[route] = load_route(transport, route, args.requests, args.concurrency)
+            exceeded = check_budget(results[route], budgets.get(route, (None, None)))
+            if exceeded:
+                failures[route] = exceeded
+        if args.server:
+            transport.close()
+    finally:
+        os.remove(database.name)
+
+    record = {
+        'created': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'database': os.path.basename(args.db),
+        'transport': 'server' if args.server else 'test_client',
+        'concurrency': args.concurrency,
+        'results': results,
+        'budget_exceeded': failures,
+    }
+    with open(args.output, 'a') as output:
+        output.write(json.dumps(record) + '\n')
+    print(json.dumps(record, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
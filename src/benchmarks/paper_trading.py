@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Paper trading throughput benchmark
+
+Measures orders per second of the simulated paper exchange alone, and actions per second of the
+whole client execution path (ExchangeHelper with action journal, transactions and logs) running
+in test mode against it. ExA server confirmations are recorded locally.
+Results are appended to a JSON lines file so they can be tracked over time.
+
+    python benchmarks/paper_trading.py --actions 5000 --threads 4
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+from import_time import git_revision
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_OUTPUT = os.path.join(SRC_PATH, 'benchmarks', 'paper_trading.jsonl')
+
+SYMBOL = {
+    'symbol': 'EXA/BTC', 'base_asset': 'EXA', 'quote_asset': 'BTC', 'step_size': '1E-8',
+    'quote_asset_precision': 8, 'base_asset_precision': 8}
+PRICES = {'EXA/BTC': '0.0001', 'BTC/USDT': '6000'}
+
+
+class LocalServer(object):
+    """
+    ExA server stand-in recording confirmations
+    """
+
+    def __init__(self):
+        self.confirmed = 0
+
+    def confirm_action(self, action_id, status, response):
+        self.confirmed += 1
+
+    def sync_amount(self, action_id, balance):
+        self.confirmed += 1
+
+
+def exchange_throughput(orders, threads):
+    from utils.paper import PaperExchange
+
+    account = PaperExchange(
+        balances={'BTC': orders, 'EXA': orders * 10}, prices=PRICES, slippage=0.001, fee=0.001)
+
+    def trade(count):
+        for i in range(count):
+            if i % 2:
+                account.createMarketSellOrder(symbol='EXA/BTC', amount='1')
+            else:
+                account.createMarketBuyOrder(symbol='EXA/BTC', amount='1')
+
+    workers = [threading.Thread(target=trade, args=(orders // threads,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {'orders': len(account.trades), 'seconds': round(elapsed, 3),
+            'per_second': round(len(account.trades) / elapsed)}
+
+
+def client_throughput(actions, batch):
+    from database import init_db, db_session
+    from models import Settings, Exchange
+    from utils import paper
+    from utils.exchange import ExchangeHelper
+
+    init_db()
+    settings = Settings.query.get(1)
+    settings.test_mode = True
+    settings.exa_token = 'paper'
+    exchange = Exchange.query.filter_by(name='binance').first()
+    exchange.api_key = exchange.api_secret = 'paper'
+    db_session.commit()
+
+    paper.PAPER_BALANCE = 'BTC:{},EXA:{}'.format(actions, actions * 10)
+    paper.PAPER_PRICES = ','.join('{}:{}'.format(*item) for item in PRICES.items())
+    paper.PAPER_LATENCY = 0
+    server = LocalServer()
+
+    started = time.perf_counter()
+    for first in range(1, actions + 1, batch):
+        helper = ExchangeHelper(exchange='binance', version='benchmark')
+        helper.exa_helper = server
+        helper.run_actions([
+            {'action_id': action_id, 'symbol': dict(SYMBOL), 'amount': '1.00000000',
+             'action': 'order_market_sell' if action_id % 2 else 'order_market_buy'}
+            for action_id in range(first, min(first + batch, actions + 1))])
+    elapsed = time.perf_counter() - started
+    return {'actions': server.confirmed, 'seconds': round(elapsed, 3),
+            'per_second': round(server.confirmed / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--actions', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=100, help='actions per server response')
+    parser.add_argument('--threads', type=int, default=1, help='threads placing paper orders')
+    parser.add_argument('--db', default='sqlite://', help='database url, in-memory by default')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines results file')
+    args = parser.parse_args()
+
+    os.environ['DB'] = args.db
+    sys.path.insert(0, SRC_PATH)
+
+    record = {
+        'created': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'db': args.db.split(':')[0],
+        'results': {
+            'exchange': exchange_throughput(orders=args.actions * 10, threads=args.threads),
+            'client': client_throughput(actions=args.actions, batch=args.batch),
+        },
+    }
+    with open(args.output, 'a') as output:
+        output.write(json.dumps(record) + '\n')
+    print(json.dumps(record, indent=2))
+
+
+if __name__ == '__main__':
+    main()
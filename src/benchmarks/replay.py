@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Recorded session replay benchmark
+
+Replays ExA server and exchange traffic recorded with ``EXA_CASSETTE_MODE=record`` through
+the actions execution cycle, without network. Database is copied first, so replay starts
+from the same state as the recording when given a database snapshot taken before it.
+Results are appended to a JSON lines file so they can be tracked over time.
+
+    EXA_CASSETTE=session.json.gz EXA_CASSETTE_MODE=record python __init__.py
+    python benchmarks/replay.py session.json.gz --db exa-before-session.db
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+from import_time import git_revision
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_OUTPUT = os.path.join(SRC_PATH, 'benchmarks', 'replay.jsonl')
+
+
+def replay(version):
+    from exceptions import ExACassetteException
+    from executor import run_actions
+    from utils import cassette
+
+    recorded = cassette.get_cassette()
+    cycles = 0
+    started = time.perf_counter()
+    try:
+        while recorded.remaining():
+            run_actions(version=version)
+            cycles += 1
+    except ExACassetteException as e:
+        print('Replay diverged from recording: {}'.format(e))
+    return {
+        'cycles': cycles,
+        'interactions': len(recorded.interactions),
+        'not_replayed': recorded.remaining(),
+        'recorded_seconds': round(sum(i['elapsed'] for i in recorded.interactions), 3),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('cassette')
+    parser.add_argument('--db', required=True, help='SQLite database snapshot')
+    parser.add_argument('--realtime', action='store_true', help='replay with recorded timing')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines results file')
+    args = parser.parse_args()
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    shutil.copyfile(args.db, database.name)
+    os.environ.update({
+        'DB': 'sqlite:///{}'.format(database.name),
+        'EXA_CASSETTE': os.path.abspath(args.cassette),
+        'EXA_CASSETTE_MODE': 'realtime' if args.realtime else 'replay',
+    })
+    sys.path.insert(0, SRC_PATH)
+    try:
+        from version import VERSION
+        results = replay(version=VERSION)
+    finally:
+        os.remove(database.name)
+
+    record = {
+        'created': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'cassette': os.path.basename(args.cassette),
+        'realtime': args.realtime,
+        'results': results,
+    }
+    with open(args.output, 'a') as output:
+        output.write(json.dumps(record) + '\n')
+    print(json.dumps(record, indent=2))
+
+
+if __name__ == '__main__':
+    main()
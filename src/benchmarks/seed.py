@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Seed SQLite database with large generated history
+
+Creates connected client settings, transactions, logs and symbols, used by load tests to
+measure views against production sized data. Generation is deterministic for given seed.
+
+    python benchmarks/seed.py /tmp/exa-large.db --transactions 1000000 --logs 1000000 --symbols 5000
+
+"""
+import os
+import sys
+import random
+import argparse
+import itertools
+from datetime import datetime, timedelta
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CHUNK_SIZE = 10000
+QUOTE_ASSETS = ['BTC', 'ETH', 'BNB', 'USDT']
+ACTIONS = ['order_market_buy', 'order_market_sell']
+LOG_MESSAGES = [
+    'Order Market Buy: {{\'symbol\': \'{pair}\', \'amount\': Decimal(\'{amount}\')}}',
+    'Order Market Sell: {{\'symbol\': \'{pair}\', \'amount\': Decimal(\'{amount}\')}}',
+    'Amount synced with ExA server: {amount}',
+    'Server Timeout',
+]
+
+
+def symbol_names(count):
+    names = []
+    for index in itertools.count():
+        for quote_asset in QUOTE_ASSETS:
+            if len(names) == count:
+                return names
+            names.append('A{}/{}'.format(index, quote_asset))
+
+
+def insert(engine, table, rows):
+    """
+    Insert generated rows in chunks
+    """
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        engine.execute(table.insert(), chunk)
+
+
+def seed(transactions, logs, symbols, days=365, random_seed=1):
+    from database import init_db, db_session, engine
+    from models import Settings, Transaction, SystemLog, Symbol
+
+    init_db()
+    rand = random.Random(random_seed)
+    names = symbol_names(symbols)
+    pairs = names[:20]
+    started = datetime.now() - timedelta(days=days)
+
+    def created(index, total):
+        return started + timedelta(seconds=days * 86400.0 * index / max(total, 1))
+
+    settings = Settings.query.get(1)
+    settings.connected = True
+    settings.exa_token = 'load-test'
+    settings.allowed_pairs = pairs
+    settings.allowed_actions = ACTIONS
+    settings.allowed_balance = 1000000
+    db_session.commit()
+    db_session.remove()
+
+    insert(engine, Symbol.__table__, ({'name': name} for name in names))
+    insert(engine, Transaction.__table__, ({
+        'pair': rand.choice(pairs), 'action_name': rand.choice(ACTIONS),
+        'amount': round(rand.uniform(0.1, 100), 8), 'balance_usdt': round(rand.uniform(1, 500), 8),
+        'created': created(i, transactions)} for i in range(transactions)))
+    insert(engine, SystemLog.__table__, ({
+        'message': rand.choice(LOG_MESSAGES).format(
+            pair=rand.choice(pairs), amount=round(rand.uniform(0.1, 100), 8)),
+        'created': created(i, logs)} for i in range(logs)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', help='SQLite database file, must not exist')
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--logs', type=int, default=1000000)
+    parser.add_argument('--symbols', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365, help='history length')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error('{} already exists'.format(args.path))
+    os.environ['DB'] = 'sqlite:///{}'.format(os.path.abspath(args.path))
+    sys.path.insert(0, SRC_PATH)
+
+    started = datetime.now()
+    seed(transactions=args.transactions, logs=args.logs, symbols=args.symbols, days=args.days,
+         random_seed=args.seed)
+    print('Seeded {} in {}'.format(args.path, datetime.now() - started))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-from sqlalchemy import create_engine
+from functools import wraps
+from sqlalchemy import create_engine, inspect, Integer
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -20,10 +21,29 @@ Base = declarative_base()
 Base.query = db_session.query_property()
 
 
+def scoped_job(func):
+    """
+    Run background job cycle with its own session, removed when the cycle ends
+
+    Sessions of web requests are removed on app context teardown, scheduler and worker threads
+    would otherwise keep identity map and connection for the whole process lifetime.
+
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_session.remove()
+    return wrapper
+
+
 def init_db():
     import models
 
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    migrate_money_columns()
 
     setting = models.Settings.query.get(1)
     if not setting:
@@ -31,15 +51,85 @@ def init_db():
         db_session.add(settings)
         db_session.commit()
 
+    assign_default_account()
+    for settings in models.Settings.query.all():
+        init_account(settings)
+
+
+def init_account(settings):
+    """
+    Create exchanges of ExA account
+    """
+    import models
+
     for exchange_name in ['binance']:
-        exchange = models.Exchange.query.filter_by(name=exchange_name).all()
+        exchange = models.Exchange.query.filter_by(
+            name=exchange_name, settings_id=settings.id).all()
         if not exchange:
-            exchange = models.Exchange(name=exchange_name)
+            exchange = models.Exchange(name=exchange_name, settings_id=settings.id)
             db_session.add(exchange)
             db_session.commit()
 
 
+def assign_default_account():
+    """
+    Rows created before ExA accounts were introduced belong to the first account
+    """
+    from utils.tenant import DEFAULT_ACCOUNT
+
+    for table in Base.metadata.sorted_tables:
+        if 'settings_id' in table.columns:
+            engine.execute(table.update().where(table.c.settings_id.is_(None)).values(
+                settings_id=DEFAULT_ACCOUNT))
+
+
+def add_missing_columns():
+    """
+    Add columns introduced in newer client versions to existing tables
+
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = set(column['name'] for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in existing:
+                engine.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                    table.name, column.name, column.type.compile(dialect=engine.dialect)))
+        existing_indexes = set(index['name'] for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=engine)
+
+
+def migrate_money_columns():
+    """
+    Convert float amounts stored by older client versions to exact fixed-point integers
 
+    Column types can not be changed in place in SQLite, affected tables are rebuilt instead.
 
+    """
+    from models import Money
 
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        money_columns = [c.name for c in table.columns if isinstance(c.type, Money)]
+        if not money_columns:
+            continue
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        if all(isinstance(existing[name], Integer) for name in money_columns):
+            continue
 
+        legacy_name = '{}_legacy'.format(table.name)
+        columns = [c.name for c in table.columns if c.name in existing]
+        select = [
+            'CAST(ROUND({name} * {scale}) AS BIGINT)'.format(name=name, scale=Money.SCALE)
+            if name in money_columns else name for name in columns]
+        with engine.begin() as connection:
+            connection.execute('ALTER TABLE {} RENAME TO {}'.format(table.name, legacy_name))
+            for index in table.indexes:
+                connection.execute('DROP INDEX IF EXISTS {}'.format(index.name))
+            table.create(bind=connection)
+            connection.execute('INSERT INTO {table} ({columns}) SELECT {select} FROM {legacy}'.format(
+                table=table.name, columns=', '.join(columns), select=', '.join(select),
+                legacy=legacy_name))
+            connection.execute('DROP TABLE {}'.format(legacy_name))
@@ -12,3 +12,15 @@ class ExAClientException(Exception):
     """
     ExA client exception
     """
+
+
+class ExAWorkerException(Exception):
+    """
+    ExA worker communication exception
+    """
+
+
+class ExACassetteException(Exception):
+    """
+    Recorded traffic cassette exception
+    """
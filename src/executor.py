@@ -0,0 +1,431 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.date import DateTrigger
+
+from models import Exchange, Transaction
+from utils import market_data, memory, policy, tenant, trace
+from utils.circuit_breaker import CircuitBreaker, classify, OPEN, HALF_OPEN, TRANSIENT
+from utils.leader import FileLock
+from utils.polling import AdaptiveInterval, PollResult, ACTIVE, IDLE, UNAVAILABLE
+from utils.server import ExAServerHelper
+from utils.exchange import ExchangeHelper
+from database import db_session, scoped_job
+
+#: ``internal`` runs actions inside web process, ``external`` leaves them to worker process
+EXECUTOR = os.environ.get('EXA_EXECUTOR', 'internal')
+
+#: ExA accounts are served concurrently by threads shared by all accounts, one by one if 1
+ACCOUNT_WORKERS = int(os.environ.get('EXA_ACCOUNT_WORKERS', 4))
+
+#: seconds after which API keys of enabled exchanges are validated again
+VALIDATION_INTERVAL = int(os.environ.get('EXA_VALIDATION_INTERVAL', 3600))
+
+#: actions for single exchange are executed one batch at a time, even if cycles overlap
+_exchange_locks = defaultdict(threading.Lock)
+_account_pool = ThreadPoolExecutor(max_workers=ACCOUNT_WORKERS) if ACCOUNT_WORKERS > 1 else None
+
+#: number of actions by batch outcome since start
+action_totals = {'executed': 0, 'rejected': 0, 'skipped': 0}
+_totals_lock = threading.Lock()
+
+
+def run_accounts(version, on_fetched=None):
+    """
+    Run actions of all connected ExA accounts
+
+    :param on_fetched: called with combined poll result once actions of all accounts are fetched
+    :return: PollResult
+
+    """
+    account_ids = [s.id for s in tenant.accounts() if s.connected and s.exa_token]
+    if not account_ids:
+        return _fetched(PollResult(IDLE, None), on_fetched)
+
+    results = {}
+    lock = threading.Lock()
+
+    def fetched(account_id, result):
+        with lock:
+            if account_id in results:
+                return
+            results[account_id] = result
+            done = len(results) == len(account_ids)
+        if done:
+            _fetched(combine(results.values()), on_fetched)
+
+    @scoped_job
+    def run(account_id):
+        with tenant.use(account_id):
+            try:
+                run_actions(version=version, on_fetched=lambda r: fetched(account_id, r))
+            except Exception as e:
+                log_exception(e)
+                fetched(account_id, PollResult(UNAVAILABLE, None))
+
+    if _account_pool is None:
+        for account_id in account_ids:
+            run(account_id)
+    else:
+        wait([_account_pool.submit(run, account_id) for account_id in account_ids])
+    return combine(results.values())
+
+
+def combine(results):
+    """
+    Poll result of many accounts, the most active account and the earliest suggested poll wins
+    """
+    results = list(results)
+    outcomes = set(r.outcome for r in results)
+    outcome = next((o for o in [ACTIVE, IDLE] if o in outcomes), UNAVAILABLE)
+    delays = [r.suggested_delay for r in results if r.suggested_delay is not None]
+    return PollResult(outcome, min(delays) if delays else None)
+
+
+def run_actions(version, on_fetched=None):
+    """
+    Get actions from ExA server and execute them on exchanges
+
+    :param on_fetched: called with poll result as soon as actions are fetched, before they are
+        executed, so next poll can be scheduled without waiting for the batch
+    :return: PollResult
+
+    """
+    valid_exchanges = [
+        e for e in tenant.query(Exchange).filter_by(valid=True, enabled=True).all()
+        if is_available(e, version=version)]
+    if not valid_exchanges:
+        return _fetched(PollResult(IDLE, None), on_fetched)
+
+    for valie_exchange in valid_exchanges:
+        valie_exchange.refreshed = datetime.utcnow()
+    db_session.commit()
+
+    server = ExAServerHelper(version=version)
+    try:
+        actions = server.get_actions(exchanges=[e.name for e in valid_exchanges])
+    except Exception as e:
+        log_exception(e)
+        return _fetched(PollResult(UNAVAILABLE, server.next_poll), on_fetched)
+
+    if not server.available:
+        outcome = UNAVAILABLE
+    elif actions:
+        outcome = ACTIVE
+    else:
+        outcome = IDLE
+    result = _fetched(PollResult(outcome, server.next_poll), on_fetched)
+
+    for trade_actions in actions or []:
+        try:
+            with _exchange_locks[(tenant.current_id(), trade_actions['exchange'])]:
+                batch = ExchangeHelper(
+                    exchange=trade_actions['exchange'], version=version).run_actions(
+                    actions=trade_actions['actions'])
+        except Exception as e:
+            log_exception(e, exchange=trade_actions['exchange'])
+        else:
+            _count_batch(batch)
+            exchange = tenant.query(Exchange).filter_by(name=trade_actions['exchange']).first()
+            CircuitBreaker(exchange).record_success()
+
+    reconcile_transactions(valid_exchanges, version=version)
+    return result
+
+
+def reconcile_transactions(exchanges, version):
+    """
+    Correct transactions with actual fills, exchange is called only if it has transactions
+    waiting for reconciliation
+    """
+    for exchange in exchanges:
+        pending = tenant.query(Transaction).with_entities(Transaction.id).filter_by(
+            exchange=exchange.name, reconciled=False).first()
+        if pending is None:
+            continue
+        try:
+            with _exchange_locks[(tenant.current_id(), exchange.name)]:
+                ExchangeHelper(exchange=exchange.name, version=version).reconcile()
+        except Exception as e:
+            db_session.rollback()
+            log_exception(e, exchange=exchange.name)
+
+
+def _count_batch(batch):
+    with _totals_lock:
+        for outcome in action_totals:
+            action_totals[outcome] += len(getattr(batch, outcome, None) or [])
+
+
+def _fetched(result, on_fetched):
+    if on_fetched is not None:
+        on_fetched(result)
+    return result
+
+
+def is_available(exchange, version):
+    """
+    Check exchange circuit breaker, probe exchange if cool-down has passed
+
+    """
+    breaker = CircuitBreaker(exchange)
+    state = breaker.state
+    if state == OPEN:
+        return False
+    if state == HALF_OPEN:
+        try:
+            ExchangeHelper(exchange=exchange.name, version=version).probe()
+        except Exception as e:
+            log_exception(e, exchange=exchange.name)
+            return False
+        breaker.record_success()
+    return True
+
+
+def validate_exchange(exchange_id, version):
+    """
+    Check exchange API keys and store the result, state is left unchanged if exchange can not be
+    reached, so pending keys are checked again by the next validation
+
+    :return: validation state
+
+    """
+    exchange = Exchange.query.get(exchange_id)
+    if exchange is None:
+        return None
+    with tenant.use(exchange.settings_id):
+        try:
+            valid = ExchangeHelper(exchange=exchange.name, version=version).check_status()
+        except Exception as e:
+            trace.log('Exchange {} validation failed: {}'.format(exchange.name, e),
+                      level=trace.WARNING)
+            return exchange.validation_state
+    exchange.valid = valid
+    exchange.validation_state = Exchange.VALID if valid else Exchange.INVALID
+    exchange.validated = datetime.utcnow()
+    db_session.commit()
+    return exchange.validation_state
+
+
+def revalidate_exchanges(version, max_age=VALIDATION_INTERVAL):
+    """
+    Validate API keys of enabled exchanges of all ExA accounts, which are pending or were
+    validated more than ``max_age`` seconds ago
+
+    """
+    validated_before = datetime.utcnow() - timedelta(seconds=max_age)
+    exchanges = Exchange.query.filter(
+        Exchange.enabled.is_(True), Exchange.api_key.isnot(None), Exchange.api_key != '').all()
+    for exchange in exchanges:
+        if exchange.validation_state == Exchange.PENDING or exchange.validated is None or \
+                exchange.validated < validated_before:
+            validate_exchange(exchange.id, version=version)
+
+
+def log_exception(e, exchange=None):
+    """
+    Log exception, transient exchange failures open circuit breaker, other disable exchange
+
+    """
+    if exchange:
+        exchange_name = exchange
+        exchange_obj = tenant.query(Exchange).filter_by(name=exchange_name)[0]
+        if classify(e) == TRANSIENT:
+            CircuitBreaker(exchange_obj).record_failure()
+        else:
+            exchange_obj.enabled = False
+    else:
+        exchange_name = None
+
+    exc_type, exc_obj, exc_tb = sys.exc_info()
+    stack = []
+    while True:
+        fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+        lineno = exc_tb.tb_lineno
+        stack.append('{}: {}'.format(fname, lineno))
+        exc_tb = exc_tb.tb_next
+        if not exc_tb:
+            break
+
+    trace.log(
+        '{message} | type: {type} | stack: {stack} | exchange: {exchange}'
+        .format(message=e, type=exc_type, stack=stack, exchange=exchange_name), level=trace.ERROR)
+
+
+class Executor(object):
+    """
+    Scheduled actions execution, hosted by web process or standalone worker process
+
+    Each run schedules the next one, delay adapts to the outcome of the poll.
+
+    """
+
+    def __init__(self, version, interval=None):
+        self.version = version
+        self.leader = FileLock()
+        self.scheduler = BackgroundScheduler()
+        self.interval = interval or AdaptiveInterval()
+        self.started = datetime.utcnow()
+        self.cycles = 0
+        self.last_cycle = None
+        self.last_cycle_duration = None
+        self.last_outcome = None
+        self.last_delay = None
+        self.running = 0
+        self.overlapping = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self.scheduler.add_listener(self._skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+
+        log = logging.getLogger('apscheduler.executors.default')
+        log.setLevel(logging.WARNING)
+        fmt = logging.Formatter('%(levelname)s:%(name)s:%(message)s')
+        h = logging.StreamHandler()
+        h.setFormatter(fmt)
+        log.addHandler(h)
+
+    def start(self):
+        if memory.TRACEMALLOC_FRAMES:
+            memory.tracker.start(frames=memory.TRACEMALLOC_FRAMES)
+        policy.spending.rebuild()
+        self.scheduler.start()
+        self.schedule(0)
+        self.scheduler.add_job(
+            self.revalidate, trigger='interval', seconds=min(VALIDATION_INTERVAL, 600),
+            next_run_time=datetime.now(), id='revalidate_exchanges', replace_existing=True)
+
+    def shutdown(self):
+        self.scheduler.shutdown(wait=True)
+        self.leader.release()
+
+    def schedule(self, delay):
+        """
+        Schedule next run in ``delay`` seconds, replacing already scheduled one
+
+        """
+        #: next poll may start while previous batch is still executing, action journal prevents
+        #: executing the same action twice
+        self.last_delay = delay
+        self.scheduler.add_job(
+            self.run, trigger=DateTrigger(datetime.now() + timedelta(seconds=delay)),
+            id='run_actions', max_instances=2, replace_existing=True, misfire_grace_time=None,
+            coalesce=True)
+
+    def _skipped(self, event):
+        with self._lock:
+            self.skipped += 1
+        #: skipped run of one-shot job is removed by scheduler, nothing else would schedule next
+        if event.job_id == 'run_actions' and self.scheduler.running:
+            self.schedule(self.interval.delay)
+
+    def _reschedule(self, result):
+        with self._lock:
+            self.last_outcome = result.outcome
+        self.schedule(self.interval.next_delay(result))
+
+    def run(self):
+        """
+        Run actions only in the process holding leader lock, when serving with many processes
+
+        Memory is recorded once the cycle session is removed, so rows loaded by the cycle are not
+        counted as growth.
+
+        """
+        try:
+            return self._run()
+        finally:
+            memory.tracker.record_cycle()
+
+    @scoped_job
+    def _run(self):
+        with self._lock:
+            self.running += 1
+            if self.running > 1:
+                self.overlapping += 1
+
+        scheduled = []
+
+        def on_fetched(result):
+            scheduled.append(result)
+            self._reschedule(result)
+
+        started = time.time()
+        try:
+            if not self.leader.acquire():
+                #: standby process keeps checking leader lock at base interval
+                scheduled.append(None)
+                self.schedule(self.interval.BASE)
+                return None
+            #: allowed pairs may have been changed in other process
+            pairs = tenant.allowed_pairs()
+            market_data.start(pairs=pairs)
+            market_data.update_pairs(pairs)
+            return run_accounts(version=self.version, on_fetched=on_fetched)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.cycles += 1
+                self.last_cycle = datetime.utcnow()
+                self.last_cycle_duration = time.time() - started
+            if not scheduled and self.scheduler.running:
+                self._reschedule(PollResult(UNAVAILABLE, None))
+
+    def validate(self, exchange_id):
+        """
+        Validate exchange API keys in background
+        """
+        self.scheduler.add_job(
+            self._validate, args=(exchange_id,), id='validate_exchange_{}'.format(exchange_id),
+            replace_existing=True)
+        return True
+
+    @scoped_job
+    def _validate(self, exchange_id):
+        validate_exchange(exchange_id, version=self.version)
+
+    @scoped_job
+    def revalidate(self):
+        """
+        Periodic validation of API keys, so actions are never executed with stale ``valid`` flag
+        """
+        if not self.leader.acquire():
+            return
+        try:
+            revalidate_exchanges(version=self.version)
+        except Exception as e:
+            log_exception(e)
+
+    def run_now(self):
+        """
+        Run actions without waiting for next poll
+        """
+        self.schedule(0)
+        return True
+
+    def status(self):
+        job = self.scheduler.get_job('run_actions') if self.scheduler.running else None
+        return {
+            'pid': os.getpid(),
+            'version': self.version,
+            'started': self.started,
+            'leader': self.leader.locked,
+            'cycles': self.cycles,
+            'last_cycle': self.last_cycle,
+            'last_cycle_duration': self.last_cycle_duration,
+            'last_outcome': self.last_outcome,
+            'last_delay': self.last_delay,
+            'next_run': job.next_run_time if job else None,
+            'overlapping': self.overlapping,
+            'skipped': self.skipped,
+            'actions': dict(action_totals),
+        }
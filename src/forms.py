@@ -1,7 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from wtforms import Form, BooleanField, FloatField, StringField, SelectMultipleField, validators, \
-    PasswordField
+from wtforms import Form, BooleanField, DecimalField, StringField, SelectField, \
+    SelectMultipleField, validators, PasswordField, ValidationError
+
+from utils import symbols
 
 
 ACTION_CHOICES = (
@@ -9,20 +11,70 @@ ACTION_CHOICES = (
     ('order_market_sell', 'order_market_sell')
 )
 
+LIMIT_WINDOW_CHOICES = (
+    (3600, '1 hour'),
+    (86400, '24 hours'),
+    (604800, '7 days'),
+    (2592000, '30 days'),
+)
+
 
 class ConnectForm(Form):
     username = StringField('Username', validators=[validators.DataRequired()])
     password = PasswordField('Passsword', validators=[validators.DataRequired()])
 
 
+class SymbolsField(SelectMultipleField):
+    """
+    Multiple trading pairs selection, options are searched by the browser so only selected pairs
+    are rendered, selection is validated against symbol index
+    """
+
+    def __init__(self, label=None, validators=None, index=symbols.index, **kwargs):
+        super(SymbolsField, self).__init__(label, validators, choices=[], **kwargs)
+        self.index = index
+
+    def iter_choices(self):
+        for value in self.data or []:
+            yield (value, value, True)
+
+    def pre_validate(self, form):
+        for value in self.data or []:
+            if value not in self.index:
+                raise ValueError(self.gettext(
+                    "'%(value)s' is not a valid choice for this field") % dict(value=value))
+
+
 class SettingsForm(Form):
     """
     Settings Form
     """
     test_mode = BooleanField('Test Mode')
-    allowed_pairs = SelectMultipleField(choices=[])
+    allowed_pairs = SymbolsField()
     allowed_actions = SelectMultipleField(choices=ACTION_CHOICES, default=ACTION_CHOICES)
-    allowed_balance = FloatField('Allowed Buy Balance', default=0, validators=(validators.Optional(),))
+    allowed_balance = DecimalField(
+        'Allowed Buy Balance', default=0, places=None, validators=(validators.Optional(),))
+
+
+class SpendingLimitForm(Form):
+    """
+    Spending limit Form
+    """
+    pair = StringField('Pair', validators=[validators.Optional()])
+    window = SelectField('Window', choices=LIMIT_WINDOW_CHOICES, coerce=int)
+    amount = DecimalField('Limit', places=None, validators=[
+        validators.DataRequired(), validators.NumberRange(min=0)])
+
+    def validate_pair(self, field):
+        if field.data and field.data not in symbols.index:
+            raise ValidationError('Unknown trading pair: {}'.format(field.data))
+
+
+class AccountForm(Form):
+    """
+    ExA account Form
+    """
+    name = StringField('Name', validators=[validators.DataRequired(), validators.Length(max=50)])
 
 
 class ExchangeForm(Form):
@@ -1,26 +1,55 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import logging
 from datetime import datetime
+from decimal import Decimal as D, ROUND_HALF_UP
 
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy_utils import ScalarListType
 
 from database import Base
+from utils import tenant
+
+
+class Money(TypeDecorator):
+    """
+    Exact fixed-point amount stored as integer number of 1e-8 units
+
+    Stored values can be summed and compared in SQL without float rounding errors.
+    """
+    impl = BigInteger
+    PLACES = 8
+    SCALE = 10 ** PLACES
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int((D(str(value)) * self.SCALE).quantize(D(1), rounding=ROUND_HALF_UP))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return D(int(value)) / self.SCALE
 
 
 class Settings(Base):
     """
-    Settings model
+    Settings model, single row per ExA account
     """
     __tablename__ = 'settings'
 
     id = Column(Integer, primary_key=True)
+    name = Column(String(50))
     connected = Column(Boolean())
     exa_token = Column(String(100))
     allowed_pairs = Column(ScalarListType())
     allowed_actions = Column(ScalarListType())
-    allowed_balance = Column(Float(precision=4))
+    allowed_balance = Column(Money())
     test_mode = Column(Boolean())
+    #: incremented whenever transactions are deleted, so spending counters of every process are
+    #: loaded again
+    transactions_generation = Column(Integer())
 
 
 class Exchange(Base):
@@ -29,22 +58,38 @@ class Exchange(Base):
     """
     __tablename__ = 'exchange'
 
+    #: API keys validation states, keys are checked in background after change and periodically
+    PENDING = 'pending'
+    VALID = 'valid'
+    INVALID = 'invalid'
+
     id = Column(Integer, primary_key=True)
+    settings_id = Column(Integer, index=True, default=tenant.current_id)
     name = Column(String(10))
     valid = Column(Boolean())
     enabled = Column(Boolean())
     refreshed = Column(DateTime())
+    validation_state = Column(String(10))
+    validated = Column(DateTime())
 
     api_key = Column(String(66))
     api_secret = Column(String(66))
 
-    def __init__(self, name, api_key=None, api_secret=None, enabled=True, valid=False, refreshed=None):
+    breaker_state = Column(String(10))
+    breaker_failures = Column(Integer())
+    breaker_cool_down = Column(Integer())
+    breaker_open_until = Column(DateTime())
+
+    def __init__(self, name, api_key=None, api_secret=None, enabled=True, valid=False, refreshed=None,
+                 settings_id=None):
+        self.settings_id = settings_id or tenant.current_id()
         self.name = name
         self.valid = valid
         self.enabled = enabled
         self.refreshed = refreshed
         self.api_key = api_key
         self.api_secret = api_secret
+        self.breaker_failures = 0
 
 
 class Transaction(Base):
@@ -54,12 +99,41 @@ class Transaction(Base):
     __tablename__ = 'transactions'
 
     id = Column(Integer, primary_key=True)
+    settings_id = Column(Integer, index=True, default=tenant.current_id)
     pair = Column(String(10))
     action_name = Column(String(20))
-    amount = Column(Float(precision=4))
-    balance_usdt = Column(Float(precision=4))
+    amount = Column(Money())
+    #: estimated from latest price when order is placed, actual fill cost once reconciled
+    balance_usdt = Column(Money())
     created = Column(DateTime, default=datetime.now)
 
+    exchange = Column(String(10))
+    action_id = Column(Integer, index=True)
+    order_id = Column(String(50))
+    #: actual fill cost in quote asset and fee paid, known once reconciled with exchange trades
+    cost = Column(Money())
+    fee = Column(Money())
+    fee_currency = Column(String(10))
+    reconciled = Column(Boolean(), index=True)
+    reconcile_attempts = Column(Integer)
+    #: changed whenever transaction is modified, eg. reconciled
+    updated = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class SpendingLimit(Base):
+    """
+    Maximum USDT balance used by buy transactions within rolling time window
+    """
+    __tablename__ = 'spending_limit'
+
+    id = Column(Integer, primary_key=True)
+    settings_id = Column(Integer, index=True, default=tenant.current_id)
+    #: limited trading pair, limit is shared by all pairs if empty
+    pair = Column(String(10))
+    #: window length in seconds
+    window = Column(Integer)
+    amount = Column(Money())
+
 
 class SystemLog(Base):
     """
@@ -68,8 +142,46 @@ class SystemLog(Base):
     __tablename__ = 'log'
 
     id = Column(Integer, primary_key=True)
+    settings_id = Column(Integer, index=True, default=tenant.current_id)
+    #: ``logging`` level, only warnings and errors are persisted
+    level = Column(Integer, default=logging.WARNING)
     message = Column(String)
+    #: sha1 of message, repeated message is looked up by it
+    message_hash = Column(String(40), index=True)
+    created = Column(DateTime, default=datetime.now)
+    #: repeats of the same message are counted in a single entry
+    count = Column(Integer, default=1)
+    last_seen = Column(DateTime, default=datetime.now)
+    persisted = True
+
+    @property
+    def level_name(self):
+        return logging.getLevelName(self.level) if self.level else ''
+
+
+class ActionJournal(Base):
+    """
+    Execution state of actions received from ExA server
+    """
+    __tablename__ = 'action_journal'
+
+    RECEIVED = 'received'
+    VALIDATED = 'validated'
+    ORDERED = 'ordered'
+    CONFIRMED = 'confirmed'
+    REJECTED = 'rejected'
+
+    id = Column(Integer, primary_key=True)
+    settings_id = Column(Integer, index=True, default=tenant.current_id)
+    action_id = Column(Integer, unique=True, nullable=False)
+    exchange = Column(String(10))
+    action_name = Column(String(20))
+    state = Column(String(10))
+    response = Column(String)
+    #: process executing the action, ``None`` once released
+    owner = Column(String(100))
     created = Column(DateTime, default=datetime.now)
+    updated = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
 class Symbol(Base):
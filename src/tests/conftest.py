@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 import pytest
 from __init__ import create_app
+from database import Base, db_session, engine
+from models import Settings, Exchange
+from utils import journal, paper, policy, symbols, trace
 
 buy_action = [
     {u'actions': [
@@ -27,6 +30,13 @@ def side_effect_price(value):
         return {'last': 3000}
 
 
+def max_slippage(a, b):
+    """
+    Paper account ``rand`` filling market orders at maximum slippage
+    """
+    return b
+
+
 @pytest.fixture
 def app():
     app = create_app({
@@ -35,6 +45,14 @@ def app():
 
     yield app
 
+    db_session.remove()
+    Base.metadata.drop_all(bind=engine)
+    journal.clear()
+    paper.reset()
+    trace.buffer.clear()
+    symbols.index.invalidate()
+    policy.spending.reset()
+
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -43,3 +61,53 @@ def client(app):
 @pytest.fixture
 def runner(app):
     return app.test_cli_runner()
+
+
+@pytest.fixture
+def connected(app):
+    """
+    Default ExA account connected to ExA server
+    """
+    settings = Settings.query.get(1)
+    settings.connected = True
+    settings.exa_token = 'token'
+    db_session.commit()
+    return settings
+
+
+@pytest.fixture
+def exchange_keys(app):
+    """
+    Default exchange with API keys, its ExA account has ExA server token
+    """
+    settings = Settings.query.get(1)
+    settings.exa_token = 'token'
+    exchange = Exchange.query.get(1)
+    exchange.api_key = 'apikey'
+    exchange.api_secret = 'apiapisecret'
+    db_session.commit()
+    return exchange
+
+
+@pytest.fixture
+def enabled_exchange(app):
+    """
+    Default exchange with valid API keys enabled for trading
+    """
+    exchange = Exchange.query.get(1)
+    exchange.valid = True
+    exchange.enabled = True
+    db_session.commit()
+    return exchange
+
+
+@pytest.fixture
+def paper_account(exchange_keys):
+    """
+    Paper account trading EXA/BTC in test mode of default ExA account
+    """
+    Settings.query.get(1).test_mode = True
+    db_session.commit()
+    return paper.PaperExchange(
+        balances={'BTC': 1}, prices={'EXA/BTC': '0.0001', 'BTC/USDT': 3000}, slippage=0.01,
+        fee=0.001, rand=max_slippage)
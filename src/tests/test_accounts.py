@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from __init__ import VERSION
+from .conftest import buy_action
+from database import db_session
+from executor import run_accounts
+from models import Settings, Exchange, Transaction
+from utils import tenant
+from utils.balances import get_balances
+from utils.polling import PollResult, ACTIVE
+
+
+def add_account(client, name):
+    response = client.post('/accounts', data={'name': name})
+    assert response.status_code == 302
+    return Settings.query.filter_by(name=name).one()
+
+
+def connect_accounts():
+    for settings in Settings.query:
+        settings.connected = True
+        settings.exa_token = 'token-{}'.format(settings.id)
+        settings.allowed_balance = 100
+    for exchange in Exchange.query:
+        exchange.valid = True
+        exchange.enabled = True
+    db_session.commit()
+
+
+def test_new_account_has_own_exchanges(client, app):
+    account = add_account(client, 'second')
+    exchanges = Exchange.query.filter_by(name='binance').order_by(Exchange.id).all()
+    assert [e.settings_id for e in exchanges] == [1, account.id]
+
+    with client.session_transaction() as session:
+        assert session['account_id'] == account.id
+    client.get('/accounts/1/select')
+    with client.session_transaction() as session:
+        assert session['account_id'] == 1
+
+
+def test_account_ledgers_are_isolated(client, app):
+    account = add_account(client, 'second')
+    connect_accounts()
+    for settings_id, balance in [(1, 10), (account.id, 20), (account.id, 30)]:
+        db_session.add(Transaction(
+            settings_id=settings_id, pair='EXA/BTC', action_name='order_market_buy', amount=1,
+            balance_usdt=balance))
+    db_session.commit()
+
+    items = client.get('/api/transactions').get_json()['items']
+    assert [i['balance_usdt'] for i in items] == ['20', '30']
+    client.get('/accounts/1/select')
+    items = client.get('/api/transactions').get_json()['items']
+    assert [i['balance_usdt'] for i in items] == ['10']
+
+    with tenant.use(account.id):
+        assert get_balances()['EXA/BTC']['balance'] == 50
+    assert get_balances()['EXA/BTC']['balance'] == 10
+
+
+def test_actions_of_all_accounts_are_executed(client, app):
+    account_id = add_account(client, 'second').id
+    connect_accounts()
+
+    executed = []
+    with patch('executor._account_pool', None):
+        with patch('executor.ExAServerHelper') as exa_server_helper:
+            with patch('executor.ExchangeHelper') as exchange_helper:
+                exa_server_helper().get_actions.return_value = buy_action
+                exa_server_helper().available = True
+                exa_server_helper().next_poll = None
+                exchange_helper.side_effect = lambda **kwargs: executed.append(tenant.current_id())
+
+                assert run_accounts(version=VERSION) == PollResult(ACTIVE, None)
+    assert executed == [1, account_id]
+    assert tenant.current_id() == tenant.DEFAULT_ACCOUNT
+
+
+def test_exchange_edit_is_scoped_to_account(client, app):
+    account = add_account(client, 'second')
+    connect_accounts()
+    exchange = Exchange.query.filter_by(settings_id=account.id).one()
+    assert client.get('/exchange/{}/edit'.format(exchange.id)).status_code == 200
+    assert client.get('/exchange/1/edit').status_code == 404
@@ -5,6 +5,7 @@ from unittest.mock import patch, call
 from __init__ import VERSION
 from .conftest import buy_action
 from database import db_session
+from executor import action_totals
 from models import Settings, Exchange
 from utils.server import ExAServerHelper
 
@@ -12,7 +13,7 @@ from utils.server import ExAServerHelper
 def test_exa_server_not_called_if_invalid_exchange(client, app):
     exchange = Exchange.query.get(1)
     assert exchange.valid == False
-    with patch('__init__.ExAServerHelper') as exa_server:
+    with patch('executor.ExAServerHelper') as exa_server:
         assert client.get('/test/run_actions').status_code == 200
         exa_server.assert_not_called()
 
@@ -23,7 +24,7 @@ def test_exa_server_called_if_valid_and_enabled_exchange(client, app):
     exchange.enabled = True
     db_session.commit()
 
-    with patch('__init__.ExAServerHelper') as exa_server:
+    with patch('executor.ExAServerHelper') as exa_server:
         assert client.get('/test/run_actions').status_code == 200
         exa_server().get_actions.assert_called_with(exchanges=['binance'])
 
@@ -49,8 +50,8 @@ def test_exchange_helper_call_each_trade_action_separately(client, app):
     exchange.enabled = True
     db_session.commit()
 
-    with patch('__init__.ExAServerHelper') as exa_server_helper:
-        with patch('__init__.ExchangeHelper') as exchange_helper:
+    with patch('executor.ExAServerHelper') as exa_server_helper:
+        with patch('executor.ExchangeHelper') as exchange_helper:
             exa_server_helper().get_actions.return_value = buy_action
             client.get('/test/run_actions')
 
@@ -62,3 +63,28 @@ def test_exchange_helper_call_each_trade_action_separately(client, app):
             exa_server_helper().get_actions.return_value = buy_action + buy_action
             client.get('/test/run_actions')
             assert exchange_helper.call_count == 2
+
+
+def test_rejected_action_does_not_disable_exchange(client, app):
+    settings = Settings.query.get(1)
+    settings.exa_token = 'token'
+    settings.allowed_pairs = ['ETH/BTC']
+    exchange = Exchange.query.get(1)
+    exchange.valid = True
+    exchange.enabled = True
+    exchange.api_key = 'apikey'
+    exchange.api_secret = 'apiapisecret'
+    db_session.commit()
+    rejected = action_totals['rejected']
+
+    with patch('executor.ExAServerHelper') as exa_server_helper:
+        with patch('utils.exchange.ExAServerHelper') as exchange_server_helper:
+            with patch('utils.exchange.ccxt'):
+                exa_server_helper().get_actions.return_value = buy_action
+                client.get('/test/run_actions')
+                exchange_server_helper().confirm_action.assert_has_calls([
+                    call(action_id=1, status=False, response='EXA/BTC pair is not allowed'),
+                    call(action_id=2, status=False, response='EXA/BTC pair is not allowed')])
+
+    assert Exchange.query.get(1).enabled
+    assert action_totals['rejected'] == rejected + 2
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from database import db_session
+from models import SystemLog, Transaction
+from utils import trace
+
+
+def test_logs_since_id_returns_only_new_entries(client, app):
+    SystemLog.query.delete()
+    db_session.add_all([SystemLog(message='first'), SystemLog(message='second')])
+    db_session.commit()
+
+    response = client.get('/api/logs')
+    assert [i['message'] for i in response.get_json()['items']] == ['first', 'second']
+    since_id = response.get_json()['since_id']
+
+    db_session.add(SystemLog(message='third'))
+    db_session.commit()
+
+    response = client.get('/api/logs?since_id={}'.format(since_id))
+    assert [i['message'] for i in response.get_json()['items']] == ['third']
+
+
+def test_unchanged_logs_return_not_modified(client, app):
+    db_session.add(SystemLog(message='entry'))
+    db_session.commit()
+
+    response = client.get('/api/logs')
+    etag = response.headers['ETag']
+    assert client.get('/api/logs', headers={'If-None-Match': etag}).status_code == 304
+
+    db_session.add(SystemLog(message='new entry'))
+    db_session.commit()
+    assert client.get('/api/logs', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_repeated_log_changes_etag(client, app):
+    trace.log('Server Timeout', level=trace.WARNING)
+    response = client.get('/api/logs')
+    assert response.get_json()['items'][0]['count'] == 1
+
+    trace.log('Server Timeout', level=trace.WARNING)
+    response = client.get('/api/logs', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    item = response.get_json()['items'][0]
+    assert item['count'] == 2
+    assert item['last_seen'] > item['created']
+
+
+def test_repeated_log_is_returned_after_since_id(client, app):
+    trace.log('Server Timeout', level=trace.WARNING)
+    trace.log('Server Maintenance', level=trace.WARNING)
+    data = client.get('/api/logs').get_json()
+    query = 'since_id={}&updated_since={}'.format(data['since_id'], data['updated_since'])
+    response = client.get('/api/logs?' + query)
+    assert response.get_json()['items'] == []
+
+    trace.log('Server Timeout', level=trace.WARNING)
+    response = client.get(
+        '/api/logs?' + query, headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [(i['message'], i['count']) for i in data['items']] == [('Server Timeout', 2)]
+    assert data['updated_since'] == data['items'][0]['last_seen']
+
+    query = 'since_id={}&updated_since={}'.format(data['since_id'], data['updated_since'])
+    assert client.get('/api/logs?' + query).get_json()['items'] == []
+    assert client.get('/api/logs?updated_since=yesterday').status_code == 400
+
+def test_exchanges_return_not_modified(client, app, connected):
+    response = client.get('/api/exchanges')
+    assert response.get_json()[0]['name'] == 'binance'
+    assert client.get(
+        '/api/exchanges', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_reconciled_transaction_changes_etag(client, app, connected):
+    db_session.add(Transaction(
+        pair='EXA/BTC', action_name='order_market_buy', amount=1, balance_usdt=10,
+        reconciled=False))
+    db_session.commit()
+
+    response = client.get('/api/transactions')
+    assert response.get_json()['items'][0]['reconciled'] is False
+
+    transaction = Transaction.query.one()
+    transaction.cost, transaction.fee, transaction.fee_currency = 9, '0.01', 'BNB'
+    transaction.reconciled = True
+    db_session.commit()
+    response = client.get(
+        '/api/transactions', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 200
+    item = response.get_json()['items'][0]
+    assert (item['cost'], item['fee'], item['fee_currency'], item['reconciled']) == (
+        '9', '0.01', 'BNB', True)
+    assert item['updated'] >= item['created']
+
+
+def test_reconciled_transaction_is_returned_after_since_id(client, app, connected):
+    db_session.add(Transaction(
+        pair='EXA/BTC', action_name='order_market_buy', amount=1, balance_usdt=10,
+        reconciled=False))
+    db_session.commit()
+    data = client.get('/api/transactions').get_json()
+    query = 'since_id={}&updated_since={}'.format(data['since_id'], data['updated_since'])
+
+    transaction = Transaction.query.one()
+    transaction.cost, transaction.reconciled = 9, True
+    db_session.commit()
+    items = client.get('/api/transactions?' + query).get_json()['items']
+    assert [(i['id'], i['cost'], i['reconciled']) for i in items] == [(transaction.id, '9', True)]
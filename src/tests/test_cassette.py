@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+import pytest
+import requests
+from ccxt.base.errors import InsufficientFunds
+
+from __init__ import VERSION
+from database import db_session
+from exceptions import ExACassetteException
+from models import Settings
+from utils.cassette import Cassette, CassetteClient, CassetteRequests, RECORD, REPLAY, REALTIME
+from utils.server import ExAServerHelper
+
+
+class ExchangeStandIn(object):
+    """
+    Local stand-in for ccxt client
+    """
+
+    def fetchTicker(self, symbol):
+        return {'symbol': symbol, 'last': 0.0001}
+
+    def createMarketBuyOrder(self, symbol, amount):
+        raise InsufficientFunds('binance Account has insufficient balance for requested action.')
+
+
+class ActionsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.startswith('/api/connect/'):
+            payload = {'api_token': 'server-token-123'}
+        else:
+            payload = [{'exchange': 'binance', 'actions': []}]
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Poll-Interval', '5')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_ccxt_calls_are_replayed(tmpdir):
+    path = str(tmpdir.join('exchange.json.gz'))
+    ticks = iter(range(100))
+    recorder = Cassette(path, mode=RECORD, clock=lambda: next(ticks))
+    client = CassetteClient(ExchangeStandIn(), recorder, 'binance')
+    assert client.fetchTicker('EXA/BTC')['last'] == 0.0001
+    with pytest.raises(InsufficientFunds):
+        client.createMarketBuyOrder(symbol='EXA/BTC', amount=1)
+    recorder.save()
+
+    sleeps = []
+    cassette = Cassette(path, mode=REALTIME, sleep=sleeps.append, clock=lambda: 0)
+    client = CassetteClient(object(), cassette, 'binance')
+    assert client.fetchTicker('EXA/BTC') == {'symbol': 'EXA/BTC', 'last': 0.0001}
+    with pytest.raises(InsufficientFunds):
+        client.createMarketBuyOrder(symbol='EXA/BTC', amount=1)
+    #: calls started at 1 and 3 seconds and took 1 second each
+    assert sleeps == [2, 4]
+    assert cassette.remaining() == 0
+    with pytest.raises(ExACassetteException):
+        client.fetchTicker('EXA/BTC')
+
+
+def test_server_traffic_is_replayed_without_network(client, app, tmpdir):
+    settings = Settings.query.get(1)
+    settings.exa_token = 'token'
+    db_session.commit()
+
+    server = HTTPServer(('127.0.0.1', 0), ActionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    path = str(tmpdir.join('server.json.gz'))
+    recorder = Cassette(path, mode=RECORD)
+    with patch.object(ExAServerHelper, 'SERVER_URL', 'http://127.0.0.1:{}'.format(server.server_port)):
+        with patch('utils.server.requests', CassetteRequests(requests, recorder)):
+            helper = ExAServerHelper(version=VERSION)
+            assert helper.connect('alice', 's3cret')
+            recorded = helper.get_actions(exchanges=['binance'])
+        server.shutdown()
+        server.server_close()
+        recorder.save()
+
+        with patch('utils.server.requests', CassetteRequests(requests, Cassette(path, mode=REPLAY))):
+            helper = ExAServerHelper(version=VERSION)
+            assert helper.connect('bob', 'other')
+            assert helper.get_actions(exchanges=['binance']) == recorded
+            assert helper.next_poll == 5
+    with gzip.open(path, 'rt') as cassette_file:
+        content = cassette_file.read()
+    for secret in ['alice', 's3cret', 'server-token-123', 'Token']:
+        assert secret not in content
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from ccxt.base.errors import RequestTimeout, AuthenticationError
+
+from .conftest import buy_action
+from database import db_session
+from models import Exchange
+from utils.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def test_breaker_opens_after_threshold_and_doubles_cool_down(client, app, enabled_exchange):
+    exchange = enabled_exchange
+    breaker = CircuitBreaker(exchange)
+    for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+        assert breaker.state == CLOSED
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert exchange.breaker_cool_down == CircuitBreaker.COOL_DOWN
+
+    exchange.breaker_open_until = datetime.utcnow() - timedelta(seconds=1)
+    assert breaker.state == HALF_OPEN
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert exchange.breaker_cool_down == CircuitBreaker.COOL_DOWN * 2
+
+    exchange.breaker_open_until = datetime.utcnow() - timedelta(seconds=1)
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert exchange.breaker_failures == 0
+
+
+def test_transient_failure_keeps_exchange_enabled(client, app, enabled_exchange):
+    with patch('executor.ExAServerHelper') as exa_server_helper:
+        with patch('executor.ExchangeHelper') as exchange_helper:
+            exa_server_helper().get_actions.return_value = buy_action
+            exchange_helper().run_actions.side_effect = RequestTimeout('timeout')
+            for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+                client.get('/test/run_actions')
+
+            exchange = Exchange.query.get(1)
+            assert exchange.enabled
+            assert exchange.breaker_state == OPEN
+
+            exa_server_helper().get_actions.reset_mock()
+            client.get('/test/run_actions')
+            exa_server_helper().get_actions.assert_not_called()
+
+
+def test_half_open_probe_closes_breaker(client, app, enabled_exchange):
+    exchange = enabled_exchange
+    exchange.breaker_state = OPEN
+    exchange.breaker_failures = 3
+    exchange.breaker_open_until = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+    with patch('executor.ExAServerHelper') as exa_server_helper:
+        with patch('executor.ExchangeHelper') as exchange_helper:
+            exa_server_helper().get_actions.return_value = []
+            client.get('/test/run_actions')
+            exchange_helper().probe.assert_called_once_with()
+            exa_server_helper().get_actions.assert_called_with(exchanges=['binance'])
+    assert Exchange.query.get(1).breaker_state == CLOSED
+
+
+def test_permanent_failure_disables_exchange(client, app, enabled_exchange):
+    with patch('executor.ExAServerHelper') as exa_server_helper:
+        with patch('executor.ExchangeHelper') as exchange_helper:
+            exa_server_helper().get_actions.return_value = buy_action
+            exchange_helper().run_actions.side_effect = AuthenticationError('invalid key')
+            client.get('/test/run_actions')
+    assert not Exchange.query.get(1).enabled
+
+
+def test_expired_breaker_is_shown_half_open(client, app, enabled_exchange, connected):
+    exchange = enabled_exchange
+    exchange.api_key = 'apikey'
+    exchange.breaker_state = OPEN
+    exchange.breaker_open_until = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+
+    assert client.get('/api/exchanges').get_json()[0]['breaker_state'] == HALF_OPEN
+    with patch('__init__.get_balances', return_value={}):
+        page = client.get('/dashboard').get_data(as_text=True)
+    assert 'Half open' in page
+    assert 'Retry after' not in page
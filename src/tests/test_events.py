@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import json
+
+from database import db_session
+from models import Transaction
+from utils import events
+from utils.server import ExAServerHelper
+from __init__ import VERSION
+
+
+def test_slow_subscriber_drops_oldest_events_without_blocking_publisher():
+    bus = events.EventBus(subscription_size=2)
+    fast = bus.subscribe()
+    slow = bus.subscribe()
+    for i in range(3):
+        bus.publish('log', {'message': i})
+        fast.get(timeout=0)
+
+    assert slow.dropped == 1
+    assert [slow.get(timeout=0)['data']['message'] for _ in range(2)] == [1, 2]
+    assert fast.dropped == 0
+
+
+def test_stream_reports_overflow_and_unsubscribes():
+    bus = events.EventBus(subscription_size=1)
+    subscription = bus.subscribe()
+    bus.publish('log', {'message': 'first'})
+    bus.publish('log', {'message': 'second'})
+
+    stream = events.stream(subscription, heartbeat=0)
+    assert next(stream).startswith('retry')
+    assert next(stream) == 'event: overflow\ndata: {"dropped": 1}\n\n'
+    assert next(stream) == 'id: 2\nevent: log\ndata: {"message": "second"}\n\n'
+    assert next(stream) == ': heartbeat\n\n'
+    stream.close()
+    assert bus.subscribers == 0
+
+
+def test_log_is_published(client, app):
+    subscription = events.bus.subscribe()
+    try:
+        ExAServerHelper(version=VERSION).log('Server Timeout')
+        event = subscription.get(timeout=1)
+        assert event['event'] == 'log'
+        assert event['data']['message'] == 'Server Timeout'
+        assert json.loads(events.format_event(event['event'], event['data']).split('data: ')[1])
+    finally:
+        subscription.close()
+
+
+def test_follower_publishes_rows_written_by_other_process(client, app):
+    leader = []
+    follower = events.TableFollower(events.bus, paused=lambda: bool(leader))
+    follower.poll()
+    subscription = events.bus.subscribe()
+    try:
+        db_session.add(Transaction(
+            pair='EXA/BTC', action_name='order_market_buy', amount=1, balance_usdt=1))
+        db_session.commit()
+        follower.poll()
+        assert subscription.get(timeout=0)['data']['pair'] == 'EXA/BTC'
+
+        #: leader publishes its rows directly
+        leader.append(True)
+        db_session.add(Transaction(
+            pair='ETH/BTC', action_name='order_market_buy', amount=1, balance_usdt=1))
+        db_session.commit()
+        follower.poll()
+        assert subscription.get(timeout=0) is None
+    finally:
+        subscription.close()
+
+
+def test_open_streams_are_limited(client, app):
+    subscriptions = [events.bus.subscribe() for _ in range(events.STREAM_LIMIT)]
+    try:
+        response = client.get('/stream')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(events.HEARTBEAT)
+    finally:
+        for subscription in subscriptions:
+            subscription.close()
+    assert events.bus.subscribers == 0
@@ -3,7 +3,6 @@
 from decimal import Decimal as D
 from unittest.mock import patch, call, MagicMock
 
-from ccxt import BaseError
 from ccxt.base.errors import InsufficientFunds
 
 from __init__ import VERSION
@@ -97,13 +96,12 @@ def test_buy_raise_exception_if_insufficend_balance_exception_exceed(client, app
             ccxt_helper.binance().fetchTicker = MagicMock(side_effect=side_effect_price)
             ccxt_helper.binance().fetchBalance.return_value = {'BTC': {'free': 200}, 'EXA': {'free': 10}}
 
-            try:
-                ExchangeHelper(exchange='binance', version=VERSION).run_actions(buy_action[0]['actions'])
-            except BaseError:
-                pass
+            result = ExchangeHelper(exchange='binance', version=VERSION).run_actions(buy_action[0]['actions'])
 
             exa_server_helper().confirm_action.assert_called_once_with(action_id=1, response='', status=False)
-            exa_server_helper().sync_amount.assert_not_called()
+            #: rejected buy does not stop the rest of the batch
+            assert result.rejected == [(1, '')]
+            exa_server_helper().sync_amount.assert_called_once_with(action_id=2, balance=D(10))
 
 
 def test_buy_reduce_amount_if_not_enough_balance(client, app):
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import csv
+import gzip
+import json
+from datetime import datetime
+
+from database import db_session
+from models import Settings, Transaction, SystemLog
+from utils import export
+
+
+def add_transactions():
+    settings = Settings.query.get(1)
+    settings.connected = True
+    for day, pair in [(1, 'EXA/BTC'), (2, 'ETH/BTC'), (3, 'EXA/BTC')]:
+        db_session.add(Transaction(
+            pair=pair, action_name='order_market_buy', amount='1.5', balance_usdt=10,
+            created=datetime(2018, 7, day)))
+    db_session.add(Transaction(
+        settings_id=2, pair='EXA/BTC', action_name='order_market_buy', amount=1, balance_usdt=1,
+        created=datetime(2018, 7, 2)))
+    db_session.commit()
+
+
+def test_csv_encoding_is_chunked():
+    chunks = list(export.encode_csv(['id'], ([i] for i in range(5)), chunk_size=2))
+    assert chunks == ['id\r\n0\r\n1\r\n', '2\r\n3\r\n', '4\r\n']
+
+
+def test_export_transactions_csv_with_filters(client, app):
+    add_transactions()
+    response = client.get('/export/transactions.csv?pair=EXA/BTC&since=2018-07-02')
+    assert response.headers['Content-Disposition'] == 'attachment; filename=transactions.csv'
+    rows = list(csv.reader(response.get_data(as_text=True).splitlines()))
+    assert rows == [
+        ['id', 'created', 'pair', 'action_name', 'amount', 'balance_usdt', 'cost', 'fee',
+         'fee_currency', 'reconciled'],
+        ['3', '2018-07-03T00:00:00', 'EXA/BTC', 'order_market_buy', '1.5', '10', '', '', '', '']]
+
+    assert client.get('/export/transactions.csv?since=yesterday').status_code == 400
+    assert client.get('/export/transactions.xml').status_code == 404
+
+
+def test_export_gzipped_json_lines(client, app):
+    add_transactions()
+    db_session.add(SystemLog(message='Server Timeout'))
+    db_session.commit()
+
+    response = client.get('/export/transactions.jsonl?gzip=1&until=2018-07-03')
+    assert response.mimetype == 'application/gzip'
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert [json.loads(line)['pair'] for line in lines] == ['EXA/BTC', 'ETH/BTC']
+
+    lines = client.get('/export/logs.jsonl').get_data(as_text=True).splitlines()
+    assert [(i['message'], i['level'], i['count']) for i in map(json.loads, lines)] == [
+        ('Server Timeout', 30, 1)]
+
+
+def test_export_requires_connection(client, app):
+    assert client.get('/export/logs.csv').status_code == 302
+    assert client.get('/export/transactions.csv').status_code == 302
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+from __init__ import VERSION
+from .conftest import sell_action, side_effect_price
+from database import db_session
+from models import ActionJournal, Transaction
+from utils import journal
+from utils.exchange import ExchangeHelper
+
+
+def test_repeated_action_is_executed_once(client, app, exchange_keys):
+    with patch('utils.exchange.ExAServerHelper') as exa_server_helper:
+        with patch('utils.exchange.ccxt') as ccxt_helper:
+            ccxt_helper.binance().fetchTicker = MagicMock(side_effect=side_effect_price)
+            ccxt_helper.binance().fetchBalance.return_value = {'BTC': {'free': 200}, 'EXA': {'free': 10}}
+            ccxt_helper.binance().createMarketSellOrder.return_value = 'response'
+
+            ExchangeHelper(exchange='binance', version=VERSION).run_actions(sell_action[0]['actions'])
+            ExchangeHelper(exchange='binance', version=VERSION).run_actions(sell_action[0]['actions'])
+            journal.clear()
+            ExchangeHelper(exchange='binance', version=VERSION).run_actions(sell_action[0]['actions'])
+
+            ccxt_helper.binance().createMarketSellOrder.assert_called_once()
+            exa_server_helper().confirm_action.assert_called_once()
+    assert ActionJournal.query.filter_by(action_id=3).one().state == ActionJournal.CONFIRMED
+
+
+def test_failed_confirmation_is_retried_without_new_order(client, app, exchange_keys):
+    with patch('utils.exchange.ExAServerHelper') as exa_server_helper:
+        with patch('utils.exchange.ccxt') as ccxt_helper:
+            ccxt_helper.binance().fetchTicker = MagicMock(side_effect=side_effect_price)
+            ccxt_helper.binance().fetchBalance.return_value = {'BTC': {'free': 200}, 'EXA': {'free': 10}}
+            ccxt_helper.binance().createMarketSellOrder.return_value = 'response'
+            exa_server_helper().confirm_action.side_effect = [Exception('Server Timeout'), None]
+
+            try:
+                ExchangeHelper(exchange='binance', version=VERSION).run_actions(sell_action[0]['actions'])
+            except Exception:
+                pass
+            assert ActionJournal.query.filter_by(action_id=3).one().state == ActionJournal.ORDERED
+            #: filled order is in the ledger even though it was not confirmed
+            assert Transaction.query.one().action_id == 3
+
+            ExchangeHelper(exchange='binance', version=VERSION).run_actions(sell_action[0]['actions'])
+            ccxt_helper.binance().createMarketSellOrder.assert_called_once()
+            assert exa_server_helper().confirm_action.call_count == 2
+    assert ActionJournal.query.filter_by(action_id=3).one().state == ActionJournal.CONFIRMED
+    assert Transaction.query.count() == 1
+
+
+def test_action_in_flight_in_other_process_is_not_claimed(client, app):
+    db_session.add(ActionJournal(
+        action_id=3, exchange='binance', action_name='order_market_sell',
+        state=ActionJournal.RECEIVED, owner='other-container:1'))
+    db_session.commit()
+
+    assert journal.claim(3, exchange='binance', action_name='order_market_sell') is None
+
+    entry = ActionJournal.query.filter_by(action_id=3).one()
+    entry.updated = datetime.now() - timedelta(seconds=journal.CLAIM_TIMEOUT + 1)
+    db_session.commit()
+    entry = journal.claim(3, exchange='binance', action_name='order_market_sell')
+    assert entry.owner == journal.owner()
+    assert journal.claim(3, exchange='binance', action_name='order_market_sell') is None
+
+    journal.release(3)
+    assert ActionJournal.query.filter_by(action_id=3).one().owner is None
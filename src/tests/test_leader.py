@@ -0,0 +1,37 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+import subprocess
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from utils.leader import FileLock, default_lock_path
+
+HOLD_LOCK = 'import sys; from utils.leader import FileLock; print(FileLock(sys.argv[1]).acquire())'
+
+
+def test_only_one_process_holds_leader_lock(tmpdir):
+    path = str(tmpdir.join('leader.lock'))
+    leader = FileLock(path)
+    assert leader.acquire()
+    assert leader.acquire()
+
+    src_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    output = subprocess.check_output(
+        [sys.executable, '-c', HOLD_LOCK, path], cwd=src_path, env=dict(os.environ, DB='sqlite://'))
+    assert output.decode().strip() == 'False'
+
+    leader.release()
+    output = subprocess.check_output(
+        [sys.executable, '-c', HOLD_LOCK, path], cwd=src_path, env=dict(os.environ, DB='sqlite://'))
+    assert output.decode().strip() == 'True'
+
+
+def test_sqlite_database_is_locked_next_to_database_file():
+    with patch('utils.leader.engine', create_engine('sqlite:////data/exa.db')):
+        assert default_lock_path() == '/data/exa.db.leader.lock'
+    with patch('utils.leader.engine', create_engine('sqlite://')):
+        assert default_lock_path().startswith(tempfile.gettempdir())
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import json
+import threading
+from decimal import Decimal as D
+from unittest.mock import patch, MagicMock
+
+from __init__ import VERSION
+from .conftest import side_effect_price
+from database import db_session
+from executor import Executor
+from models import Settings
+from utils import market_data
+from utils.exchange import ExchangeHelper
+
+
+class WebsocketStandIn(object):
+    """
+    Local stand-in for exchange websocket connection
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.urls = []
+        self.drained = threading.Event()
+        self.closed = threading.Event()
+
+    def __call__(self, url):
+        self.urls.append(url)
+        return self
+
+    def recv(self):
+        if self.messages:
+            return self.messages.pop(0)
+        self.drained.set()
+        self.closed.wait(5)
+        return ''
+
+    def close(self):
+        self.closed.set()
+
+
+def ticker(symbol, price):
+    return json.dumps({'stream': '{}@miniTicker'.format(symbol.lower()),
+                       'data': {'e': '24hrMiniTicker', 's': symbol, 'c': price}})
+
+
+def test_stream_symbols_include_usdt_legs():
+    assert market_data.stream_symbols(['EXA/BTC', 'ETH/USDT']) == {'EXA/BTC', 'BTC/USDT', 'ETH/USDT'}
+
+
+def test_price_book_staleness():
+    book = market_data.PriceBook()
+    book.update('EXA/BTC', '10', updated=1)
+    assert book.get('EXA/BTC') is None
+    book.update('EXA/BTC', '10')
+    assert book.get('EXA/BTC') == D('10')
+
+
+def test_subscriber_updates_price_book():
+    book = market_data.PriceBook()
+    websocket = WebsocketStandIn([ticker('EXABTC', '11'), ticker('BTCUSDT', '3000.5')])
+    subscriber = market_data.MarketDataSubscriber(
+        url='ws://localhost', symbols={'EXA/BTC', 'BTC/USDT'}, book=book, connect=websocket)
+    subscriber.start()
+    websocket.drained.wait(5)
+    subscriber.stop()
+
+    assert websocket.urls == ['ws://localhost/stream?streams=btcusdt@miniTicker/exabtc@miniTicker']
+    assert book.get('EXA/BTC') == D('11')
+    assert book.get('BTC/USDT') == D('3000.5')
+
+
+def test_fresh_stream_price_skips_ticker_request(client, app, exchange_keys):
+    with patch('utils.exchange.ExAServerHelper'):
+        with patch('utils.exchange.ccxt') as ccxt_helper:
+            ccxt_helper.binance().fetchTicker = MagicMock(side_effect=side_effect_price)
+            helper = ExchangeHelper(exchange='binance', version=VERSION)
+            try:
+                market_data.price_book.update('EXA/BTC', '12')
+                assert helper.get_latest_price({'symbol': 'EXA/BTC'}) == D('12')
+                ccxt_helper.binance().fetchTicker.assert_not_called()
+
+                market_data.price_book.update('EXA/BTC', '12', updated=1)
+                assert helper.get_latest_price({'symbol': 'EXA/BTC'}) == D('10')
+            finally:
+                market_data.price_book.clear()
+
+
+def test_executor_cycle_follows_pairs_changed_by_other_process(client, app):
+    settings = Settings.query.get(1)
+    settings.allowed_pairs = ['EXA/BTC']
+    db_session.commit()
+
+    executor = Executor(version=VERSION)
+    subscriber = MagicMock()
+    with patch.object(executor.leader, 'acquire', return_value=True), \
+            patch('utils.market_data.subscriber', subscriber), \
+            patch('executor.run_accounts'):
+        executor.run()
+    subscriber.update_symbols.assert_called_once_with({'EXA/BTC', 'BTC/USDT'})
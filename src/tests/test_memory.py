@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from __init__ import VERSION
+from database import db_session, scoped_job
+from executor import Executor
+from models import Settings
+from utils.memory import MemoryTracker
+
+leaked = []
+
+
+def leak():
+    leaked.append(bytearray(1024 * 1024))
+
+
+def test_scoped_job_removes_session(client, app):
+    @scoped_job
+    def job():
+        return Settings.query.get(1).id
+
+    db_session.remove()
+    assert job() == 1
+    assert not db_session.registry.has()
+
+
+def test_executor_cycle_does_not_keep_session(client, app):
+    executor = Executor(version=VERSION)
+    with patch.object(executor.leader, 'acquire', return_value=True), \
+            patch('executor.market_data.start'), \
+            patch('executor.run_accounts', side_effect=lambda **kwargs: Settings.query.all()):
+        db_session.remove()
+        executor.run()
+    assert not db_session.registry.has()
+    assert executor.cycles == 1
+
+
+def test_memory_tracker_reports_growth_by_cycle_and_allocator(client, app):
+    tracker = MemoryTracker()
+    assert tracker.record_cycle() is None
+    tracker.start()
+    try:
+        tracker.record_cycle()
+        leak()
+        cycle = tracker.record_cycle()
+        assert cycle.cycle == 2
+        assert cycle.growth >= 1024 * 1024
+
+        location = 'test_memory.py:{}'.format(leak.__code__.co_firstlineno + 1)
+        report = tracker.report(limit=5)
+        assert [c['cycle'] for c in report['cycles']] == [1, 2]
+        assert report['top'][0]['location'].endswith(location)
+        assert report['growth'][0]['location'].endswith(location)
+        assert report['growth'][0]['size_diff'] >= 1024 * 1024
+    finally:
+        tracker.stop()
+        leaked.clear()
+    assert tracker.report() == {'tracing': False}
+
+
+def test_debug_memory_endpoint(client, app):
+    assert client.get('/debug/memory').status_code == 302
+
+    Settings.query.get(1).connected = True
+    db_session.commit()
+    assert client.get('/debug/memory').get_json() == {'tracing': False}
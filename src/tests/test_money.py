@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from decimal import Decimal as D
+
+from database import db_session, engine, migrate_money_columns
+from models import Settings, Transaction
+from utils.balances import get_balances
+from utils.exchange import ExchangeHelper
+
+
+def add_buy(balance_usdt):
+    db_session.add(Transaction(
+        pair='EXA/BTC', action_name='order_market_buy', amount=1, balance_usdt=balance_usdt))
+
+
+def test_money_is_exact(client, app):
+    for value in [0.1, 0.2, D('0.123456789')]:
+        add_buy(value)
+    db_session.commit()
+
+    assert [t.balance_usdt for t in Transaction.query.order_by(Transaction.id)] == [
+        D('0.1'), D('0.2'), D('0.12345679')]
+
+
+def test_balances_are_summed_in_database(client, app):
+    settings = Settings.query.get(1)
+    settings.allowed_balance = D('0.3')
+    add_buy(0.1)
+    add_buy(0.2)
+    db_session.commit()
+
+    assert get_balances()['EXA/BTC'] == {'balance': D('0.3'), 'label': 'warning'}
+
+    helper = ExchangeHelper.__new__(ExchangeHelper)
+    helper.settings = settings
+    action = {'action': 'order_market_buy', 'symbol': {'symbol': 'EXA/BTC'}}
+    assert helper.check_balance(action) is False
+    assert helper.balance_used == D('0.3')
+    settings.allowed_balance = D('0.30000001')
+    assert helper.check_balance(action) is True
+
+
+def test_float_columns_are_migrated(client, app):
+    db_session.remove()
+    engine.execute('DROP TABLE transactions')
+    engine.execute(
+        'CREATE TABLE transactions (id INTEGER PRIMARY KEY, pair VARCHAR(10), '
+        'action_name VARCHAR(20), amount FLOAT, balance_usdt FLOAT, created DATETIME)')
+    engine.execute(
+        "INSERT INTO transactions (pair, action_name, amount, balance_usdt) "
+        "VALUES ('EXA/BTC', 'order_market_buy', 10.1, 0.1), ('EXA/BTC', 'order_market_buy', 1, 0.2)")
+
+    migrate_money_columns()
+    migrate_money_columns()
+
+    assert [(t.amount, t.balance_usdt) for t in Transaction.query.order_by(Transaction.id)] == [
+        (D('10.1'), D('0.1')), (D('1'), D('0.2'))]
+    assert engine.execute('SELECT SUM(balance_usdt) FROM transactions').scalar() == 30000000
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from copy import deepcopy
+from decimal import Decimal as D
+from unittest.mock import patch
+
+import pytest
+from ccxt.base.errors import InsufficientFunds
+
+from __init__ import VERSION
+from .conftest import buy_action, sell_action, max_slippage
+from models import ActionJournal, Exchange, Transaction
+from utils.exchange import ExchangeHelper
+from utils.paper import PaperExchange, parse_amounts
+
+
+def test_paper_market_orders_update_balances():
+    account = PaperExchange(
+        balances={'USDT': 1000}, prices={'BTC/USDT': 100}, slippage=0.01, fee=0.001,
+        rand=max_slippage)
+
+    order = account.createMarketBuyOrder(symbol='BTC/USDT', amount=D('2'))
+    assert order['status'] == 'closed'
+    assert order['price'] == 101
+    assert order['fee'] == {'cost': 0.202, 'currency': 'USDT'}
+    assert account.balances == {'USDT': D('797.798'), 'BTC': D('2')}
+
+    account.createMarketSellOrder(symbol='BTC/USDT', amount=1)
+    assert account.fetchBalance()['BTC'] == {'free': 1.0, 'used': 0.0, 'total': 1.0}
+    assert [t['side'] for t in account.fetchMyTrades('BTC/USDT')] == ['buy', 'sell']
+    assert account.fetchMyTrades('ETH/USDT') == []
+
+
+def test_paper_insufficient_funds():
+    account = PaperExchange(balances={'USDT': 10}, prices={'BTC/USDT': 100})
+    with pytest.raises(InsufficientFunds):
+        account.createMarketBuyOrder(symbol='BTC/USDT', amount=1)
+    with pytest.raises(InsufficientFunds):
+        account.createMarketSellOrder(symbol='BTC/USDT', amount=1)
+    assert account.balances == {'USDT': D('10'), 'BTC': D('0')}
+    assert account.fetchMyTrades() == []
+
+
+def test_paper_price_feed_and_latency():
+    waits = []
+    account = PaperExchange(
+        prices={'EXA/BTC': '0.0001'}, price_feed={'BTC/USDT': 3000}.get, latency=0.05,
+        sleep=waits.append)
+    assert account.fetchTicker('EXA/BTC')['last'] == 0.0001
+    assert account.fetchTicker('BTC/USDT')['last'] == 3000
+    assert waits == [0.05, 0.05]
+
+
+def test_parse_amounts():
+    assert parse_amounts('BTC:1, USDT:10000,') == {'BTC': D('1'), 'USDT': D('10000')}
+
+
+def test_test_mode_trades_on_paper_account(client, app, paper_account):
+    account = paper_account
+    #: shared actions are modified by other tests
+    buy_actions, sell_actions = deepcopy(buy_action[0]['actions']), deepcopy(sell_action[0]['actions'])
+    for action in buy_actions + sell_actions:
+        action['amount'] = '10.00000000'
+    with patch('utils.exchange.paper.get_exchange', return_value=account):
+        with patch('utils.exchange.ExAServerHelper') as exa_server_helper:
+            with patch('utils.exchange.ccxt') as ccxt_helper:
+                ExchangeHelper(exchange='binance', version=VERSION).run_actions(buy_actions)
+                ExchangeHelper(exchange='binance', version=VERSION).run_actions(sell_actions)
+
+                ccxt_helper.binance().createMarketBuyOrder.assert_not_called()
+                ccxt_helper.binance().fetchBalance.assert_not_called()
+
+    assert account.balances['EXA'] == 0
+    assert [t['side'] for t in account.fetchMyTrades()] == ['buy', 'sell']
+    assert Transaction.query.count() == 2
+    exa_server_helper().sync_amount.assert_called_once_with(action_id=2, balance=D(10))
+    assert exa_server_helper().confirm_action.call_args_list[0][1]['response']['info'] == {
+        'paper': True}
+
+
+def test_test_mode_assets_never_held(client, app, paper_account):
+    account = paper_account
+    actions = deepcopy(buy_action[0]['actions'][1:] + sell_action[0]['actions'])
+    with patch('utils.exchange.paper.get_exchange', return_value=account):
+        with patch('utils.exchange.ExAServerHelper') as exa_server_helper:
+            result = ExchangeHelper(exchange='binance', version=VERSION).run_actions(actions)
+
+    assert result.executed == [2]
+    assert [action_id for action_id, _ in result.rejected] == [3]
+    exa_server_helper().sync_amount.assert_called_once_with(action_id=2, balance=D(0))
+    exa_server_helper().confirm_action.assert_called_once()
+    assert exa_server_helper().confirm_action.call_args[1]['status'] is False
+    entries = ActionJournal.query.order_by(ActionJournal.action_id)
+    assert [(e.action_id, e.state) for e in entries] == [
+        (2, ActionJournal.CONFIRMED), (3, ActionJournal.REJECTED)]
+    assert Exchange.query.get(1).enabled
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import copy
+from datetime import datetime, timedelta
+from decimal import Decimal as D
+from unittest.mock import patch, MagicMock
+
+from __init__ import VERSION
+from .conftest import buy_action
+from database import db_session
+from models import SpendingLimit, Transaction
+from utils import policy
+from utils.exchange import ExchangeHelper
+
+NOW = datetime(2018, 7, 1, 12)
+
+
+def add_buy(pair, balance_usdt, created, settings_id=1):
+    db_session.add(Transaction(
+        settings_id=settings_id, pair=pair, action_name='order_market_buy', amount=1,
+        balance_usdt=balance_usdt, created=created))
+    db_session.commit()
+
+
+def test_window_counter_drops_expired_buckets():
+    counter = policy.WindowCounter(window=3600, bucket=60)
+    counter.add(D(1), NOW - timedelta(seconds=3700))
+    counter.add(D(2), NOW - timedelta(seconds=3590))
+    counter.add(D(4), NOW)
+
+    assert counter.total(NOW) == D(6)
+    assert counter.total(NOW + timedelta(seconds=60)) == D(4)
+
+
+def test_spending_is_counted_per_pair_and_window(client, app):
+    add_buy('EXA/BTC', 100, NOW - timedelta(days=2))
+    add_buy('EXA/BTC', 10, NOW - timedelta(hours=2))
+    add_buy('ETH/BTC', 20, NOW - timedelta(hours=2))
+    add_buy('EXA/BTC', 50, NOW, settings_id=2)
+    spending = policy.SpendingPolicy(clock=lambda: NOW)
+    spending.rebuild()
+
+    assert spending.spent(1, 'order_market_buy', 'EXA/BTC') == D(110)
+    assert spending.spent(1, 'order_market_buy', 'EXA/BTC', window=86400) == D(10)
+    assert spending.spent(1, 'order_market_buy', window=86400) == D(30)
+
+    add_buy('EXA/BTC', 5, NOW)
+    spending.record(Transaction.query.order_by(Transaction.id.desc()).first())
+    assert spending.spent(1, 'order_market_buy', 'EXA/BTC', window=86400) == D(15)
+    assert spending.spent(1, 'order_market_buy', window=86400) == D(35)
+    assert spending.spent(2, 'order_market_buy', window=86400) == D(50)
+
+    db_session.add_all([
+        SpendingLimit(settings_id=1, pair=None, window=86400, amount=40),
+        SpendingLimit(settings_id=1, pair='EXA/BTC', window=3600, amount=10)])
+    db_session.commit()
+    assert spending.check(1, 'EXA/BTC', 5) is None
+    limit, used = spending.check(1, 'EXA/BTC', 6)
+    assert (limit.pair, used) == ('EXA/BTC', D(5))
+    limit, used = spending.check(1, 'ETH/BTC', 6)
+    assert (limit.pair, used) == (None, D(35))
+
+
+def test_buy_is_rejected_when_limit_is_exceeded(client, app, exchange_keys, enabled_exchange):
+    db_session.add(SpendingLimit(pair='EXA/BTC', window=86400, amount=500000))
+    db_session.commit()
+    actions = copy.deepcopy(buy_action[0]['actions'][:1])
+    actions[0]['amount'] = '10.00000000'
+
+    with patch('utils.exchange.ExAServerHelper') as exa_server_helper:
+        with patch('utils.exchange.ccxt') as ccxt_helper:
+            ccxt_helper.binance().fetchTicker = MagicMock(
+                side_effect=lambda symbol: {'last': 3000 if symbol == 'BTC/USDT' else 10})
+            ccxt_helper.binance().fetchBalance.return_value = {'BTC': {'free': 200}}
+            ccxt_helper.binance().createMarketBuyOrder.return_value = 'response'
+
+            ExchangeHelper(exchange='binance', version=VERSION).run_actions(copy.deepcopy(actions))
+            assert policy.spending.spent(1, 'order_market_buy', 'EXA/BTC', 86400) == D(300000)
+
+            actions[0]['action_id'] = 10
+            actions.append(dict(actions[0], action_id=11, symbol=dict(
+                actions[0]['symbol'], symbol='ETH/BTC', base_asset='ETH')))
+            result = ExchangeHelper(exchange='binance', version=VERSION).run_actions(actions)
+            assert result.executed == [11]
+            assert [action_id for action_id, _ in result.rejected] == [10]
+            assert ccxt_helper.binance().createMarketBuyOrder.call_count == 2
+            exa_server_helper().confirm_action.assert_any_call(
+                action_id=10, status=False, response=(
+                    'Spending limit exceeded: 300000 + 300000.0000000 > 500000 USDT per 86400 '
+                    'seconds for EXA/BTC'))
+
+
+def test_limits_are_managed_on_security_page(client, app, connected):
+
+    client.post('/security/limits', data={'pair': '', 'window': '86400', 'amount': '500'})
+    limit = SpendingLimit.query.one()
+    assert (limit.pair, limit.window, limit.amount) == (None, 86400, D(500))
+    assert '24 hours' in client.get('/security/').get_data(as_text=True)
+
+    response = client.post(
+        '/security/limits', data={'pair': 'XYZ/BTC', 'window': '3600', 'amount': '1'})
+    assert 'Unknown trading pair' in response.get_data(as_text=True)
+
+    client.get('/security/limits/{}/delete'.format(limit.id))
+    assert SpendingLimit.query.count() == 0
+
+
+def test_deleted_transactions_are_not_counted(client, app, connected):
+    for _ in range(3):
+        add_buy('EXA/BTC', 30, NOW)
+    assert policy.spending.spent(1, 'order_market_buy') == D(90)
+
+    client.get('/transactions/delete')
+    assert policy.spending.spent(1, 'order_market_buy') == D(0)
+    add_buy('EXA/BTC', 50, NOW)
+    assert policy.spending.spent(1, 'order_market_buy') == D(50)
+
+
+def test_transactions_deleted_by_other_process_are_not_counted(client, app):
+    spending = policy.SpendingPolicy(clock=lambda: NOW)
+    for _ in range(3):
+        add_buy('EXA/BTC', 30, NOW)
+    assert spending.spent(1, 'order_market_buy', window=3600) == D(90)
+
+    Transaction.query.delete()
+    db_session.commit()
+    #: id of deleted transaction is reused
+    add_buy('EXA/BTC', 50, NOW)
+    assert Transaction.query.one().id == 1
+    assert spending.spent(1, 'order_market_buy', window=3600) == D(50)
+
+
+def test_transactions_deleted_through_other_process_are_not_counted(client, app, connected):
+    #: spending counters of process executing actions
+    leader = policy.SpendingPolicy(clock=lambda: NOW)
+    add_buy('EXA/BTC', 30, NOW)
+    add_buy('EXA/BTC', 20, NOW, settings_id=2)
+    assert leader.spent(1, 'order_market_buy', window=3600) == D(30)
+
+    client.get('/transactions/delete')
+    assert Transaction.query.one().settings_id == 2
+    assert leader.spent(1, 'order_market_buy', window=3600) == D(0)
+    assert leader.spent(2, 'order_market_buy', window=3600) == D(20)
+    add_buy('EXA/BTC', 50, NOW)
+    assert leader.spent(1, 'order_market_buy', window=3600) == D(50)
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+from apscheduler.events import JobSubmissionEvent, EVENT_JOB_MAX_INSTANCES
+
+from __init__ import VERSION
+from database import db_session
+from executor import Executor, run_actions
+from models import Settings, Exchange
+from utils.polling import AdaptiveInterval, PollResult, suggested_delay, ACTIVE, IDLE, UNAVAILABLE
+
+
+def no_jitter(a, b):
+    return 0
+
+
+def test_adaptive_interval_backs_off_when_idle():
+    interval = AdaptiveInterval(rand=no_jitter)
+    delays = [interval.next_delay(PollResult(IDLE, None)) for _ in range(6)]
+    assert delays[0] == 15
+    assert delays == sorted(delays)
+    assert delays[-1] == AdaptiveInterval.IDLE_MAX
+
+
+def test_adaptive_interval_speeds_up_with_actions():
+    interval = AdaptiveInterval(rand=no_jitter)
+    interval.next_delay(PollResult(UNAVAILABLE, None))
+    assert interval.next_delay(PollResult(UNAVAILABLE, None)) == 40
+    assert interval.next_delay(PollResult(ACTIVE, None)) == AdaptiveInterval.MIN
+
+
+def test_adaptive_interval_follows_server_suggestion():
+    interval = AdaptiveInterval(rand=no_jitter)
+    assert interval.next_delay(PollResult(ACTIVE, 30)) == 30
+    assert interval.next_delay(PollResult(IDLE, 0)) == AdaptiveInterval.MIN
+    assert interval.next_delay(PollResult(IDLE, 3600)) == AdaptiveInterval.UNAVAILABLE_MAX
+
+
+def test_adaptive_interval_jitter():
+    interval = AdaptiveInterval(rand=lambda a, b: b)
+    assert interval.next_delay(PollResult(ACTIVE, None)) == AdaptiveInterval.MIN * 1.2
+
+
+def test_suggested_delay():
+    assert suggested_delay({'X-Poll-Interval': '5', 'Retry-After': '120'}) == 5
+    assert suggested_delay({'Retry-After': '120'}) == 120
+    assert suggested_delay({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) is None
+    assert suggested_delay({}) is None
+
+
+def test_run_actions_poll_result(client, app):
+    settings = Settings.query.get(1)
+    settings.exa_token = 'token'
+    exchange = Exchange.query.get(1)
+    exchange.valid = True
+    exchange.enabled = True
+    db_session.commit()
+    with patch('utils.server.requests', autospec=True) as requests:
+        requests.get.return_value = MagicMock(
+            status_code=200, headers={'X-Poll-Interval': '7'}, json=MagicMock(return_value=[]))
+        fetched = []
+        assert run_actions(version=VERSION, on_fetched=fetched.append) == PollResult(IDLE, 7)
+        assert fetched == [PollResult(IDLE, 7)]
+
+        requests.get.return_value = MagicMock(status_code=502, headers={})
+        assert run_actions(version=VERSION) == PollResult(UNAVAILABLE, None)
+
+
+def test_skipped_run_keeps_polling_scheduled():
+    executor = Executor(version=VERSION)
+    executor.scheduler.start(paused=True)
+    try:
+        executor.schedule(5)
+        #: scheduler removes one-shot job whose run was skipped, then dispatches the event
+        executor.scheduler.remove_job('run_actions')
+        executor.scheduler._dispatch_event(JobSubmissionEvent(
+            EVENT_JOB_MAX_INSTANCES, 'run_actions', 'default', [datetime.now()]))
+
+        job = executor.scheduler.get_job('run_actions')
+        assert job is not None
+        assert (job.coalesce, job.misfire_grace_time) == (True, None)
+        assert executor.skipped == 1
+    finally:
+        executor.scheduler.shutdown(wait=False)
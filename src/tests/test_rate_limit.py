@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import time
+import threading
+from unittest.mock import MagicMock
+
+from utils import rate_limit
+
+
+def wait_for_queue_depth(scheduler, depth):
+    for _ in range(100):
+        if scheduler.metrics()['queue_depth'] == depth:
+            return
+        time.sleep(0.01)
+
+
+def test_order_placement_is_served_before_queued_reads():
+    scheduler = rate_limit.RequestScheduler(rate=10, capacity=1)
+    scheduler.tokens = 0
+    executed = []
+    client = rate_limit.ScheduledClient(MagicMock(), scheduler)
+
+    def call(name):
+        getattr(client, name)()
+        executed.append(name)
+
+    threads = []
+    for name in ['fetchTicker', 'fetchBalance', 'createMarketBuyOrder']:
+        thread = threading.Thread(target=call, args=(name,))
+        thread.start()
+        threads.append(thread)
+        wait_for_queue_depth(scheduler, len(threads))
+
+    assert scheduler.metrics()['queue_depth_by_priority'] == {'order': 1, 'account': 1, 'market': 1}
+    for thread in threads:
+        thread.join(5)
+
+    assert executed == ['createMarketBuyOrder', 'fetchBalance', 'fetchTicker']
+    assert scheduler.metrics()['queue_depth'] == 0
+    assert scheduler.metrics()['calls'] == 3
+
+
+def test_request_weight_consumes_tokens():
+    scheduler = rate_limit.RequestScheduler(rate=0.001, capacity=10)
+    client = rate_limit.ScheduledClient(MagicMock(), scheduler)
+    client.fetchBalance()
+    client.fetchTicker('EXA/BTC')
+    assert 3.9 < scheduler.tokens < 4.1
+
+
+def test_scheduler_is_shared_per_exchange_account():
+    scheduler = rate_limit.get_scheduler('binance', 'secret-key-a', exchange_id=101)
+    assert rate_limit.get_scheduler('binance', 'secret-key-a', exchange_id=102) is scheduler
+    assert rate_limit.get_scheduler('binance', 'secret-key-b', exchange_id=103) is not scheduler
+
+    metrics = rate_limit.metrics(exchange_ids=[101, 103])
+    assert sorted(metrics) == ['binance:101', 'binance:103']
+    assert 'secret' not in str(rate_limit.metrics())
+
+
+def test_rate_limit_metrics_require_connection(client, app):
+    assert client.get('/metrics/rate_limits').status_code == 302
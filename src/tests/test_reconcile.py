@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from copy import deepcopy
+from datetime import datetime, timedelta
+from decimal import Decimal as D
+from unittest.mock import patch
+
+from __init__ import VERSION
+from .conftest import buy_action
+from database import db_session
+from executor import reconcile_transactions
+from models import Exchange, Transaction, SystemLog
+from utils import policy
+from utils.exchange import RECONCILE_DELAY, RECONCILE_MAX_ATTEMPTS, ExchangeHelper
+
+
+def test_reconcile_corrects_transaction_with_fills(client, app, paper_account):
+    account = paper_account
+    #: shared actions are modified by other tests
+    actions = deepcopy(buy_action[0]['actions'][:1])
+    actions[0]['amount'] = '10.00000000'
+    with patch('utils.exchange.paper.get_exchange', return_value=account):
+        with patch('utils.exchange.ExAServerHelper'):
+            ExchangeHelper(exchange='binance', version=VERSION).run_actions(actions)
+
+            transaction = Transaction.query.one()
+            assert (transaction.exchange, transaction.order_id) == ('binance', '1')
+            assert not transaction.reconciled
+            #: estimated from price before the order, slippage is not included
+            assert transaction.balance_usdt == D('3')
+            assert policy.spending.spent(1, 'order_market_buy') == D('3')
+
+            with patch.object(account, 'fetchOHLCV', wraps=account.fetchOHLCV) as ohlcv:
+                assert ExchangeHelper(exchange='binance', version=VERSION).reconcile() == 1
+                #: quote asset is converted at price of the fill minute
+                timestamp = account.fetchMyTrades()[0]['timestamp']
+                ohlcv.assert_called_once_with(
+                    'BTC/USDT', '1m', since=timestamp // 60000 * 60000, limit=1)
+
+    transaction = Transaction.query.one()
+    assert transaction.reconciled
+    assert transaction.amount == D('10')
+    assert transaction.cost == D('0.00101')
+    assert (transaction.fee, transaction.fee_currency) == (D('0.00000101'), 'BTC')
+    assert transaction.balance_usdt == D('3.03')
+    assert policy.spending.spent(1, 'order_market_buy') == D('3.03')
+
+
+def test_reconcile_gives_up_on_old_transactions(client, app, paper_account):
+    account = paper_account
+    db_session.add(Transaction(
+        action_name='order_market_buy', pair='EXA/BTC', amount=D('10'), balance_usdt=D('3'),
+        exchange='binance', order_id='missing', reconciled=False,
+        created=datetime.now() - timedelta(days=2)))
+    db_session.add(Transaction(
+        action_name='order_market_buy', pair='EXA/BTC', amount=D('10'), balance_usdt=D('3'),
+        exchange='binance', order_id='recent', reconciled=False))
+    db_session.commit()
+
+    with patch('utils.exchange.paper.get_exchange', return_value=account):
+        with patch('utils.exchange.ExAServerHelper'):
+            assert ExchangeHelper(exchange='binance', version=VERSION).reconcile() == 0
+
+    assert [t.reconciled for t in Transaction.query.order_by(Transaction.id)] == [True, False]
+    assert Transaction.query.get(1).balance_usdt == D('3')
+    assert 'Order missing not found' in SystemLog.query.one().message
+
+
+def test_reconcile_backs_off_missing_transactions(client, app, paper_account):
+    account = paper_account
+    db_session.add(Transaction(
+        action_name='order_market_buy', pair='EXA/BTC', amount=D('10'), balance_usdt=D('3'),
+        exchange='binance', order_id='missing', reconciled=False))
+    db_session.commit()
+
+    with patch('utils.exchange.paper.get_exchange', return_value=account), \
+            patch('utils.exchange.ExAServerHelper'), \
+            patch.object(account, 'fetchMyTrades', return_value=[]) as trades:
+        for attempt in range(1, RECONCILE_MAX_ATTEMPTS + 1):
+            ExchangeHelper(exchange='binance', version=VERSION).reconcile()
+            ExchangeHelper(exchange='binance', version=VERSION).reconcile()
+            assert trades.call_count == attempt
+            transaction = Transaction.query.one()
+            assert transaction.reconcile_attempts == attempt
+            #: next attempt is due once backoff delay passed
+            transaction.updated -= timedelta(seconds=RECONCILE_DELAY * 2 ** (attempt - 1))
+            db_session.commit()
+
+    assert Transaction.query.one().reconciled
+    assert 'Order missing not found' in SystemLog.query.one().message
+
+
+def test_reconcile_skips_exchanges_without_pending_transactions(client, app):
+    db_session.add(Transaction(
+        action_name='order_market_buy', pair='EXA/BTC', amount=D('10'), balance_usdt=D('3'),
+        exchange='binance', order_id='1', reconciled=True))
+    db_session.commit()
+
+    with patch('executor.ExchangeHelper') as exchange_helper:
+        reconcile_transactions(Exchange.query.all(), version=VERSION)
+        exchange_helper.assert_not_called()
+
+        db_session.add(Transaction(
+            action_name='order_market_buy', pair='EXA/BTC', amount=D('10'), balance_usdt=D('3'),
+            exchange='binance', order_id='2', reconciled=False))
+        db_session.commit()
+        exchange_helper().reconcile.side_effect = Exception('Network error')
+        reconcile_transactions(Exchange.query.all(), version=VERSION)
+        exchange_helper.assert_called_with(exchange='binance', version=VERSION)
+
+    assert SystemLog.query.count() == 1
@@ -0,0 +1,14 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import subprocess
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_application_import_does_not_load_ccxt():
+    output = subprocess.check_output(
+        [sys.executable, '-c', 'import sys, __init__; print("ccxt" in sys.modules)'],
+        cwd=SRC_PATH, env=dict(os.environ, DB='sqlite://'))
+    assert output.decode().strip() == 'False'
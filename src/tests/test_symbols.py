@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from __init__ import VERSION
+from models import Settings, Symbol
+from utils import symbols
+from utils.server import ExAServerHelper
+
+
+def test_index_searches_by_prefix():
+    names = ['EXA/BTC', 'ETH/BTC', 'EOS/ETH', 'BTC/USDT', 'ETC/BTC']
+    index = symbols.SymbolIndex(loader=lambda: names)
+
+    assert index.search('e') == (['EOS/ETH', 'ETC/BTC', 'ETH/BTC', 'EXA/BTC'], False)
+    assert index.search('et', limit=1) == (['ETC/BTC'], True)
+    assert index.search('et', offset=1, limit=1) == (['ETH/BTC'], False)
+    assert index.search('xyz') == ([], False)
+    assert 'EXA/BTC' in index and 'exa/btc' not in index
+
+
+def test_index_is_reloaded_after_ttl():
+    names = ['EXA/BTC']
+    now = [0]
+    index = symbols.SymbolIndex(loader=lambda: names, ttl=10, clock=lambda: now[0])
+    assert len(index) == 1
+
+    names.append('ETH/BTC')
+    assert 'ETH/BTC' not in index
+    now[0] = 11
+    assert 'ETH/BTC' in index
+
+
+def test_search_endpoint_and_pair_validation(client, app, connected):
+    with patch('utils.server.requests', autospec=True) as requests:
+        requests.get.return_value.status_code = 200
+        requests.get.return_value.json.return_value = ['EXA/BTC', 'ETH/BTC', 'EXA/BTC']
+        ExAServerHelper(version=VERSION).sync_symbols()
+    assert Symbol.query.count() == 2
+
+    assert client.get('/symbols/search?q=ex').get_json() == {
+        'results': [{'id': 'EXA/BTC', 'text': 'EXA/BTC'}], 'pagination': {'more': False}}
+
+    client.post('/security/', data={'allowed_pairs': ['EXA/BTC']})
+    assert Settings.query.get(1).allowed_pairs == ['EXA/BTC']
+    response = client.get('/security/').get_data(as_text=True)
+    assert '<option selected value="EXA/BTC">' in response
+    assert 'ETH/BTC' not in response
+
+    response = client.post('/security/', data={'allowed_pairs': ['XYZ/BTC']})
+    assert 'is not a valid choice' in response.get_data(as_text=True)
+    assert Settings.query.get(1).allowed_pairs == ['EXA/BTC']
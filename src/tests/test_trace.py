@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import json
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from __init__ import VERSION
+from database import db_session
+from models import SystemLog
+from utils import trace
+from utils.server import ExAServerHelper
+from utils.worker import WorkerClient
+
+
+def test_buffer_keeps_newest_entries():
+    buffer = trace.TraceBuffer(size=2)
+    for i in range(3):
+        buffer.append(trace.DEBUG, 'entry {}'.format(i), settings_id=1)
+    buffer.append(trace.INFO, 'other account', settings_id=2)
+
+    assert [e.message for e in buffer.entries(settings_id=1)] == ['entry 2']
+    assert [e.message for e in buffer.entries()] == ['other account', 'entry 2']
+    buffer.clear(settings_id=2)
+    assert len(buffer) == 1
+
+
+def test_buffer_spills_json_lines(tmpdir):
+    path = str(tmpdir.join('trace.jsonl'))
+    logger = trace.spill_logger(path)
+    try:
+        buffer = trace.TraceBuffer(size=1, spill=logger)
+        buffer.append(trace.DEBUG, 'first', settings_id=1)
+        buffer.append(trace.INFO, 'second', settings_id=1)
+        with open(path) as spill:
+            lines = [json.loads(line) for line in spill]
+        assert [(l['level'], l['message']) for l in lines] == [
+            ('DEBUG', 'first'), ('INFO', 'second')]
+    finally:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def test_only_warnings_are_persisted(client, app):
+    trace.log('Order Market Buy', level=trace.INFO)
+    trace.log('Server Timeout', level=trace.WARNING)
+
+    assert [(l.message, l.level_name) for l in SystemLog.query] == [('Server Timeout', 'WARNING')]
+    assert [e.message for e in trace.buffer.entries(settings_id=1)] == ['Order Market Buy']
+
+    response = client.get('/logs')
+    assert b'Order Market Buy' in response.data
+    assert b'Server Timeout' in response.data
+
+
+def test_send_logs_includes_verbose_entries_on_demand(client, app, connected):
+    trace.log('Order Market Buy', level=trace.INFO)
+    trace.log('Server Timeout', level=trace.WARNING)
+
+    with patch('utils.server.requests', autospec=True) as requests:
+        requests.post.return_value.status_code = 200
+        assert ExAServerHelper(version=VERSION).send_logs()
+        sent = requests.post.call_args[1]['data']['logs']
+        assert 'Server Timeout' in sent and 'Order Market Buy' not in sent
+        assert len(trace.buffer) == 1
+
+        trace.log('Server Timeout', level=trace.WARNING)
+        client.get('/logs/send?trace=1')
+        sent = requests.post.call_args[1]['data']['logs']
+        assert 'Server Timeout' in sent and 'Order Market Buy' in sent
+        assert len(trace.buffer) == 0
+        assert SystemLog.query.count() == 0
+
+
+def test_repeated_message_is_counted(client, app):
+    for _ in range(3):
+        trace.log('Server Timeout', level=trace.WARNING)
+    trace.log('Server Maintenance', level=trace.WARNING)
+
+    logs = SystemLog.query.order_by(SystemLog.id).all()
+    assert [(l.message, l.count) for l in logs] == [('Server Timeout', 3), ('Server Maintenance', 1)]
+    assert logs[0].message_hash == trace.message_hash('Server Timeout')
+    assert logs[0].last_seen > logs[0].created
+    assert '&times;3' in client.get('/logs').get_data(as_text=True)
+
+    logs[0].last_seen -= timedelta(seconds=trace.REPEAT_WINDOW + 1)
+    db_session.commit()
+    trace.log('Server Timeout', level=trace.WARNING)
+    assert SystemLog.query.filter_by(message='Server Timeout').count() == 2
+
+
+def test_logs_include_verbose_entries_of_worker_process(client, app, connected):
+    worker_buffer = trace.TraceBuffer()
+    worker_buffer.append(trace.DEBUG, 'Order response in worker', settings_id=1)
+    worker_buffer.append(trace.DEBUG, 'Order of other account', settings_id=2)
+    commands = {
+        'trace': lambda settings_id: [e.to_dict() for e in worker_buffer.entries(settings_id)],
+        'trace_clear': worker_buffer.clear,
+    }
+
+    def send(worker, command, timeout=None, **params):
+        return commands[command](**params)
+
+    with patch.object(WorkerClient, 'send', autospec=True, side_effect=send):
+        page = client.get('/logs').get_data(as_text=True)
+        assert 'Order response in worker' in page
+        assert 'Order of other account' not in page
+
+        with patch('utils.server.requests', autospec=True) as requests:
+            requests.post.return_value.status_code = 200
+            client.get('/logs/send?trace=1')
+            sent = requests.post.call_args[1]['data']['logs']
+    assert 'Order response in worker' in sent
+    assert [e.message for e in worker_buffer.entries()] == ['Order of other account']
+
+
+def test_verbose_entries_are_served_to_other_processes():
+    trace.buffer.append(trace.DEBUG, 'Order response in leader', settings_id=1)
+    trace.buffer.append(trace.DEBUG, 'Order of other account', settings_id=2)
+    server = trace.command_server(address=('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        client = WorkerClient(address=server.server_address)
+        entries = client.send('trace', settings_id=1)
+        assert [e['message'] for e in entries] == ['Order response in leader']
+        client.send('trace_clear', settings_id=1)
+        assert [e.message for e in trace.buffer.entries()] == ['Order of other account']
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        trace.buffer.clear()
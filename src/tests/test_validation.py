@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from __init__ import VERSION
+from database import db_session
+from executor import validate_exchange, revalidate_exchanges
+from models import Exchange
+from utils.lazy import LazyModule
+
+ccxt_errors = LazyModule('ccxt.base.errors')
+
+
+def test_exchange_edit_does_not_call_exchange(client, app, connected):
+    with patch('utils.exchange.ccxt') as ccxt, patch('executor.Executor.validate') as validate:
+        response = client.post('/exchange/1/edit', data={
+            'enabled': 'y', 'api_key': 'apikey', 'api_secret': 'apisecret'})
+        assert response.status_code == 302
+        assert not ccxt.binance.called
+        validate.assert_called_once_with(1)
+
+    exchange = Exchange.query.get(1)
+    assert (exchange.validation_state, exchange.valid) == (Exchange.PENDING, False)
+    assert client.get('/api/exchanges/1/validation').get_json()['validation_state'] == 'pending'
+
+
+def test_validation_updates_state(client, app):
+    exchange = Exchange.query.get(1)
+    exchange.api_key, exchange.api_secret = 'apikey', 'apisecret'
+    exchange.validation_state = Exchange.PENDING
+    db_session.commit()
+
+    with patch('utils.exchange.ccxt') as ccxt:
+        assert validate_exchange(1, version=VERSION) == Exchange.VALID
+        assert Exchange.query.get(1).valid
+
+        ccxt.binance.return_value.fetchDepositAddress.side_effect = \
+            ccxt_errors.AuthenticationError('Invalid API-key')
+        assert validate_exchange(1, version=VERSION) == Exchange.INVALID
+        assert not Exchange.query.get(1).valid
+
+        ccxt.binance.return_value.fetchDepositAddress.side_effect = \
+            ccxt_errors.RequestTimeout('timeout')
+        assert validate_exchange(1, version=VERSION) == Exchange.INVALID
+
+
+def test_revalidation_checks_only_stale_exchanges(client, app):
+    exchange = Exchange.query.get(1)
+    exchange.api_key, exchange.api_secret = 'apikey', 'apisecret'
+    exchange.enabled = True
+    exchange.valid = True
+    exchange.validation_state = Exchange.VALID
+    exchange.validated = datetime.utcnow()
+    db_session.commit()
+
+    with patch('utils.exchange.ccxt') as ccxt:
+        ccxt.binance.return_value.fetchDepositAddress.side_effect = \
+            ccxt_errors.AuthenticationError('Invalid API-key')
+        revalidate_exchanges(version=VERSION, max_age=60)
+        assert Exchange.query.get(1).valid
+
+        Exchange.query.get(1).validated -= timedelta(seconds=61)
+        db_session.commit()
+        revalidate_exchanges(version=VERSION, max_age=60)
+        assert Exchange.query.get(1).validation_state == Exchange.INVALID
+        assert not Exchange.query.get(1).valid
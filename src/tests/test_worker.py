@@ -0,0 +1,38 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from exceptions import ExAWorkerException
+from utils.worker import CommandServer, WorkerClient
+
+
+@pytest.fixture
+def worker_server():
+    server = CommandServer(
+        commands={'status': lambda: {'cycles': 1}, 'echo': lambda value: value},
+        address=('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_worker_client_sends_commands(worker_server):
+    worker = WorkerClient(address=worker_server.server_address)
+    assert worker.send('status') == {'cycles': 1}
+    assert worker.send('echo', value='validate') == 'validate'
+
+    with pytest.raises(ExAWorkerException):
+        worker.send('unknown')
+
+
+def test_worker_client_raises_if_worker_is_not_running(worker_server):
+    address = worker_server.server_address
+    worker_server.shutdown()
+    worker_server.server_close()
+    with pytest.raises(ExAWorkerException):
+        WorkerClient(address=address, timeout=1).send('status')
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import json
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+
+from flask import abort, current_app, request
+from sqlalchemy import func
+
+from utils import tenant
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+CURSOR_FORMATS = ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S']
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def serialize(row, fields):
+    return {field: getattr(row, field) for field in fields}
+
+
+def json_response(payload, etag=None):
+    """
+    JSON response with ETag, 304 if client already has current version
+
+    :param payload: payload or callable returning payload, not called for 304 responses
+    :param str etag: precomputed ETag, computed from response body if not provided
+
+    """
+    if etag is not None and etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    body = json.dumps(payload() if callable(payload) else payload, default=_default)
+    if etag is None:
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def parse_cursor(value):
+    """
+    Parse ``updated_since`` cursor as returned by :func:`since_id_response`, ``None`` if empty
+
+    """
+    if not value:
+        return None
+    for cursor_format in CURSOR_FORMATS:
+        try:
+            return datetime.strptime(value, cursor_format)
+        except ValueError:
+            pass
+    abort(400, 'Invalid cursor: {}'.format(value))
+
+
+def since_id_response(model, fields, query=None, updated=None):
+    """
+    Rows created after ``since_id`` query argument
+
+    ETag is derived from table state, so unchanged tables are answered with 304 without loading
+    any rows.
+
+    With ``updated`` column, rows already received (``id <= since_id``) which changed after
+    ``updated_since`` query argument are returned as well. Returned ``updated_since`` cursor is
+    passed with next request, together with ``since_id``.
+
+    :param model: model class with integer ``id`` primary key
+    :param list fields: serialized fields
+    :param query: base query, eg. rows of current account, all rows by default
+    :param updated: column set whenever existing row changes, its latest value is part of ETag
+
+    """
+    query = model.query if query is None else query
+    since_id = request.args.get('since_id', 0, type=int)
+    limit = min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT)
+    updated_since = parse_cursor(request.args.get('updated_since'))
+
+    columns = [func.max(model.id), func.count(model.id)]
+    if updated is not None:
+        columns.append(func.max(updated))
+    state = query.with_entities(*columns).one()
+    last_id, count = state[0], state[1]
+    etag = '{}-{}-{}-{}-{}-{}'.format(
+        model.__tablename__, tenant.current_id(), since_id, limit, last_id or 0, count)
+    if updated is not None:
+        etag += '-{}-{}'.format(
+            updated_since.isoformat() if updated_since else '', state[2] or 0)
+
+    def payload():
+        rows = query.filter(model.id > since_id).order_by(model.id).limit(limit).all()
+        data = {
+            'since_id': rows[-1].id if rows else since_id,
+            'last_id': last_id or 0,
+        }
+        if updated is not None:
+            cursor = state[2]
+            if since_id and updated_since is not None:
+                changed = query.filter(model.id <= since_id, updated > updated_since).order_by(
+                    updated).limit(limit).all()
+                if len(changed) == limit:
+                    #: the rest of changed rows is returned with next request
+                    cursor = getattr(changed[-1], updated.key)
+                rows = sorted(changed, key=lambda row: row.id) + rows
+            data['updated_since'] = cursor
+        data['items'] = [serialize(row, fields) for row in rows]
+        return data
+    return json_response(payload, etag=etag)
@@ -1,6 +1,10 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from models import Transaction, Settings
+from sqlalchemy import func
+
+from models import Transaction
+from utils import tenant
+from database import db_session
 
 
 def get_balances():
@@ -8,19 +12,13 @@ def get_balances():
     Get used balance
 
     """
-    settings = Settings.query.get(1)
+    settings = tenant.current_settings()
     if not settings.allowed_balance:
         return {}
 
-    buy_transaction_entries = Transaction.query.filter_by(action_name='order_market_buy')
-    balances = {}
-    for transaction in buy_transaction_entries:
-        try:
-            balances[transaction.pair]['balance'] += transaction.balance_usdt
-        except KeyError:
-            balances[transaction.pair] = {}
-            balances[transaction.pair]['balance'] = 0
-            balances[transaction.pair]['balance'] += transaction.balance_usdt
+    used = db_session.query(Transaction.pair, func.sum(Transaction.balance_usdt)).filter_by(
+        action_name='order_market_buy', settings_id=settings.id).group_by(Transaction.pair)
+    balances = {pair: {'balance': balance} for pair, balance in used}
 
     for key, value in balances.items():
         usage = (value['balance'] / settings.allowed_balance) * 100
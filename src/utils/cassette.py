@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import gzip
+import json
+import time
+import atexit
+import importlib
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+
+from exceptions import ExACassetteException
+
+#: cassette file, traffic is recorded or replayed only if set
+CASSETTE_PATH = os.environ.get('EXA_CASSETTE')
+#: ``record``, ``replay`` (full speed) or ``realtime`` (replay with recorded timing)
+CASSETTE_MODE = os.environ.get('EXA_CASSETTE_MODE', 'replay')
+
+RECORD = 'record'
+REPLAY = 'replay'
+REALTIME = 'realtime'
+
+FORMAT_VERSION = 1
+HTTP_METHODS = ('get', 'post', 'put', 'delete')
+
+#: request arguments and response fields never written to cassette
+SECRET_FIELDS = frozenset(['auth', 'password', 'api_token', 'token', 'apiKey', 'secret'])
+REDACTED = '[redacted]'
+
+
+def redact(value):
+    """
+    Copy of value with secret fields of dicts replaced, nested dicts and lists included
+    """
+    if isinstance(value, dict):
+        return {k: REDACTED if k in SECRET_FIELDS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+def request_key(kind, target, method, args, kwargs):
+    return json.dumps([kind, target, method, args, redact(kwargs)], sort_keys=True, default=str)
+
+
+class Cassette(object):
+    """
+    Recorded ExA server and exchange traffic, stored as gzipped JSON
+
+    Replayed responses are matched by request in recorded order, so the same request made twice
+    gets both recorded responses.
+
+    """
+
+    def __init__(self, path, mode=REPLAY, sleep=time.sleep, clock=time.time):
+        """
+        :param str path: cassette file
+        :param str mode: ``record``, ``replay`` or ``realtime``
+
+        """
+        self.path = path
+        self.mode = mode
+        self.interactions = []
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self._queues = defaultdict(deque)
+        if mode != RECORD:
+            self.load()
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    def load(self):
+        with gzip.open(self.path, 'rt') as cassette_file:
+            content = json.load(cassette_file)
+        if content.get('version') != FORMAT_VERSION:
+            raise ExACassetteException('Unsupported cassette version: {}'.format(
+                content.get('version')))
+        self.interactions = content['interactions']
+        self._queues.clear()
+        for interaction in self.interactions:
+            self._queues[interaction['key']].append(interaction)
+
+    def save(self):
+        with self._lock:
+            content = {
+                'version': FORMAT_VERSION,
+                'recorded': datetime.utcnow().isoformat(),
+                'interactions': list(self.interactions),
+            }
+        with gzip.open(self.path, 'wt') as cassette_file:
+            json.dump(content, cassette_file, separators=(',', ':'), default=str)
+
+    def call(self, kind, target, method, function, args, kwargs, serialize=None):
+        """
+        Record or replay single call
+
+        :param str kind: ``http`` or ``ccxt``
+        :param str target: called service eg. exchange name
+        :param str method: called method
+        :param function: real call, used only when recording
+        :param serialize: converts real result to JSON serializable value
+
+        """
+        key = request_key(kind, target, method, args, kwargs)
+        if self.recording:
+            return self._record(key, function, args, kwargs, serialize)
+        return self._replay(key)
+
+    def _record(self, key, function, args, kwargs, serialize):
+        started = self._clock()
+        interaction = {'key': key, 'offset': round(started - self._started, 4)}
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            interaction['error'] = {
+                'type': '{}.{}'.format(type(e).__module__, type(e).__name__), 'message': str(e)}
+            raise
+        else:
+            interaction['result'] = serialize(result) if serialize else result
+            return result
+        finally:
+            interaction['elapsed'] = round(self._clock() - started, 4)
+            with self._lock:
+                self.interactions.append(interaction)
+
+    def _replay(self, key):
+        with self._lock:
+            try:
+                interaction = self._queues[key].popleft()
+            except IndexError:
+                raise ExACassetteException('Request not recorded in cassette: {}'.format(key))
+        if self.mode == REALTIME:
+            #: response is returned at its recorded time since cassette was opened, never sooner
+            #: than recorded request duration
+            ahead = interaction['offset'] - (self._clock() - self._started)
+            self._sleep(interaction['elapsed'] + max(ahead, 0))
+        if 'error' in interaction:
+            raise _exception(**interaction['error'])
+        return interaction['result']
+
+    def remaining(self):
+        """
+        Number of recorded interactions not replayed yet
+        """
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+
+def _exception(type, message):
+    module_name, class_name = type.rsplit('.', 1)
+    try:
+        exception_class = getattr(importlib.import_module(module_name), class_name)
+        return exception_class(message)
+    except Exception:
+        return ExACassetteException('{}: {}'.format(type, message))
+
+
+class CassetteClient(object):
+    """
+    ccxt client proxy recording or replaying API calls
+    """
+
+    def __init__(self, client, cassette, exchange):
+        self._client = client
+        self._cassette = cassette
+        self._exchange = exchange
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name, None)
+        if name.startswith('_') or (attribute is not None and not callable(attribute)):
+            return getattr(self._client, name)
+
+        def call(*args, **kwargs):
+            return self._cassette.call(
+                'ccxt', self._exchange, name, attribute, list(args), kwargs)
+        return call
+
+
+class CassetteResponse(object):
+    """
+    Recorded HTTP response
+    """
+
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.content = text.encode('utf-8')
+
+    @classmethod
+    def serialize(cls, response):
+        """
+        Recorded response, secret fields of JSON body (eg. ExA server token) are redacted
+        """
+        text = response.text
+        try:
+            text = json.dumps(redact(json.loads(text)))
+        except ValueError:
+            pass
+        return {'status_code': response.status_code, 'headers': dict(response.headers),
+                'text': text}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class CassetteRequests(object):
+    """
+    ``requests`` module proxy recording or replaying HTTP requests
+
+    Request headers are not recorded, they carry ExA server token. Credentials passed as
+    ``auth`` and secret fields of responses are redacted.
+    """
+
+    def __init__(self, requests, cassette):
+        self._requests = requests
+        self._cassette = cassette
+
+    def __getattr__(self, name):
+        if name not in HTTP_METHODS:
+            return getattr(self._requests, name)
+
+        def call(url, headers=None, **kwargs):
+            def request(url, **kwargs):
+                return getattr(self._requests, name)(url, headers=headers, **kwargs)
+            result = self._cassette.call(
+                'http', name.upper(), url, request, [url], kwargs,
+                serialize=CassetteResponse.serialize)
+            if self._cassette.recording:
+                return result
+            return CassetteResponse(**result)
+        return call
+
+
+_cassette = None
+_lock = threading.Lock()
+
+
+def get_cassette(path=CASSETTE_PATH, mode=CASSETTE_MODE):
+    """
+    Process wide cassette, recorded cassette is saved on exit
+
+    """
+    global _cassette
+    if not path:
+        return None
+    with _lock:
+        if _cassette is None:
+            _cassette = Cassette(path, mode=mode)
+            if _cassette.recording:
+                atexit.register(_cassette.save)
+        return _cassette
+
+
+def wrap_client(client, exchange):
+    """
+    Route ccxt client calls through cassette, if configured
+    """
+    cassette = get_cassette()
+    return client if cassette is None else CassetteClient(client, cassette, exchange)
+
+
+def wrap_requests(requests):
+    """
+    Route ``requests`` calls through cassette, if configured
+    """
+    cassette = get_cassette()
+    return requests if cassette is None else CassetteRequests(requests, cassette)
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from exceptions import ExAServerException
+from utils.lazy import LazyModule
+from database import db_session
+
+ccxt_errors = LazyModule('ccxt.base.errors')
+requests_exceptions = LazyModule('requests.exceptions')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+
+def classify(exception):
+    """
+    Classify exchange failure
+
+    Network errors, timeouts, exchange maintenance and rate limiting are ``transient`` and handled
+    by circuit breaker. Anything else (eg. invalid API keys) is ``permanent`` and requires
+    user intervention.
+
+    """
+    if isinstance(exception, (ccxt_errors.NetworkError, requests_exceptions.RequestException,
+                              ExAServerException)):
+        return TRANSIENT
+    return PERMANENT
+
+
+class CircuitBreaker(object):
+    """
+    Per exchange account circuit breaker, persisted on ``Exchange`` so it is shared between
+    processes and visible on dashboard.
+
+    ``closed`` - actions are executed, ``open`` - exchange is skipped until cool-down passes,
+    ``half_open`` - cheap probe decides whether to close breaker or open it again with doubled
+    cool-down.
+
+    """
+
+    FAILURE_THRESHOLD = 3
+    COOL_DOWN = 30
+    COOL_DOWN_MAX = 30 * 60
+
+    def __init__(self, exchange):
+        """
+        :param Exchange exchange: exchange model
+
+        """
+        self.exchange = exchange
+
+    @property
+    def state(self):
+        state = self.exchange.breaker_state or CLOSED
+        if state == OPEN and datetime.utcnow() >= self.exchange.breaker_open_until:
+            return HALF_OPEN
+        return state
+
+    def record_success(self):
+        if self.exchange.breaker_state in (None, CLOSED) and not self.exchange.breaker_failures:
+            return
+        self.exchange.breaker_state = CLOSED
+        self.exchange.breaker_failures = 0
+        self.exchange.breaker_cool_down = None
+        self.exchange.breaker_open_until = None
+        db_session.commit()
+
+    def record_failure(self):
+        state = self.state
+        self.exchange.breaker_failures = (self.exchange.breaker_failures or 0) + 1
+        if state == HALF_OPEN or self.exchange.breaker_failures >= self.FAILURE_THRESHOLD:
+            if state == HALF_OPEN and self.exchange.breaker_cool_down:
+                cool_down = min(self.exchange.breaker_cool_down * 2, self.COOL_DOWN_MAX)
+            else:
+                cool_down = self.COOL_DOWN
+            self.exchange.breaker_state = OPEN
+            self.exchange.breaker_cool_down = cool_down
+            self.exchange.breaker_open_until = datetime.utcnow() + timedelta(seconds=cool_down)
+        db_session.commit()
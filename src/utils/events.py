@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import json
+import queue
+import itertools
+import threading
+
+from models import SystemLog, Transaction
+from database import db_session
+
+SUBSCRIPTION_SIZE = 100
+HEARTBEAT = 15
+#: concurrent event streams per process, each stream occupies one server thread while it is open
+STREAM_LIMIT = int(os.environ.get('EXA_STREAM_LIMIT', 4))
+
+
+class Subscription(object):
+    """
+    Bounded queue of events for single subscriber.
+
+    Slow subscribers never block publishers, the oldest events are dropped instead and counted
+    in ``dropped``.
+
+    """
+
+    def __init__(self, bus, maxsize=SUBSCRIPTION_SIZE):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Next event, ``None`` if no event was published within timeout
+
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus(object):
+    """
+    In-memory publish/subscribe bus
+
+    """
+
+    def __init__(self, subscription_size=SUBSCRIPTION_SIZE):
+        self.subscription_size = subscription_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def subscribe(self, limit=None):
+        """
+        New subscription, ``None`` if there are already ``limit`` subscriptions
+
+        """
+        subscription = Subscription(self, maxsize=self.subscription_size)
+        with self._lock:
+            if limit is not None and len(self._subscriptions) >= limit:
+                return None
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event, data):
+        """
+        Publish event to all subscribers
+
+        :param str event: event type eg. ``log``
+        :param dict data: JSON serializable event data
+
+        """
+        with self._lock:
+            item = {'id': next(self._sequence), 'event': event, 'data': data}
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(item)
+
+    @property
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append('id: {}'.format(event_id))
+    lines.append('event: {}'.format(event))
+    lines.append('data: {}'.format(json.dumps(data, default=str)))
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(subscription, heartbeat=HEARTBEAT, account_id=None):
+    """
+    Server-Sent Events stream of subscription.
+
+    Subscriber is notified with ``overflow`` event when events were dropped, so it can reload
+    missed entries.
+
+    :param int account_id: stream only events of given ExA account
+
+    """
+    dropped = 0
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            item = subscription.get(timeout=heartbeat)
+            if subscription.dropped != dropped:
+                yield format_event('overflow', {'dropped': subscription.dropped - dropped})
+                dropped = subscription.dropped
+            if item is None:
+                yield ': heartbeat\n\n'
+            elif account_id is not None and item['data'].get('settings_id') != account_id:
+                continue
+            else:
+                yield format_event(item['event'], item['data'], event_id=item['id'])
+    finally:
+        subscription.close()
+
+
+class TableFollower(threading.Thread):
+    """
+    Publish log and transaction rows written by other processes (eg. worker or leader of gunicorn
+    workers).
+
+    Single query per table and interval, regardless of number of subscribers.
+
+    """
+
+    def __init__(self, bus, interval=1, paused=None):
+        """
+        :param paused: callable returning ``True`` while rows are written and published by this
+            process, eg. while it is the executing leader
+
+        """
+        super(TableFollower, self).__init__(name='table-follower')
+        self.daemon = True
+        self.bus = bus
+        self.interval = interval
+        self.paused = paused or (lambda: False)
+        self._stop_event = threading.Event()
+        self._last_ids = {}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """
+        Publish rows added since previous poll, rows existing before the first poll are skipped
+        """
+        if self.paused():
+            self._last_ids.clear()
+            return
+        tables = [(SystemLog, publish_log), (Transaction, publish_transaction)]
+        try:
+            for model, publish in tables:
+                last_id = self._last_ids.get(model)
+                if last_id is None:
+                    self._last_ids[model] = model.query.with_entities(model.id).order_by(
+                        model.id.desc()).limit(1).scalar() or 0
+                    continue
+                for row in model.query.filter(model.id > last_id).order_by(model.id).limit(100):
+                    publish(row)
+                    self._last_ids[model] = row.id
+        except Exception:
+            self._last_ids.clear()
+        finally:
+            db_session.remove()
+
+
+bus = EventBus()
+
+
+def publish_log(log):
+    bus.publish('log', {
+        'id': log.id, 'settings_id': log.settings_id, 'level': log.level_name,
+        'message': log.message, 'created': log.created, 'count': log.count or 1,
+        'last_seen': log.last_seen, 'persisted': log.persisted})
+
+
+def publish_transaction(transaction):
+    bus.publish('transaction', {
+        'id': transaction.id, 'settings_id': transaction.settings_id, 'pair': transaction.pair,
+        'action_name': transaction.action_name, 'amount': transaction.amount,
+        'balance_usdt': transaction.balance_usdt, 'created': transaction.created,
+        'cost': transaction.cost, 'fee': transaction.fee, 'fee_currency': transaction.fee_currency,
+        'reconciled': transaction.reconciled, 'updated': transaction.updated})
@@ -1,18 +1,44 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import os
 import time
 import math
+from collections import namedtuple, defaultdict
+from datetime import datetime, timedelta
 from decimal import Decimal as D
 from math import floor
 
-import ccxt
-from ccxt.base.errors import InsufficientFunds, BaseError, ExchangeError
-
+from utils import cassette, events, journal, market_data, paper, policy, rate_limit, tenant, trace
+from utils.lazy import LazyModule
 from utils.server import ExAServerHelper
 from exceptions import ExAClientException
-from models import Exchange, SystemLog, Transaction, Settings
+from models import Exchange, Transaction, ActionJournal
 from database import db_session
 
+ccxt = LazyModule('ccxt')
+ccxt_errors = LazyModule('ccxt.base.errors')
+
+#: transactions not found in exchange trades within this many seconds keep estimated balance
+RECONCILE_MAX_AGE = int(os.environ.get('EXA_RECONCILE_MAX_AGE', 86400))
+#: seconds before transaction not found in exchange trades is looked up again, doubled with
+#: every attempt
+RECONCILE_DELAY = int(os.environ.get('EXA_RECONCILE_DELAY', 30))
+#: transactions not found in exchange trades after this many attempts keep estimated balance
+RECONCILE_MAX_ATTEMPTS = int(os.environ.get('EXA_RECONCILE_MAX_ATTEMPTS', 8))
+
+#: action ids of a batch by outcome, rejected actions with reason
+BatchResult = namedtuple('BatchResult', ['executed', 'rejected', 'skipped'])
+
+
+def is_action_failure(exception):
+    """
+    Failure of single action (eg. pair not allowed, insufficient balance, invalid order amount),
+    other failures affect whole exchange account
+
+    """
+    return isinstance(exception, (
+        ExAClientException, ccxt_errors.InsufficientFunds, ccxt_errors.InvalidOrder))
+
 
 class ExchangeHelper(object):
     """
@@ -31,11 +57,21 @@ class ExchangeHelper(object):
         :param str version: client version
         """
         self.version = version
-        self.exchange = Exchange.query.filter_by(name=exchange)[0]
-
-        self.client = getattr(ccxt, self.exchange.name)(
-            {'apiKey': self.exchange.api_key.strip(), 'secret': self.exchange.api_secret.strip()})
-        self.settings = Settings.query.get(1)
+        self.exchange = tenant.query(Exchange).filter_by(name=exchange)[0]
+
+        api_key = self.exchange.api_key.strip()
+        client = cassette.wrap_client(getattr(ccxt, self.exchange.name)(
+            {'apiKey': api_key, 'secret': self.exchange.api_secret.strip()}), self.exchange.name)
+        self.client = rate_limit.ScheduledClient(
+            client, rate_limit.get_scheduler(
+                self.exchange.name, api_key, exchange_id=self.exchange.id))
+        self.settings = tenant.current_settings()
+        #: in test mode orders, balances and prices come from simulated paper trading account,
+        #: account status is still checked with real client
+        self.paper = None
+        if self.settings.test_mode:
+            self.paper = paper.get_exchange(self.exchange.name, account_id=self.settings.id)
+        self.trading_client = self.paper or self.client
         self.exa_helper = ExAServerHelper(version=version)
 
     def check_status(self):
@@ -46,71 +82,138 @@ class ExchangeHelper(object):
         try:
             self.client.fetchDepositAddress('BTC')
             return True
-        except ExchangeError as e:
-            self._log(message='Invalid Exchange Account API Keys: {}'.format(e))
+        except ccxt_errors.ExchangeError as e:
+            self._log(
+                message='Invalid Exchange Account API Keys: {}'.format(e), level=trace.WARNING)
             return False
 
+    def probe(self):
+        """
+        Cheap authenticated request used to check if exchange is available again
+
+        """
+        self.client.fetchBalance()
+
     def check_balance(self, data, balance_requested=None):
         """
         Check if used balance is below balance limit
 
         """
         balance_requested = 0 if not balance_requested else balance_requested
-        transactions = Transaction.query.filter_by(
-            action_name=data['action'], pair=data['symbol']['symbol'])
-        self.balance_used = 0
-        balance_allowed = D(self.settings.allowed_balance)
-        for transaction in transactions:
-            self.balance_used += transaction.balance_usdt
-        if balance_allowed > D(self.balance_used) + D(balance_requested):
+        self.balance_used = policy.spending.spent(
+            self.settings.id, data['action'], pair=data['symbol']['symbol'])
+        if self.settings.allowed_balance > self.balance_used + D(balance_requested):
             return True
         else:
             return False
 
     def run_actions(self, actions):
+        """
+        Execute batch of actions
+
+        Failed action is rejected and the rest of the batch is executed, exchange failures (eg.
+        network errors, invalid API keys) stop the batch.
+
+        :return: BatchResult
+
+        """
+        result = BatchResult(executed=[], rejected=[], skipped=[])
         for action in actions:
+            entry = journal.claim(
+                action_id=action['action_id'], exchange=self.exchange.name,
+                action_name=action['action'])
+            if entry is None:
+                result.skipped.append(action['action_id'])
+                continue
             try:
-                action_name = self.ACTIONS[action['action']]
-            except KeyError:
-                e = 'Unknown action: {}'.format(action['action'])
-                self.exa_helper.confirm_action(
-                    action_id=action['action_id'], status=False, response=e)
-                raise ExAClientException(e)
-
-            if self.settings.allowed_pairs:
-                if action['symbol']['symbol'] not in self.settings.allowed_pairs:
-                    message = '{} pair is not allowed'.format(action['symbol']['symbol'])
-                    self.exa_helper.confirm_action(
-                        action_id=action['action_id'], status=False, response=message)
-                    raise ExAClientException(message)
-
-            if self.settings.allowed_actions:
-                allowed_actions = self.settings.allowed_actions + ['sync_amount']
-                if action_name not in allowed_actions:
-                    message = 'Action not allowed: {}'.format(action_name)
-                    self.exa_helper.confirm_action(
-                        action_id=action['action_id'], status=False, response=message)
-                    raise ExAClientException(message)
-
-            if action_name not in ['sync_amount']:
-                balance_requested = self.get_latest_price_usdt(action['symbol']) * D(action['amount'])
+                self._run_action(action, entry)
+            except Exception as e:
+                if not is_action_failure(e):
+                    raise
+                self._reject_action(action, entry, e)
+                result.rejected.append((action['action_id'], str(e)))
             else:
-                balance_requested = None
-
-            if self.settings.allowed_balance and action_name == 'order_market_buy':
-                if not self.check_balance(action, balance_requested=balance_requested):
-                    message = 'Allowed balance exceeded: {} < {}'.format(
-                        self.settings.allowed_balance, self.balance_used)
-                    self.exa_helper.confirm_action(
-                        action_id=action['action_id'], status=False, response=message)
-                    raise ExAClientException(message)
+                result.executed.append(action['action_id'])
+            finally:
+                journal.release(action['action_id'])
+
+        if result.executed or result.rejected:
+            self._log('Batch on {}: {} executed, {} rejected, {} skipped'.format(
+                self.exchange.name, len(result.executed), len(result.rejected),
+                len(result.skipped)))
+        return result
+
+    def _reject_action(self, action, entry, e):
+        self._log('Action {} rejected: {}'.format(action['action_id'], e), level=trace.WARNING)
+        if entry.state not in journal.FINISHED_STATES:
+            self._confirm_action(action_id=action['action_id'], status=False, response=str(e))
+
+    def _run_action(self, action, entry):
+        if entry.state == ActionJournal.ORDERED:
+            #: order was placed but confirmation has not reached ExA server
+            self._confirm_action(action_id=action['action_id'], status=True, response=entry.response)
+            return
+        if entry.state == ActionJournal.VALIDATED:
+            message = 'Action execution was interrupted, order state is unknown'
+            self._confirm_action(action_id=action['action_id'], status=False, response=message)
+            raise ExAClientException(message)
 
+        try:
+            action_name = self.ACTIONS[action['action']]
+        except KeyError:
+            e = 'Unknown action: {}'.format(action['action'])
+            self._confirm_action(action_id=action['action_id'], status=False, response=e)
+            raise ExAClientException(e)
+
+        if self.settings.allowed_pairs:
+            if action['symbol']['symbol'] not in self.settings.allowed_pairs:
+                message = '{} pair is not allowed'.format(action['symbol']['symbol'])
+                self._confirm_action(action_id=action['action_id'], status=False, response=message)
+                raise ExAClientException(message)
+
+        if self.settings.allowed_actions:
+            allowed_actions = self.settings.allowed_actions + ['sync_amount']
+            if action_name not in allowed_actions:
+                message = 'Action not allowed: {}'.format(action_name)
+                self._confirm_action(action_id=action['action_id'], status=False, response=message)
+                raise ExAClientException(message)
+
+        if action_name not in ['sync_amount']:
+            price_usdt = self.get_latest_price_usdt(action['symbol'])
+            balance_requested = price_usdt * D(action['amount'])
+        else:
+            price_usdt = balance_requested = None
+
+        if self.settings.allowed_balance and action_name == 'order_market_buy':
+            if not self.check_balance(action, balance_requested=balance_requested):
+                message = 'Allowed balance exceeded: {} < {}'.format(
+                    self.settings.allowed_balance, self.balance_used)
+                self._confirm_action(action_id=action['action_id'], status=False, response=message)
+                raise ExAClientException(message)
+
+        if action_name == policy.LIMITED_ACTION:
+            exceeded = policy.spending.check(
+                self.settings.id, action['symbol']['symbol'], balance_requested)
+            if exceeded is not None:
+                limit, used = exceeded
+                message = 'Spending limit exceeded: {} + {} > {} USDT per {} seconds for {}'.format(
+                    used, balance_requested, limit.amount, limit.window, limit.pair or 'all pairs')
+                self._confirm_action(action_id=action['action_id'], status=False, response=message)
+                raise ExAClientException(message)
+
+        journal.transition(action['action_id'], ActionJournal.VALIDATED)
+        if price_usdt is None:
             getattr(self, action_name)(data=action)
+        else:
+            getattr(self, action_name)(data=action, price_usdt=price_usdt)
 
-    def order_market_buy(self, data):
+    def order_market_buy(self, data, price_usdt=None):
         """
         Perform order market buy
 
+        :param Decimal price_usdt: price in USDT used to estimate balance until transaction is
+            reconciled, latest price by default
+
         """
         latest_price = self.get_latest_price(symbol=data['symbol'])
         asset_quantity_requested = D(data['amount']) * latest_price
@@ -130,15 +233,11 @@ class ExchangeHelper(object):
         # balance exception is raised
         for i in range(1, 5):
             try:
-                output = self._perform_order_market(
-                    action_type='buy', action_id=data['action_id'], params=params)
-                data['amount'] = params['amount']
-                balance_requested = self.get_latest_price_usdt(data['symbol']) * D(params['amount'])
-                self._log_transaction(action=data, balance_usdt=balance_requested)
-                return output
-            except InsufficientFunds as e:
-                self._log(str(e))
+                return self._perform_order_market(
+                    action_type='buy', action=data, params=params, price_usdt=price_usdt)
+            except ccxt_errors.InsufficientFunds as e:
                 if i <= 3:
+                    self._log(str(e))
                     diff = i**2
                     new_quantity = valid_quantity - ((D(diff) / 100) * valid_quantity)
                     valid_quantity = self.validate_quantity(
@@ -146,15 +245,17 @@ class ExchangeHelper(object):
                     params['amount'] = valid_quantity
                     self._log('Amount reduced due to insufficient balance: {}'.format(new_quantity))
                 else:
-                    self._log(str(e))
-                    self.exa_helper.confirm_action(
+                    self._confirm_action(
                         action_id=data['action_id'], status=False, response=str(e))
-                    raise BaseError(e)
+                    raise
 
-    def order_market_sell(self, data):
+    def order_market_sell(self, data, price_usdt=None):
         """
         Perform order market sell
 
+        :param Decimal price_usdt: price in USDT used to estimate balance until transaction is
+            reconciled, latest price by default
+
         """
         quantity_available = self.get_balance(symbol=data['symbol']['base_asset'])
         valid_quantity = D(data['amount'])
@@ -169,35 +270,32 @@ class ExchangeHelper(object):
 
         try:
             self._perform_order_market(
-                action_type='sell', action_id=data['action_id'], params=params)
-            balance_requested = self.get_latest_price_usdt(data['symbol']) * D(params['amount'])
-            data['amount'] = params['amount']
-            self._log_transaction(action=data, balance_usdt=balance_requested)
-        except BaseError as e:
-            self._log(str(e))
-            self.exa_helper.confirm_action(
+                action_type='sell', action=data, params=params, price_usdt=price_usdt)
+        except ccxt_errors.BaseError as e:
+            self._confirm_action(
                 action_id=data['action_id'], status=False, response=str(e))
+            raise
 
-    def _perform_order_market(self, action_type, action_id, params):
+    def _perform_order_market(self, action_type, action, params, price_usdt=None):
         """
-        Perform order market action
+        Perform order market action, placed order is recorded before it is confirmed
 
         :param action_type: ``buy`` or ``sell``
-        :param action_id: corresponding action id
+        :param dict action: corresponding action, amount is updated to ordered amount
         :param params: order params
+        :param Decimal price_usdt: price in USDT used to estimate transaction balance
 
         """
         self._log('Order Market {}: {}'.format(action_type.title(), params))
-        if self.settings.test_mode:
-            self._log('Test Mode: No transaction performed.')
-            self.exa_helper.confirm_action(action_id=action_id, status=True, response='TEST MODE')
-            return None
-        else:
-            response = getattr(self.client, 'createMarket{}Order'.format(action_type.title()))(
-                **params)
-            self._log(message=str(response))
-            self.exa_helper.confirm_action(action_id=action_id, status=True, response=response)
-            return response
+        if self.paper is not None:
+            self._log('Test Mode: paper trading order.', level=trace.DEBUG)
+        response = getattr(
+            self.trading_client, 'createMarket{}Order'.format(action_type.title()))(**params)
+        self._log(message=str(response), level=trace.DEBUG)
+        action['amount'] = params['amount']
+        self._log_transaction(action=action, order=response, price_usdt=price_usdt)
+        self._confirm_action(action_id=action['action_id'], status=True, response=response)
+        return response
 
     def sync_amount(self, data):
         """
@@ -205,17 +303,124 @@ class ExchangeHelper(object):
 
         """
         amount = D(data['amount'])
-        if self.settings.test_mode:
+        balance = self.get_balance(symbol=data['symbol']['base_asset'])
+        #: never accept balance bigger then current amount
+        if balance > amount:
             balance = amount
-        else:
-            balance = self.get_balance(symbol=data['symbol']['base_asset'])
-            #: never accept balance bigger then current amount
-            if balance > amount:
-                balance = amount
 
         self._log('Amount synced with ExA server: {}'.format(balance))
 
         self.exa_helper.sync_amount(action_id=data['action_id'], balance=balance)
+        journal.transition(data['action_id'], ActionJournal.CONFIRMED)
+
+    def _confirm_action(self, action_id, status, response):
+        """
+        Confirm action on ExA server and record it in journal
+
+        """
+        self.exa_helper.confirm_action(action_id=action_id, status=status, response=response)
+        journal.transition(
+            action_id, ActionJournal.CONFIRMED if status else ActionJournal.REJECTED,
+            response=response)
+
+    def reconcile(self):
+        """
+        Correct estimated balance of transactions with actual fills, trades are fetched once per
+        traded pair
+
+        Transactions not found in trades are looked up again with exponential backoff, until
+        ``RECONCILE_MAX_ATTEMPTS`` or ``RECONCILE_MAX_AGE`` is reached.
+
+        :return: number of reconciled transactions
+
+        """
+        now = datetime.now()
+        pending = tenant.query(Transaction).filter_by(
+            exchange=self.exchange.name, reconciled=False).order_by(Transaction.id).all()
+        by_pair = defaultdict(list)
+        for transaction in pending:
+            attempts = transaction.reconcile_attempts or 0
+            if attempts:
+                delay = timedelta(seconds=RECONCILE_DELAY * 2 ** (attempts - 1))
+                if (transaction.updated or transaction.created) + delay > now:
+                    continue
+            by_pair[transaction.pair].append(transaction)
+
+        usdt_prices = {}
+        expired = now - timedelta(seconds=RECONCILE_MAX_AGE)
+        reconciled = 0
+        for pair, transactions in by_pair.items():
+            #: trades are timestamped by exchange clock, fetch a minute earlier
+            since = int(time.mktime(transactions[0].created.timetuple()) - 60) * 1000
+            fills = defaultdict(list)
+            for trade in self.trading_client.fetchMyTrades(symbol=pair, since=since):
+                fills[str(trade.get('order'))].append(trade)
+            for transaction in transactions:
+                transaction.reconcile_attempts = (transaction.reconcile_attempts or 0) + 1
+                if transaction.order_id in fills:
+                    self._apply_fills(transaction, fills[transaction.order_id], usdt_prices)
+                    reconciled += 1
+                elif (transaction.created < expired or
+                        transaction.reconcile_attempts >= RECONCILE_MAX_ATTEMPTS):
+                    transaction.reconciled = True
+                    self._log('Order {} not found in {} trades, estimated balance is kept'.format(
+                        transaction.order_id, pair), level=trace.WARNING)
+        db_session.commit()
+        return reconciled
+
+    def _apply_fills(self, transaction, trades, usdt_prices):
+        quote_asset = transaction.pair.split('/')[1]
+        cost = D(0)
+        balance_usdt = D(0)
+        fees = defaultdict(D)
+        for trade in trades:
+            trade_cost = D(str(trade['cost']))
+            cost += trade_cost
+            balance_usdt += trade_cost * self.get_price_usdt_at(
+                quote_asset, trade.get('timestamp'), usdt_prices)
+            fee = trade.get('fee') or {}
+            if fee.get('cost') is not None:
+                fees[fee.get('currency')] += D(str(fee['cost']))
+
+        estimated = transaction.balance_usdt
+        transaction.amount = sum(D(str(trade['amount'])) for trade in trades)
+        transaction.cost = cost
+        transaction.balance_usdt = balance_usdt
+        if fees:
+            currency = quote_asset if quote_asset in fees else sorted(fees, key=str)[0]
+            transaction.fee = fees[currency]
+            transaction.fee_currency = currency
+        transaction.reconciled = True
+        policy.spending.correct(transaction, estimated)
+
+    def get_price_usdt_at(self, asset, timestamp, cache=None):
+        """
+        USDT price of asset within the minute of timestamp, latest price if exchange does not
+        provide price history
+
+        :param str asset: asset eg. BTC
+        :param int timestamp: milliseconds timestamp, latest price if ``None``
+        :param dict cache: prices by asset and minute
+
+        """
+        if asset == 'USDT':
+            return D(1)
+        symbol = '{}/USDT'.format(asset)
+        minute = None if timestamp is None else int(timestamp) // 60000 * 60000
+        cache = {} if cache is None else cache
+        if (asset, minute) not in cache:
+            candles = None
+            if minute is not None:
+                try:
+                    candles = self.trading_client.fetchOHLCV(symbol, '1m', since=minute, limit=1)
+                except ccxt_errors.NotSupported:
+                    pass
+            if candles:
+                #: close price of the minute
+                cache[(asset, minute)] = D(str(candles[0][4]))
+            else:
+                cache[(asset, minute)] = self.get_latest_price({'symbol': symbol})
+        return cache[(asset, minute)]
 
     def get_balance(self, symbol):
         """
@@ -224,18 +429,25 @@ class ExchangeHelper(object):
         :param str symbol: symbol eg. BTC/USDT
 
         """
-        time.sleep(1)
-        balance = self.client.fetchBalance()
+        if self.paper is None:
+            time.sleep(1)
+        balance = self.trading_client.fetchBalance()
+        if symbol not in balance:
+            #: assets never held are omitted by paper account and some exchanges
+            return D(0)
         return D(balance[symbol]['free'])
 
     def get_latest_price(self, symbol):
         """
-        Get latest price for symbol
+        Get latest price for symbol, from market data stream if it is fresh enough
 
         :param dict symbol: symbol data
 
         """
-        return D(self.client.fetchTicker(symbol['symbol'])['last'])
+        price = market_data.price_book.get(symbol['symbol'])
+        if price is not None:
+            return price
+        return D(self.trading_client.fetchTicker(symbol['symbol'])['last'])
 
     def get_latest_price_usdt(self, symbol):
         """
@@ -271,15 +483,32 @@ class ExchangeHelper(object):
         output = D(floor(quantity * (10 ** decimal_places)) / float(10 ** decimal_places))
         return D("{:0.0{}f}".format(float(output), symbol['quote_asset_precision']))
 
-    def _log(self, message):
-        log = SystemLog(message=message)
-        db_session.add(log)
-        db_session.commit()
+    def _log(self, message, level=trace.INFO):
+        trace.log(message, level=level)
+
+    def _log_transaction(self, action, order, price_usdt=None):
+        """
+        Record transaction of placed order, balance is estimated from USDT price until it is
+        reconciled with actual fills
 
-    def _log_transaction(self, action, balance_usdt):
+        Transaction is committed together with ``ORDERED`` journal state, so the fill is in the
+        ledger even if confirmation fails and is only retried on the next cycle.
+
+        :param order: order returned by exchange
+
+        """
+        if price_usdt is None:
+            price_usdt = self.get_latest_price_usdt(action['symbol'])
+        order_id = order.get('id') if isinstance(order, dict) else None
+        order_id = None if order_id is None else str(order_id)
         action_log = Transaction(
             pair=action['symbol']['symbol'], action_name=action['action'],
-            amount=D(action['amount']), balance_usdt=balance_usdt)
+            amount=D(action['amount']), balance_usdt=price_usdt * D(action['amount']),
+            exchange=self.exchange.name, order_id=order_id, reconciled=order_id is None,
+            action_id=action['action_id'])
         db_session.add(action_log)
+        journal.transition(action['action_id'], ActionJournal.ORDERED, response=order)
         db_session.commit()
+        policy.spending.record(action_log)
+        events.publish_transaction(action_log)
 
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+#: rows fetched from database at once
+CHUNK_SIZE = 1000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']
+
+
+def parse_date(value):
+    """
+    Parse date filter, ``None`` if value is empty
+
+    :raises ValueError: unknown date format
+
+    """
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError('Invalid date: {}'.format(value))
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_rows(query, columns, chunk_size=CHUNK_SIZE):
+    """
+    Values of columns of query rows, fetched in chunks with server side cursor where supported
+
+    """
+    query = query.with_entities(*columns).execution_options(stream_results=True)
+    for row in query.yield_per(chunk_size):
+        yield [_value(value) for value in row]
+
+
+def encode_csv(names, rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for index, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if index % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_jsonl(names, rows, chunk_size=CHUNK_SIZE):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row))) + '\n')
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+def gzip_chunks(chunks):
+    """
+    Compress text chunks to gzip stream
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(query, columns, export_format, compress=False):
+    """
+    Generator of exported query rows
+
+    :param query: rows query
+    :param list columns: exported model columns
+    :param str export_format: ``csv`` or ``jsonl``
+    :param bool compress: gzip output
+
+    """
+    names = [column.key for column in columns]
+    encode = encode_csv if export_format == 'csv' else encode_jsonl
+    chunks = encode(names, iter_rows(query, columns))
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
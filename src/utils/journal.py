@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import socket
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models import ActionJournal
+from database import db_session
+
+FINISHED_STATES = (ActionJournal.CONFIRMED, ActionJournal.REJECTED)
+FINISHED_CACHE_SIZE = 100000
+#: seconds after which action claimed by process which did not release it (eg. killed) is taken
+#: over by other process
+CLAIM_TIMEOUT = int(os.environ.get('EXA_CLAIM_TIMEOUT', 300))
+
+_lock = threading.Lock()
+_in_flight = {}
+_finished = OrderedDict()
+
+
+def _remember_finished(action_id):
+    with _lock:
+        _finished[action_id] = True
+        _finished.move_to_end(action_id)
+        if len(_finished) > FINISHED_CACHE_SIZE:
+            _finished.popitem(last=False)
+
+
+def owner():
+    """
+    Identity of this process in ``ActionJournal.owner``
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def claim(action_id, exchange, action_name):
+    """
+    Claim action for execution
+
+    Actions being executed or already finished are skipped without database access. New actions
+    are inserted with unique ``action_id``, so concurrent claims of the same action from another
+    thread or process fail. Unfinished actions are taken over by single conditional update, only
+    when they were released or their owner did not update them within ``CLAIM_TIMEOUT``.
+
+    :return: journal entry or ``None`` if action must be skipped
+
+    """
+    with _lock:
+        if action_id in _in_flight or action_id in _finished:
+            return None
+        _in_flight[action_id] = None
+
+    entry = ActionJournal.query.filter_by(action_id=action_id).first()
+    if entry is None:
+        entry = ActionJournal(
+            action_id=action_id, exchange=exchange, action_name=action_name,
+            state=ActionJournal.RECEIVED, owner=owner())
+        db_session.add(entry)
+        try:
+            db_session.commit()
+        except IntegrityError:
+            db_session.rollback()
+            release(action_id)
+            return None
+    elif entry.state in FINISHED_STATES:
+        release(action_id)
+        _remember_finished(action_id)
+        return None
+    else:
+        expired = datetime.now() - timedelta(seconds=CLAIM_TIMEOUT)
+        claimed = ActionJournal.query.filter(
+            ActionJournal.action_id == action_id, ActionJournal.state == entry.state,
+            or_(ActionJournal.owner.is_(None), ActionJournal.updated < expired)).update(
+                {'owner': owner()}, synchronize_session=False)
+        db_session.commit()
+        if not claimed:
+            release(action_id)
+            return None
+        db_session.refresh(entry)
+
+    with _lock:
+        _in_flight[action_id] = entry
+    return entry
+
+
+def transition(action_id, state, response=None):
+    """
+    Record new state of claimed action
+
+    """
+    with _lock:
+        entry = _in_flight.get(action_id)
+    if entry is None:
+        entry = ActionJournal.query.filter_by(action_id=action_id).first()
+    if entry is None:
+        return
+    entry.state = state
+    if response is not None:
+        entry.response = str(response)
+    db_session.commit()
+    if state in FINISHED_STATES:
+        _remember_finished(action_id)
+
+
+def release(action_id):
+    """
+    Release claimed action, so other process can take it over if it is not finished
+    """
+    with _lock:
+        entry = _in_flight.pop(action_id, None)
+    if entry is None:
+        return
+    try:
+        ActionJournal.query.filter_by(action_id=action_id, owner=owner()).update(
+            {'owner': None}, synchronize_session=False)
+        db_session.commit()
+    except SQLAlchemyError:
+        #: claim expires after CLAIM_TIMEOUT
+        db_session.rollback()
+
+
+def clear():
+    """
+    Forget cached state, eg. after journal table was emptied
+
+    """
+    with _lock:
+        _in_flight.clear()
+        _finished.clear()
@@ -0,0 +1,45 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import importlib
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule(object):
+    """
+    Module proxy importing the module on first attribute access.
+
+    Keeps heavy dependencies (eg. ccxt) out of application startup until they are needed.
+
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return '<lazy module {!r}{}>'.format(self._name, '' if self.loaded else ' (not loaded)')
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import hashlib
+import tempfile
+
+from database import engine
+
+
+def default_lock_path():
+    """
+    Lock file shared by all processes using the same database
+
+    SQLite database is locked next to database file, so processes of other containers sharing
+    database volume are locked out too. Lock of database server is kept in temporary directory,
+    containers with their own temporary directory must set shared ``EXA_LEADER_LOCK`` path.
+
+    """
+    url = engine.url
+    if url.drivername.startswith('sqlite') and url.database and url.database != ':memory:':
+        return '{}.leader.lock'.format(os.path.abspath(url.database))
+    digest = hashlib.sha1(str(engine.url).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), 'exa-leader-{}.lock'.format(digest))
+
+
+LEADER_LOCK_PATH = os.environ.get('EXA_LEADER_LOCK') or default_lock_path()
+
+
+class FileLock(object):
+    """
+    Non-blocking exclusive file lock used to elect single scheduler leader between processes.
+
+    Lock is released by the operating system when the holding process exits, so another process
+    takes over leadership on its next attempt.
+
+    """
+
+    def __init__(self, path=LEADER_LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    @property
+    def locked(self):
+        return self._file is not None
+
+    def acquire(self):
+        """
+        Try to acquire lock, ``True`` if lock is held by this instance
+
+        """
+        if self._file is not None:
+            return True
+
+        lock_file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            lock_file.close()
+            return False
+
+        self._file = lock_file
+        return True
+
+    def release(self):
+        lock_file, self._file = self._file, None
+        if lock_file is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
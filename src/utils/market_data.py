@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import threading
+from decimal import Decimal as D
+
+MARKET_DATA_URL = os.environ.get('MARKET_DATA_URL')
+MARKET_DATA_MAX_AGE = float(os.environ.get('MARKET_DATA_MAX_AGE', 5))
+
+
+class PriceBook(object):
+    """
+    Thread safe in-memory book of the latest prices
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices = {}
+
+    def update(self, symbol, price, updated=None):
+        """
+        Store latest price for symbol
+
+        :param str symbol: symbol eg. BTC/USDT
+        :param price: latest price
+        :param float updated: unix timestamp of the update, defaults to now
+
+        """
+        with self._lock:
+            self._prices[symbol] = (D(str(price)), updated or time.time())
+
+    def get(self, symbol, max_age=MARKET_DATA_MAX_AGE):
+        """
+        Latest price for symbol, ``None`` if unknown or older than ``max_age`` seconds
+
+        :param str symbol: symbol eg. BTC/USDT
+        :param float max_age: accepted price age in seconds
+
+        """
+        with self._lock:
+            entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        price, updated = entry
+        if time.time() - updated > max_age:
+            return None
+        return price
+
+    def age(self, symbol):
+        """
+        Seconds since the last update of symbol, ``None`` if unknown
+
+        """
+        with self._lock:
+            entry = self._prices.get(symbol)
+        return None if entry is None else time.time() - entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._prices.clear()
+
+
+def stream_symbols(pairs):
+    """
+    Symbols required to price given pairs, including their USDT legs
+
+    :param list pairs: trading pairs eg. ['EXA/BTC']
+
+    """
+    symbols = set()
+    for pair in pairs or []:
+        symbols.add(pair)
+        quote_asset = pair.split('/')[1]
+        if quote_asset != 'USDT':
+            symbols.add('{}/USDT'.format(quote_asset))
+    return symbols
+
+
+def _websocket_connect(url):
+    import websocket
+    return websocket.create_connection(url, timeout=30)
+
+
+class MarketDataSubscriber(threading.Thread):
+    """
+    Background subscriber keeping price book up to date with exchange ticker stream
+
+    """
+
+    RECONNECT_DELAY = 1
+    RECONNECT_DELAY_MAX = 60
+
+    def __init__(self, url, symbols, book=None, connect=None):
+        """
+        :param str url: websocket base url eg. wss://stream.binance.com:9443
+        :param symbols: symbols to subscribe
+        :param PriceBook book: price book to update
+        :param connect: callable returning websocket connection for url
+
+        """
+        super(MarketDataSubscriber, self).__init__(name='market-data')
+        self.daemon = True
+        self.url = url
+        self.book = book if book is not None else price_book
+        self._connect = connect or _websocket_connect
+        self._connection = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.symbols = set(symbols)
+        self._symbol_names = {s.replace('/', ''): s for s in self.symbols}
+
+    def stream_url(self):
+        streams = '/'.join('{}@miniTicker'.format(symbol.replace('/', '').lower())
+                           for symbol in sorted(self.symbols))
+        return '{}/stream?streams={}'.format(self.url.rstrip('/'), streams)
+
+    def update_symbols(self, symbols):
+        """
+        Resubscribe if symbols have changed
+
+        """
+        symbols = set(symbols)
+        with self._lock:
+            if symbols == self.symbols:
+                return
+            self.symbols = symbols
+        self._close()
+
+    def stop(self):
+        self._stop_event.set()
+        self._close()
+
+    def handle_message(self, message):
+        """
+        Update price book with ticker message
+
+        :param str message: raw stream message
+
+        """
+        payload = json.loads(message)
+        data = payload.get('data', payload)
+        symbol = self._symbol_names.get(data.get('s'))
+        if symbol and data.get('c') is not None:
+            self.book.update(symbol, data['c'])
+
+    def run(self):
+        delay = self.RECONNECT_DELAY
+        while not self._stop_event.is_set():
+            with self._lock:
+                symbols = set(self.symbols)
+            if not symbols:
+                self._stop_event.wait(self.RECONNECT_DELAY)
+                continue
+
+            self._symbol_names = {s.replace('/', ''): s for s in symbols}
+            try:
+                self._connection = self._connect(self.stream_url())
+                delay = self.RECONNECT_DELAY
+                while not self._stop_event.is_set():
+                    message = self._connection.recv()
+                    if not message:
+                        break
+                    self.handle_message(message)
+            except Exception:
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.RECONNECT_DELAY_MAX)
+            finally:
+                self._close()
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+price_book = PriceBook()
+subscriber = None
+
+
+def start(pairs, url=MARKET_DATA_URL):
+    """
+    Start market data subscriber for pairs if market data url is configured
+
+    """
+    global subscriber
+    if not url or subscriber is not None:
+        return subscriber
+    subscriber = MarketDataSubscriber(url=url, symbols=stream_symbols(pairs))
+    subscriber.start()
+    return subscriber
+
+
+def update_pairs(pairs):
+    """
+    Follow allowed pairs change
+
+    """
+    if subscriber is not None:
+        subscriber.update_symbols(stream_symbols(pairs))
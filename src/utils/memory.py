@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import threading
+import tracemalloc
+from collections import deque, namedtuple
+from datetime import datetime
+
+#: frames stored per traced allocation, memory is not traced if 0
+TRACEMALLOC_FRAMES = int(os.environ.get('EXA_TRACEMALLOC', 0))
+
+#: number of executor cycles kept in memory report
+HISTORY_SIZE = int(os.environ.get('EXA_TRACEMALLOC_HISTORY', 360))
+
+TOP_LIMIT = 10
+
+#: traced memory in bytes at the end of executor cycle, growth since previous cycle
+CycleMemory = namedtuple('CycleMemory', ['cycle', 'time', 'current', 'peak', 'growth'])
+
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def _statistic(statistic):
+    return {
+        'location': '{}:{}'.format(statistic.traceback[0].filename, statistic.traceback[0].lineno),
+        'size': statistic.size,
+        'count': statistic.count,
+    }
+
+
+def _difference(statistic):
+    return dict(_statistic(statistic), size_diff=statistic.size_diff,
+                count_diff=statistic.count_diff)
+
+
+class MemoryTracker(object):
+    """
+    Memory allocations of long running process, traced with ``tracemalloc``
+
+    Traced memory is recorded at the end of every executor cycle, which is cheap. Snapshots are
+    taken only when tracing starts and when report is requested, top allocators and their growth
+    since tracing started are compared by source line.
+
+    """
+
+    def __init__(self, history=HISTORY_SIZE, clock=datetime.utcnow):
+        self._clock = clock
+        self._cycles = deque(maxlen=history)
+        self._cycle = 0
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=1):
+        """
+        Start tracing, growth is reported relative to memory allocated at this point
+
+        :param int frames: frames stored per allocation
+
+        """
+        if not self.tracing:
+            tracemalloc.start(frames)
+        baseline = self._snapshot()
+        with self._lock:
+            self._baseline = baseline
+            self._cycles.clear()
+            self._cycle = 0
+
+    def stop(self):
+        tracemalloc.stop()
+        with self._lock:
+            self._baseline = None
+
+    def record_cycle(self):
+        """
+        Record traced memory at the end of executor cycle
+
+        :return: CycleMemory, ``None`` if memory is not traced
+
+        """
+        if not self.tracing:
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            previous = self._cycles[-1].current if self._cycles else current
+            self._cycle += 1
+            cycle = CycleMemory(self._cycle, self._clock(), current, peak, current - previous)
+            self._cycles.append(cycle)
+        return cycle
+
+    def top(self, limit=TOP_LIMIT):
+        """
+        Largest allocators and largest growth since tracing started, by source line
+
+        :return: tuple of lists of allocators and growths
+
+        """
+        snapshot = self._snapshot()
+        with self._lock:
+            baseline = self._baseline
+        allocators = [_statistic(s) for s in snapshot.statistics('lineno')[:limit]]
+        if baseline is None:
+            return allocators, []
+        growth = [_difference(s) for s in snapshot.compare_to(baseline, 'lineno')[:limit]
+                  if s.size_diff > 0]
+        return allocators, growth
+
+    def report(self, limit=TOP_LIMIT):
+        if not self.tracing:
+            return {'tracing': False}
+        allocators, growth = self.top(limit=limit)
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            cycles = [cycle._asdict() for cycle in self._cycles]
+        return {
+            'tracing': True,
+            'current': current,
+            'peak': peak,
+            'cycles': cycles,
+            'top': allocators,
+            'growth': growth,
+        }
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+tracker = MemoryTracker()
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import time
+import random
+import itertools
+import threading
+from collections import deque, defaultdict
+from datetime import datetime
+from decimal import Decimal as D
+
+from utils import market_data
+from utils.lazy import LazyModule
+
+ccxt = LazyModule('ccxt')
+ccxt_errors = LazyModule('ccxt.base.errors')
+
+#: simulated request latency in seconds
+PAPER_LATENCY = float(os.environ.get('EXA_PAPER_LATENCY', 0))
+#: maximum slippage of market order fill price, as fraction of the price
+PAPER_SLIPPAGE = float(os.environ.get('EXA_PAPER_SLIPPAGE', 0.001))
+#: trading fee, as fraction of order cost
+PAPER_FEE = float(os.environ.get('EXA_PAPER_FEE', 0.001))
+#: initial balances eg. ``BTC:1,USDT:10000``
+PAPER_BALANCE = os.environ.get('EXA_PAPER_BALANCE', 'BTC:1,ETH:10,USDT:10000')
+#: fixed prices eg. ``EXA/BTC:0.0001,BTC/USDT:6000``, other prices follow the market
+PAPER_PRICES = os.environ.get('EXA_PAPER_PRICES', '')
+
+TRADES_LIMIT = 100000
+
+
+def parse_amounts(value):
+    """
+    Parse ``KEY:amount`` comma separated list
+
+    """
+    amounts = {}
+    for item in value.split(','):
+        if item.strip():
+            key, amount = item.rsplit(':', 1)
+            amounts[key.strip()] = D(amount.strip())
+    return amounts
+
+
+class MarketPriceFeed(object):
+    """
+    Latest market prices, from market data stream or public exchange ticker
+
+    """
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self._client = None
+
+    def __call__(self, symbol):
+        price = market_data.price_book.get(symbol)
+        if price is not None:
+            return price
+        if self._client is None:
+            self._client = getattr(ccxt, self.exchange)()
+        return self._client.fetchTicker(symbol)['last']
+
+
+class PaperExchange(object):
+    """
+    In-memory simulated exchange account implementing ccxt calls used by ExchangeHelper
+
+    Market orders are filled immediately at the feed price moved by random slippage against the
+    order, fees are charged in quote asset. Balances and trades are kept in memory only.
+
+    """
+
+    def __init__(self, balances=None, prices=None, price_feed=None, latency=0, slippage=0, fee=0,
+                 rand=random.uniform, sleep=time.sleep):
+        """
+        :param dict balances: initial free balances by asset eg. {'BTC': 1}
+        :param dict prices: fixed prices by symbol eg. {'EXA/BTC': 0.0001}
+        :param price_feed: callable returning price for symbol without fixed price
+        :param float latency: simulated request latency in seconds
+        :param float slippage: maximum slippage, as fraction of the price
+        :param float fee: trading fee, as fraction of order cost
+
+        """
+        self.balances = defaultdict(D)
+        for asset, amount in (balances or {}).items():
+            self.balances[asset] = D(str(amount))
+        self.prices = {symbol: D(str(price)) for symbol, price in (prices or {}).items()}
+        self.price_feed = price_feed
+        self.latency = latency
+        self.slippage = slippage
+        self.fee = D(str(fee))
+        self.trades = deque(maxlen=TRADES_LIMIT)
+        self._rand = rand
+        self._sleep = sleep
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def price(self, symbol):
+        """
+        Current price of symbol
+
+        """
+        price = self.prices.get(symbol)
+        if price is None and self.price_feed is not None:
+            price = self.price_feed(symbol)
+        if price is None:
+            raise ccxt_errors.ExchangeError('paper: no price for {}'.format(symbol))
+        return D(str(price))
+
+    def _wait(self):
+        if self.latency:
+            self._sleep(self.latency)
+
+    def fetchTicker(self, symbol, params=None):
+        self._wait()
+        return {'symbol': symbol, 'last': float(self.price(symbol))}
+
+    def fetchOHLCV(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        """
+        Single candle of current price, past prices are not simulated
+        """
+        self._wait()
+        price = float(self.price(symbol))
+        return [[since or int(time.time() * 1000), price, price, price, price, 0.0]]
+
+    def fetchBalance(self, params=None):
+        self._wait()
+        with self._lock:
+            balances = {asset: float(amount) for asset, amount in self.balances.items()}
+        output = {'info': {'paper': True}, 'free': balances, 'used': {}, 'total': dict(balances)}
+        for asset, amount in balances.items():
+            output['used'][asset] = 0.0
+            output[asset] = {'free': amount, 'used': 0.0, 'total': amount}
+        return output
+
+    def fetchDepositAddress(self, code, params=None):
+        self._wait()
+        return {'currency': code, 'address': 'paper-{}'.format(code), 'tag': None, 'info': {}}
+
+    def createMarketBuyOrder(self, symbol, amount, params=None):
+        return self._create_market_order(symbol, 'buy', amount)
+
+    def createMarketSellOrder(self, symbol, amount, params=None):
+        return self._create_market_order(symbol, 'sell', amount)
+
+    def fetchMyTrades(self, symbol=None, since=None, limit=None, params=None):
+        self._wait()
+        with self._lock:
+            trades = [t for t in self.trades if (symbol is None or t['symbol'] == symbol) and
+                      (since is None or t['timestamp'] >= since)]
+        return trades[-limit:] if limit else trades
+
+    def _create_market_order(self, symbol, side, amount):
+        self._wait()
+        amount = D(str(amount))
+        if amount <= 0:
+            raise ccxt_errors.InvalidOrder('paper: invalid order amount {}'.format(amount))
+        base_asset, quote_asset = symbol.split('/')
+
+        slippage = D(str(self._rand(0, self.slippage)))
+        price = self.price(symbol) * (1 + slippage if side == 'buy' else 1 - slippage)
+        cost = amount * price
+        fee = cost * self.fee
+
+        with self._lock:
+            if side == 'buy':
+                if self.balances[quote_asset] < cost + fee:
+                    raise ccxt_errors.InsufficientFunds(
+                        'paper: account has insufficient balance for requested action')
+                self.balances[quote_asset] -= cost + fee
+                self.balances[base_asset] += amount
+            else:
+                if self.balances[base_asset] < amount:
+                    raise ccxt_errors.InsufficientFunds(
+                        'paper: account has insufficient balance for requested action')
+                self.balances[base_asset] -= amount
+                self.balances[quote_asset] += cost - fee
+
+            order_id = str(next(self._ids))
+            now = datetime.utcnow()
+            trade = {
+                'id': order_id,
+                'order': order_id,
+                'timestamp': int(time.time() * 1000),
+                'datetime': now.isoformat() + 'Z',
+                'symbol': symbol,
+                'type': 'market',
+                'side': side,
+                'price': float(price),
+                'amount': float(amount),
+                'cost': float(cost),
+                'fee': {'cost': float(fee), 'currency': quote_asset},
+            }
+            self.trades.append(trade)
+
+        return dict(trade, id=order_id, status='closed', filled=float(amount), remaining=0.0,
+                    trades=[trade], info={'paper': True})
+
+
+_exchanges = {}
+_lock = threading.Lock()
+
+
+def get_exchange(exchange, account_id=None):
+    """
+    Process wide paper account for exchange of ExA account, created with configured balances and
+    prices
+
+    :param str exchange: exchange name
+    :param int account_id: ExA account id
+
+    """
+    key = (exchange, account_id)
+    with _lock:
+        if key not in _exchanges:
+            _exchanges[key] = PaperExchange(
+                balances=parse_amounts(PAPER_BALANCE), prices=parse_amounts(PAPER_PRICES),
+                price_feed=MarketPriceFeed(exchange), latency=PAPER_LATENCY,
+                slippage=PAPER_SLIPPAGE, fee=PAPER_FEE)
+        return _exchanges[key]
+
+
+def reset():
+    with _lock:
+        _exchanges.clear()
@@ -0,0 +1,219 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import deque, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal as D
+
+from sqlalchemy import func
+
+from models import Settings, SpendingLimit, Transaction
+from database import db_session
+
+#: counters granularity in seconds, rolling window usage is counted in whole buckets so it may
+#: include up to one bucket of spending just older than the window
+BUCKET_SECONDS = int(os.environ.get('EXA_POLICY_BUCKET', 60))
+
+#: spending limits apply to buy transactions, same as ``Settings.allowed_balance``
+LIMITED_ACTION = 'order_market_buy'
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def timestamp(value):
+    return (value - EPOCH).total_seconds()
+
+
+class WindowCounter(object):
+    """
+    Sum of amounts within rolling time window, kept in fixed size time buckets
+
+    Adding amount and reading the sum take constant time, buckets older than the window are
+    dropped when the sum is read. Sum of all amounts is kept if window is ``None``.
+
+    """
+
+    def __init__(self, window=None, bucket=BUCKET_SECONDS):
+        """
+        :param int window: window length in seconds, ``None`` for all time
+        :param int bucket: bucket length in seconds
+
+        """
+        self.window = window
+        self.bucket = bucket
+        self._buckets = deque()
+        self._total = D(0)
+
+    def add(self, amount, at):
+        """
+        :param Decimal amount: amount
+        :param datetime at: time amount was spent
+
+        """
+        amount = D(amount or 0)
+        self._total += amount
+        if self.window is None:
+            return
+        index = int(timestamp(at) // self.bucket)
+        if self._buckets and self._buckets[-1][0] >= index:
+            #: late amounts are counted in the newest bucket, so they never expire too early
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([index, amount])
+
+    def total(self, now):
+        if self.window is not None:
+            oldest = int((timestamp(now) - self.window) // self.bucket)
+            while self._buckets and self._buckets[0][0] < oldest:
+                self._total -= self._buckets.popleft()[1]
+        return self._total
+
+
+class SpendingPolicy(object):
+    """
+    In-memory spending counters of ExA accounts
+
+    Counters are built from ``Transaction`` history once, then updated with every new
+    transaction, so checking a limit does not depend on history length. Transactions are
+    followed by id, so transactions written by other process are counted too. Deleted
+    transactions are detected by ``Settings.transactions_generation`` and by number of rows.
+
+    """
+
+    def __init__(self, bucket=BUCKET_SECONDS, clock=datetime.now):
+        self.bucket = bucket
+        self._clock = clock
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            #: (settings_id, action_name) -> {(pair, window): WindowCounter}, pair is ``None``
+            #: for counters of all pairs
+            self._counters = defaultdict(dict)
+            self._last_id = None
+            #: number of transactions with id up to ``_last_id``
+            self._count = 0
+            self._generation = None
+
+    def rebuild(self):
+        """
+        Build counters of all spending limits from transactions history
+        """
+        with self._lock:
+            self.reset()
+            self._sync()
+            for limit in SpendingLimit.query:
+                self._counter(limit.settings_id, LIMITED_ACTION, limit.pair or None, limit.window)
+
+    def record(self, transaction):
+        """
+        Count new transaction, transactions not counted yet are loaded first
+        """
+        with self._lock:
+            if self._last_id is not None and transaction.id == self._last_id + 1:
+                self._add(transaction)
+                self._last_id = transaction.id
+                self._count += 1
+            else:
+                self._sync()
+
+    def correct(self, transaction, previous_balance_usdt):
+        """
+        Count change of balance of already counted transaction, eg. after reconciliation
+        """
+        with self._lock:
+            if self._last_id is not None and transaction.id <= self._last_id:
+                self._add(transaction, transaction.balance_usdt - D(previous_balance_usdt or 0))
+
+    def spent(self, settings_id, action_name, pair=None, window=None):
+        """
+        Balance used by transactions of ExA account
+
+        :param str pair: trading pair, all pairs if ``None``
+        :param int window: rolling window length in seconds, all time if ``None``
+
+        """
+        with self._lock:
+            self._sync()
+            counter = self._counter(settings_id, action_name, pair, window)
+            return counter.total(self._clock())
+
+    def check(self, settings_id, pair, balance_requested):
+        """
+        First spending limit of ExA account exceeded by requested balance
+
+        :return: tuple of exceeded ``SpendingLimit`` and balance used within its window, ``None``
+            if no limit is exceeded
+
+        """
+        limits = SpendingLimit.query.filter_by(settings_id=settings_id).order_by(
+            SpendingLimit.window)
+        for limit in limits:
+            if limit.pair and limit.pair != pair:
+                continue
+            used = self.spent(settings_id, LIMITED_ACTION, limit.pair or None, limit.window)
+            if used + D(balance_requested or 0) > limit.amount:
+                return limit, used
+        return None
+
+    def _sync(self):
+        generation = db_session.query(
+            func.coalesce(func.sum(Settings.transactions_generation), 0)).scalar()
+        last_id, count = db_session.query(
+            func.coalesce(func.max(Transaction.id), 0), func.count(Transaction.id)).one()
+        if self._last_id is not None and generation == self._generation:
+            transactions = Transaction.query.filter(
+                Transaction.id > self._last_id, Transaction.id <= last_id).order_by(
+                    Transaction.id).all()
+            if count == self._count + len(transactions):
+                for transaction in transactions:
+                    self._add(transaction)
+                self._last_id = max(self._last_id, last_id)
+                self._count = count
+                return
+        #: transactions were deleted, eg. by other process, and their ids may be reused,
+        #: counters are loaded again from remaining transactions
+        self._counters = defaultdict(dict)
+        self._last_id = last_id
+        self._count = count
+        self._generation = generation
+
+    def _add(self, transaction, amount=None):
+        counters = self._counters[(transaction.settings_id, transaction.action_name)]
+        for (pair, _), counter in counters.items():
+            if pair is None or pair == transaction.pair:
+                counter.add(
+                    transaction.balance_usdt if amount is None else amount, transaction.created)
+
+    def _counter(self, settings_id, action_name, pair, window):
+        counters = self._counters[(settings_id, action_name)]
+        counter = counters.get((pair, window))
+        if counter is None:
+            counter = counters[(pair, window)] = self._load(
+                settings_id, action_name, pair, window)
+        return counter
+
+    def _load(self, settings_id, action_name, pair, window):
+        """
+        Counter of transactions already synced
+        """
+        counter = WindowCounter(window=window, bucket=self.bucket)
+        query = db_session.query(Transaction.created, Transaction.balance_usdt).filter(
+            Transaction.settings_id == settings_id, Transaction.action_name == action_name,
+            Transaction.id <= self._last_id)
+        if pair is not None:
+            query = query.filter(Transaction.pair == pair)
+        if window is None:
+            counter.add(query.with_entities(
+                func.coalesce(func.sum(Transaction.balance_usdt), 0)).scalar(), self._clock())
+        else:
+            since = self._clock() - timedelta(seconds=window + self.bucket)
+            for created, balance_usdt in query.filter(Transaction.created >= since).order_by(
+                    Transaction.created):
+                counter.add(balance_usdt, created)
+        return counter
+
+
+spending = SpendingPolicy()
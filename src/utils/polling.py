@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import random
+from collections import namedtuple
+
+ACTIVE = 'active'
+IDLE = 'idle'
+UNAVAILABLE = 'unavailable'
+
+#: outcome of single poll and delay suggested by ExA server, if any
+PollResult = namedtuple('PollResult', ['outcome', 'suggested_delay'])
+
+
+class AdaptiveInterval(object):
+    """
+    Delay of the next poll based on the outcome of the last one
+
+    Polls quickly while actions are flowing, backs off gradually when server has no work and
+    exponentially when it is unavailable. Delay suggested by server takes precedence. Jitter
+    prevents clients from synchronising.
+
+    """
+
+    BASE = 10
+    MIN = 2
+    IDLE_MAX = 60
+    UNAVAILABLE_MAX = 300
+    IDLE_FACTOR = 1.5
+    UNAVAILABLE_FACTOR = 2
+    JITTER = 0.2
+
+    def __init__(self, jitter=JITTER, rand=random.uniform):
+        self.jitter = jitter
+        self._rand = rand
+        self.delay = self.BASE
+
+    def next_delay(self, result):
+        """
+        :param PollResult result: outcome of the last poll
+        :return: seconds to wait before the next poll
+
+        """
+        if result.suggested_delay is not None:
+            delay = min(max(result.suggested_delay, self.MIN), self.UNAVAILABLE_MAX)
+        elif result.outcome == ACTIVE:
+            delay = self.MIN
+        elif result.outcome == IDLE:
+            delay = min(max(self.delay, self.BASE) * self.IDLE_FACTOR, self.IDLE_MAX)
+        else:
+            delay = min(max(self.delay, self.BASE) * self.UNAVAILABLE_FACTOR, self.UNAVAILABLE_MAX)
+        self.delay = delay
+        return delay * (1 + self._rand(-self.jitter, self.jitter))
+
+
+def suggested_delay(headers):
+    """
+    Poll delay suggested by ExA server with ``X-Poll-Interval`` or ``Retry-After`` header
+
+    """
+    for header in ['X-Poll-Interval', 'Retry-After']:
+        if header not in headers:
+            continue
+        try:
+            return float(headers[header])
+        except (TypeError, ValueError):
+            continue
+    return None
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import time
+import heapq
+import itertools
+import threading
+
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_MARKET = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_ORDER: 'order',
+    PRIORITY_ACCOUNT: 'account',
+    PRIORITY_MARKET: 'market',
+}
+
+#: Request weight as counted by exchange, defaults to 1
+WEIGHTS = {
+    'fetchBalance': 5,
+    'fetchMyTrades': 5,
+    'fetchOrders': 5,
+    'fetchOpenOrders': 3,
+}
+
+#: Request priority, defaults to PRIORITY_ACCOUNT
+PRIORITIES = {
+    'createOrder': PRIORITY_ORDER,
+    'createMarketBuyOrder': PRIORITY_ORDER,
+    'createMarketSellOrder': PRIORITY_ORDER,
+    'cancelOrder': PRIORITY_ORDER,
+    'fetchTicker': PRIORITY_MARKET,
+    'fetchTickers': PRIORITY_MARKET,
+    'fetchOHLCV': PRIORITY_MARKET,
+    'fetchOrderBook': PRIORITY_MARKET,
+}
+
+#: Exchange limits expressed as (weight per second, burst capacity)
+LIMITS = {
+    'binance': (20, 20),
+}
+DEFAULT_LIMIT = (1, 5)
+
+
+class RequestScheduler(object):
+    """
+    Weight aware token bucket shared by all requests to exchange account.
+
+    Waiting requests are served by priority, then in arrival order.
+
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param float rate: weight restored per second
+        :param float capacity: maximum burst weight
+
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+
+        self.calls = 0
+        self.wait_time = 0.0
+        self.max_queue_depth = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, weight=1, priority=PRIORITY_ACCOUNT):
+        """
+        Block until request of given weight is allowed
+
+        """
+        weight = min(weight, self.capacity)
+        ticket = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    timeout = None
+                    if self._queue[0] == ticket:
+                        self._refill()
+                        if self.tokens >= weight:
+                            break
+                        timeout = (weight - self.tokens) / self.rate
+                    self._condition.wait(timeout)
+                self.tokens -= weight
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+            self.calls += 1
+            self.wait_time += time.monotonic() - started
+
+    def call(self, name, method, *args, **kwargs):
+        """
+        Call client method once allowed by rate limit
+
+        :param str name: ccxt method name, used to look up weight and priority
+        :param method: bound client method
+
+        """
+        self.acquire(weight=WEIGHTS.get(name, 1), priority=PRIORITIES.get(name, PRIORITY_ACCOUNT))
+        return method(*args, **kwargs)
+
+    def metrics(self):
+        with self._condition:
+            self._refill()
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            return {
+                'queue_depth': len(self._queue),
+                'queue_depth_by_priority': depth,
+                'max_queue_depth': self.max_queue_depth,
+                'tokens': round(self.tokens, 2),
+                'calls': self.calls,
+                'wait_time': round(self.wait_time, 3),
+            }
+
+
+class ScheduledClient(object):
+    """
+    ccxt client proxy routing every API call through request scheduler
+
+    """
+
+    def __init__(self, client, scheduler):
+        self._client = client
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        def scheduled(*args, **kwargs):
+            return self._scheduler.call(name, attribute, *args, **kwargs)
+        return scheduled
+
+
+_schedulers = {}
+#: exchange id -> scheduler key, metrics are reported by exchange id so api keys are not exposed
+_exchanges = {}
+_lock = threading.Lock()
+
+
+def get_scheduler(exchange, api_key, exchange_id=None):
+    """
+    Process wide scheduler for exchange account
+
+    :param str exchange: exchange name
+    :param str api_key: exchange account api key
+    :param int exchange_id: id of ``Exchange`` using the scheduler, reported in metrics
+
+    """
+    key = (exchange, api_key)
+    with _lock:
+        if key not in _schedulers:
+            rate, capacity = LIMITS.get(exchange, DEFAULT_LIMIT)
+            _schedulers[key] = RequestScheduler(rate=rate, capacity=capacity)
+        if exchange_id is not None:
+            _exchanges[exchange_id] = key
+        return _schedulers[key]
+
+
+def metrics(exchange_ids=None):
+    """
+    Scheduler metrics per exchange, exchanges sharing api key report the same scheduler
+
+    :param exchange_ids: ids of reported exchanges, all if ``None``
+
+    """
+    with _lock:
+        schedulers = [(exchange_id, key, _schedulers[key]) for exchange_id, key in _exchanges.items()
+                      if exchange_ids is None or exchange_id in exchange_ids]
+    return {'{}:{}'.format(exchange, exchange_id): scheduler.metrics()
+            for exchange_id, (exchange, _), scheduler in schedulers}
@@ -1,12 +1,16 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import os
-import requests
 
 from exceptions import ExAServerException
-from models import SystemLog, Settings, Symbol
+from utils import cassette, symbols, tenant, trace
+from utils.lazy import LazyModule
+from utils.polling import suggested_delay
+from models import SystemLog, Symbol
 from database import db_session
 
+requests = cassette.wrap_requests(LazyModule('requests'))
+
 
 class ExAServerHelper(object):
     """
@@ -17,12 +21,13 @@ class ExAServerHelper(object):
 
     def __init__(self, version):
         self.version = version
-        self.settings = Settings.query.get(1)
+        self.settings = tenant.current_settings()
+        #: state of the last ``get_actions`` call, used to adapt polling interval
+        self.available = True
+        self.next_poll = None
 
-    def log(self, message):
-        log = SystemLog(message=message)
-        db_session.add(log)
-        db_session.commit()
+    def log(self, message, level=trace.WARNING):
+        trace.log(message, level=level)
 
     def connect(self, username, password):
         """
@@ -36,7 +41,7 @@ class ExAServerHelper(object):
             self.settings.connected = True
             self.settings.exa_token = response.json()['api_token']
             db_session.commit()
-            self.log('ExA server is connected')
+            self.log('ExA server is connected', level=trace.INFO)
             return True
         else:
             self.log('ExA server connection failed: {}'.format(response.content))
@@ -52,16 +57,20 @@ class ExAServerHelper(object):
                 self.SERVER_URL, '&exchanges='.join(exchanges)), timeout=7,
                 headers={'Authorization': 'Token {}'.format(self.settings.exa_token.strip())})
         except requests.exceptions.Timeout:
+            self.available = False
             self.log(message='Server Timeout')
             return []
         except requests.exceptions.ConnectionError:
+            self.available = False
             self.log(message='Server Connection Error')
             return []
 
+        self.next_poll = suggested_delay(response.headers)
         if response.status_code == 200:
             content = response.json()
             return content
         elif response.status_code == 502:
+            self.available = False
             self.log(message='Server Maintenance')
         elif response.status_code in [401, 404]:
             raise ExAServerException('Wrong client configuration. Exception: {}'.format(
@@ -112,22 +121,32 @@ class ExAServerHelper(object):
                 'Error while connecting to ExA server. If problem persist please contact '
                 'administrator. Response: {}'.format(response.content))
 
-    def send_logs(self):
+    def send_logs(self, include_trace=False, remote_trace=()):
         """
         Send logs to ExA server
 
+        :param bool include_trace: send also verbose entries kept in memory
+        :param remote_trace: verbose entries of other process executing actions, as dicts
+
         """
         log_messages = ['client: {}'.format(self.version)]
-        logs = SystemLog.query.all()
-        for log in logs:
-            log_messages.append('{}: {}'.format(log.created, log.message))
+        logs = tenant.query(SystemLog).all()
+        if include_trace:
+            logs = trace.entries(logs, settings_id=tenant.current_id(), remote=remote_trace)
+        for log in sorted(logs, key=lambda l: l.created):
+            message = '{}: {}: {}'.format(log.created, log.level_name, log.message)
+            if log.count and log.count > 1:
+                message += ' (x{}, last seen {})'.format(log.count, log.last_seen)
+            log_messages.append(message)
 
         response = requests.post('{}/api/client/logs/'.format(
             self.SERVER_URL), timeout=7, data={'logs': str(log_messages)},
             headers={'Authorization': 'Token {}'.format(self.settings.exa_token.strip())})
         if response.status_code == 200:
-            SystemLog.query.delete()
+            tenant.query(SystemLog).delete()
             db_session.commit()
+            if include_trace:
+                trace.buffer.clear(settings_id=tenant.current_id())
             return True
         else:
             self.log(message='Send logs failed: {}'.format(response.content))
@@ -139,11 +158,13 @@ class ExAServerHelper(object):
             headers={'Authorization': 'Token {}'.format(self.settings.exa_token.strip())})
 
         if response.status_code == 200:
+            existing = set(name for (name,) in db_session.query(Symbol.name))
             for item in response.json():
-                symbol = Symbol.query.filter_by(name=item).first()
-                if not symbol:
+                if item not in existing:
                     db_session.add(Symbol(name=item))
+                    existing.add(item)
             db_session.commit()
+            symbols.index.refresh()
         else:
             self.log(message='Sync symbols failed: {}'.format(response.content))
 
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import time
+import bisect
+import threading
+
+from models import Symbol
+from database import db_session
+
+#: seconds after which symbols are reloaded, symbols synced by other process become visible
+SYMBOLS_TTL = int(os.environ.get('EXA_SYMBOLS_TTL', 300))
+SEARCH_LIMIT = 50
+
+
+def load_symbols():
+    return [name for (name,) in db_session.query(Symbol.name)]
+
+
+class SymbolIndex(object):
+    """
+    In-memory index of trading pairs names
+
+    Names are kept sorted for case insensitive prefix search with binary search and in a set for
+    membership checks. Index is reloaded when older than ``ttl`` seconds.
+
+    """
+
+    def __init__(self, loader=load_symbols, ttl=SYMBOLS_TTL, clock=time.time):
+        """
+        :param loader: callable returning symbol names
+        :param int ttl: seconds after which index is reloaded
+        :param clock: callable returning current time in seconds
+
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self._clock = clock
+        self._loaded = None
+        self._keys = []
+        self._names = []
+        self._set = frozenset()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Reload names from database
+        """
+        names = sorted(set(self.loader()), key=lambda n: n.upper())
+        with self._lock:
+            self._names = names
+            self._keys = [n.upper() for n in names]
+            self._set = frozenset(names)
+            self._loaded = self._clock()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = None
+
+    def _ensure_fresh(self):
+        loaded = self._loaded
+        if loaded is None or self._clock() - loaded > self.ttl:
+            self.refresh()
+
+    def __contains__(self, name):
+        self._ensure_fresh()
+        return name in self._set
+
+    def __len__(self):
+        self._ensure_fresh()
+        return len(self._names)
+
+    def search(self, query, offset=0, limit=SEARCH_LIMIT):
+        """
+        Names starting with query, case insensitive
+
+        :return: tuple of matching names and flag if there are more matches
+
+        """
+        self._ensure_fresh()
+        with self._lock:
+            keys, names = self._keys, self._names
+        prefix = (query or '').strip().upper()
+        start = bisect.bisect_left(keys, prefix) + offset
+        matches = []
+        for index in range(start, min(start + limit + 1, len(keys))):
+            if not keys[index].startswith(prefix):
+                break
+            matches.append(names[index])
+        return matches[:limit], len(matches) > limit
+
+
+index = SymbolIndex()
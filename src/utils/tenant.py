@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import threading
+from contextlib import contextmanager
+
+#: account of single account installations and of rows created before accounts were introduced
+DEFAULT_ACCOUNT = 1
+
+_local = threading.local()
+
+
+def current_id():
+    """
+    Id of ExA account (``Settings`` row) served by current thread
+    """
+    return getattr(_local, 'account_id', DEFAULT_ACCOUNT)
+
+
+def activate(account_id):
+    """
+    Serve given ExA account in current thread
+    """
+    _local.account_id = account_id or DEFAULT_ACCOUNT
+
+
+@contextmanager
+def use(account_id):
+    """
+    Serve given ExA account within block, previous account is restored afterwards
+    """
+    previous = current_id()
+    activate(account_id)
+    try:
+        yield
+    finally:
+        activate(previous)
+
+
+def current_settings():
+    from models import Settings
+
+    return Settings.query.get(current_id())
+
+
+def accounts():
+    from models import Settings
+
+    return Settings.query.order_by(Settings.id).all()
+
+
+def query(model):
+    """
+    Query of model rows owned by current account
+    """
+    return model.query.filter_by(settings_id=current_id())
+
+
+def allowed_pairs():
+    """
+    Pairs allowed by any ExA account
+    """
+    pairs = set()
+    for settings in accounts():
+        pairs.update(settings.allowed_pairs or [])
+    return sorted(pairs)
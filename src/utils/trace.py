@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import logging
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+
+from utils import events, tenant, worker
+from models import SystemLog
+from database import db_session
+
+#: log levels, same as standard ``logging`` levels
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+#: entries at this level and above are persisted as ``SystemLog`` rows, lower ones are kept in
+#: in-memory ring buffer only
+PERSIST_LEVEL = WARNING
+#: number of the newest verbose entries kept in memory
+TRACE_SIZE = int(os.environ.get('EXA_TRACE_SIZE', 10000))
+#: optional JSON lines file verbose entries are spilled to, rotated by size
+TRACE_FILE = os.environ.get('EXA_TRACE_FILE', '')
+TRACE_FILE_SIZE = int(os.environ.get('EXA_TRACE_FILE_SIZE', 10 * 1024 * 1024))
+TRACE_FILE_BACKUPS = int(os.environ.get('EXA_TRACE_FILE_BACKUPS', 5))
+#: seconds since the last occurrence within which identical persisted message is counted in
+#: existing entry instead of creating new one
+REPEAT_WINDOW = int(os.environ.get('EXA_LOG_REPEAT_WINDOW', 600))
+
+
+class TraceEntry(object):
+    """
+    Verbose log entry kept in memory, has the same attributes as ``SystemLog`` row
+
+    """
+    __slots__ = ('id', 'settings_id', 'level', 'message', 'created')
+    count = 1
+    persisted = False
+
+    def __init__(self, id, settings_id, level, message, created):
+        self.id = id
+        self.settings_id = settings_id
+        self.level = level
+        self.message = message
+        self.created = created
+
+    @property
+    def level_name(self):
+        return logging.getLevelName(self.level)
+
+    @property
+    def last_seen(self):
+        return self.created
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'settings_id': self.settings_id, 'level': self.level_name,
+            'message': self.message, 'created': self.created.isoformat()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Entry sent by other process, eg. worker executing actions
+        """
+        created = data['created']
+        created = datetime.strptime(
+            created, '%Y-%m-%dT%H:%M:%S.%f' if '.' in created else '%Y-%m-%dT%H:%M:%S')
+        return cls(id=data['id'], settings_id=data['settings_id'],
+                   level=logging.getLevelName(data['level']), message=data['message'],
+                   created=created)
+
+
+class TraceBuffer(object):
+    """
+    Fixed size ring buffer of verbose log entries, the oldest entries are dropped when full
+
+    """
+
+    def __init__(self, size=TRACE_SIZE, spill=None):
+        """
+        :param int size: maximum number of entries
+        :param spill: optional ``logging.Logger`` entries are written to as JSON lines
+
+        """
+        self.spill = spill
+        self._entries = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def append(self, level, message, settings_id=None):
+        with self._lock:
+            entry = TraceEntry(
+                id=next(self._ids), settings_id=settings_id, level=level, message=message,
+                created=datetime.now())
+            self._entries.append(entry)
+        if self.spill is not None:
+            self.spill.log(level, json.dumps(entry.to_dict()))
+        return entry
+
+    def entries(self, settings_id=None):
+        """
+        Entries of ExA account, the newest first
+
+        """
+        with self._lock:
+            entries = list(self._entries)
+        return [e for e in reversed(entries) if settings_id is None or e.settings_id == settings_id]
+
+    def clear(self, settings_id=None):
+        with self._lock:
+            if settings_id is None:
+                self._entries.clear()
+            else:
+                kept = [e for e in self._entries if e.settings_id != settings_id]
+                self._entries.clear()
+                self._entries.extend(kept)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def spill_logger(path, max_bytes=TRACE_FILE_SIZE, backups=TRACE_FILE_BACKUPS):
+    """
+    Logger writing raw messages to rotating file
+
+    """
+    logger = logging.getLogger('exa.trace')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+buffer = TraceBuffer(spill=spill_logger(TRACE_FILE) if TRACE_FILE else None)
+
+
+def serialized_entries(settings_id=None):
+    return [entry.to_dict() for entry in buffer.entries(settings_id=settings_id)]
+
+
+def command_server(address=None):
+    """
+    Command server sharing buffered entries with other processes, eg. by leader of gunicorn
+    workers executing actions
+
+    """
+    return worker.CommandServer(
+        commands={'trace': serialized_entries, 'trace_clear': buffer.clear},
+        address=address or (worker.WORKER_HOST, worker.WORKER_PORT))
+
+
+def message_hash(message):
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()
+
+
+def persist(message, level, repeat_window=REPEAT_WINDOW):
+    """
+    Store message as ``SystemLog`` row, repeated message only updates counter of the entry
+
+    Repeated message is looked up by indexed hash of message.
+
+    """
+    now = datetime.now()
+    digest = message_hash(message)
+    entry = tenant.query(SystemLog).filter(
+        SystemLog.message_hash == digest, SystemLog.message == message, SystemLog.level == level,
+        SystemLog.last_seen >= now - timedelta(seconds=repeat_window)).order_by(
+        SystemLog.id.desc()).first()
+    if entry is None:
+        entry = SystemLog(
+            message=message, message_hash=digest, level=level, created=now, last_seen=now)
+        db_session.add(entry)
+    else:
+        entry.count = (entry.count or 1) + 1
+        entry.last_seen = now
+    db_session.commit()
+    return entry
+
+
+def log(message, level=INFO):
+    """
+    Log message of current ExA account, warnings and errors are persisted as ``SystemLog`` rows,
+    verbose entries go to ring buffer only
+
+    :param str message: log message
+    :param int level: log level eg. ``trace.DEBUG``
+    :return: ``SystemLog`` or ``TraceEntry``
+
+    """
+    if level >= PERSIST_LEVEL:
+        entry = persist(message, level)
+    else:
+        entry = buffer.append(level, message, settings_id=tenant.current_id())
+    events.publish_log(entry)
+    return entry
+
+
+def entries(logs=(), settings_id=None, remote=()):
+    """
+    Persisted log rows merged with buffered entries of ExA account, the most recently seen first
+
+    :param logs: ``SystemLog`` rows
+    :param remote: entries of other process as dicts, eg. of worker executing actions
+
+    """
+    merged = list(logs) + buffer.entries(settings_id=settings_id)
+    merged.extend(TraceEntry.from_dict(item) for item in remote)
+    return sorted(merged, key=lambda e: e.last_seen or e.created, reverse=True)
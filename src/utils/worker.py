@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import os
+import json
+import socket
+import socketserver
+
+from exceptions import ExAWorkerException
+from database import db_session
+
+WORKER_HOST = os.environ.get('EXA_WORKER_HOST', '127.0.0.1')
+WORKER_PORT = int(os.environ.get('EXA_WORKER_PORT', 5001))
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Handle single JSON line command: ``{"command": "status", "params": {}}``
+    """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            command = self.server.commands.get(request.get('command'))
+            if command is None:
+                response = {'error': 'Unknown command: {}'.format(request.get('command'))}
+            else:
+                response = {'result': command(**request.get('params', {}))}
+        except Exception as e:
+            response = {'error': str(e)}
+        finally:
+            db_session.remove()
+        self.wfile.write((json.dumps(response, default=str) + '\n').encode('utf-8'))
+
+
+class CommandServer(socketserver.ThreadingTCPServer):
+    """
+    Local socket server accepting commands from web process
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, commands, address=(WORKER_HOST, WORKER_PORT)):
+        """
+        :param dict commands: command name to callable mapping
+
+        """
+        self.commands = commands
+        socketserver.ThreadingTCPServer.__init__(self, address, CommandHandler)
+
+
+class WorkerClient(object):
+    """
+    Send commands to worker process
+    """
+
+    def __init__(self, address=(WORKER_HOST, WORKER_PORT), timeout=5):
+        self.address = address
+        self.timeout = timeout
+
+    def send(self, command, timeout=None, **params):
+        """
+        Send command and wait for result
+
+        :raises ExAWorkerException: worker is not running or command failed
+
+        """
+        payload = json.dumps({'command': command, 'params': params}) + '\n'
+        try:
+            connection = socket.create_connection(self.address, timeout=timeout or self.timeout)
+            try:
+                connection.sendall(payload.encode('utf-8'))
+                response = connection.makefile('rb').readline()
+            finally:
+                connection.close()
+            response = json.loads(response.decode('utf-8'))
+        except (OSError, ValueError) as e:
+            raise ExAWorkerException('Worker is not available: {}'.format(e))
+
+        if 'error' in response:
+            raise ExAWorkerException(response['error'])
+        return response['result']
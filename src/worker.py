@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Standalone action executor
+
+    EXA_EXECUTOR=external flask run
+    python worker.py
+
+Executes ``run_actions`` loop in its own process, so trading is not affected by web requests and
+web requests are not affected by exchange calls. Web process shares state through the database
+and sends commands (eg. ``sync_symbols``, ``validate_exchange``) over local socket. Both processes
+can be restarted independently.
+
+"""
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import logging
+
+from utils import memory, trace
+from utils.server import ExAServerHelper
+from utils.worker import CommandServer
+from database import init_db
+from executor import Executor
+from version import VERSION
+
+
+def sync_symbols():
+    ExAServerHelper(version=VERSION).sync_symbols()
+    return True
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
+    init_db()
+
+    executor = Executor(version=VERSION)
+    server = CommandServer(commands={
+        'status': executor.status,
+        'run_actions': executor.run_now,
+        'sync_symbols': sync_symbols,
+        'validate_exchange': executor.validate,
+        'memory': memory.tracker.report,
+        'trace': trace.serialized_entries,
+        'trace_clear': trace.buffer.clear,
+    })
+    executor.start()
+    logging.info('ExA worker %s listening on %s:%s', VERSION, *server.server_address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
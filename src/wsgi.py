@@ -0,0 +1,15 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+WSGI entry point for production servers, eg.
+
+    gunicorn --workers 2 --threads 8 --worker-class gthread wsgi:app
+
+Every worker serves pages, actions are executed only by the worker holding scheduler leader lock.
+Live update streams take one thread each and are limited to ``EXA_STREAM_LIMIT`` per worker,
+so ``--threads`` must stay above the limit.
+
+"""
+from __init__ import create_app
+
+app = create_app()